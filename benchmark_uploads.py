@@ -0,0 +1,346 @@
+#upload benchmark: a local fake discord webhook server driven through the real upload path, with results saved for comparing runs
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# --- Configuration ---
+RESULTS_FILE = "benchmark_results.jsonl"    # One JSON line per run, appended
+SCENARIOS = ["messages", "upload_file", "process_file", "pipeline", "oversize"]
+REGRESSION_THRESHOLD = 0.10                 # A scenario is flagged when items/s drops by more than this
+MULTIPART_ALLOWANCE = 64 * 1024             # Request bytes allowed over the size limit for multipart headers
+READ_CHUNK_SIZE = 64 * 1024                 # Request body read size (and bandwidth accounting unit)
+UNLIMITED_BUCKET = 1000                     # X-RateLimit-Limit advertised when no rate limit is simulated
+
+FILENAME_PATTERN = re.compile(rb'name="files\[(\d+)\]"; filename="([^"]*)"')
+
+# --- Fake webhook server ---
+class FakeWebhookServer:
+    """
+    Local stand-in for Discord's webhook API.
+    POST with ?wait=true answers JSON with one attachment per files[n] part (204 without wait).
+    Requests bigger than max_size answer 413. latency is added to every response and the
+    request bodies share one link of bandwidth bytes/s. With rate_limit set, each webhook allows
+    rate_limit requests per rate_window seconds and answers 429 with Retry-After past that;
+    X-RateLimit-* headers are sent either way, as Discord does.
+    Every request is logged as (status, seconds, body bytes), seconds being the time the server
+    spent on it: receiving the body plus the simulated latency.
+    """
+    def __init__(self, latency=0.0, bandwidth=None, max_size=8 * 1024 * 1024, rate_limit=None, rate_window=2.0):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.max_size = max_size
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.lock = threading.Lock()
+        self.link_free_at = 0.0
+        self.buckets = {}      # webhook path -> (window start, requests in window)
+        self.log = []
+        self.message_id = 0
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self.handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def webhook_url(self, webhook=1):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/api/webhooks/{webhook}/benchmark-token"
+
+    def take_log(self):
+        """Requests logged since the last call."""
+        with self.lock:
+            log, self.log = self.log, []
+        return log
+
+    def transfer(self, size):
+        """Block for the time size bytes take on the shared link."""
+        if not self.bandwidth:
+            return
+        with self.lock:
+            start = max(time.monotonic(), self.link_free_at)
+            self.link_free_at = start + size / self.bandwidth
+            done = self.link_free_at
+        time.sleep(max(0.0, done - time.monotonic()))
+
+    def take_token(self, path):
+        """(retry_after, remaining, reset_after) for a request on path; retry_after > 0 means 429."""
+        if not self.rate_limit:
+            return 0.0, UNLIMITED_BUCKET - 1, 0.001
+        with self.lock:
+            now = time.monotonic()
+            start, count = self.buckets.get(path, (now, 0))
+            if now - start >= self.rate_window:
+                start, count = now, 0
+            reset_after = max(0.001, start + self.rate_window - now)
+            if count >= self.rate_limit:
+                self.buckets[path] = (start, count)
+                return reset_after, 0, reset_after
+            self.buckets[path] = (start, count + 1)
+            return 0.0, self.rate_limit - count - 1, reset_after
+
+    def handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"   # Keep-alive, like Discord; the uploaders pool their connections
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                started = time.monotonic()
+                length = int(self.headers.get("Content-Length", 0))
+                body = bytearray()
+                while len(body) < length:
+                    chunk = self.rfile.read(min(READ_CHUNK_SIZE, length - len(body)))
+                    if not chunk:
+                        break
+                    server.transfer(len(chunk))
+                    body.extend(chunk)
+                path, _, query = self.path.partition("?")
+                retry_after, remaining, reset_after = server.take_token(path)
+                headers = {"X-RateLimit-Limit": str(server.rate_limit or UNLIMITED_BUCKET),
+                           "X-RateLimit-Remaining": str(remaining),
+                           "X-RateLimit-Reset-After": f"{reset_after:.3f}"}
+                if retry_after:
+                    status = 429
+                    headers["Retry-After"] = f"{retry_after:.3f}"
+                    payload = {"message": "You are being rate limited.", "retry_after": retry_after, "global": False}
+                elif length > server.max_size + MULTIPART_ALLOWANCE:
+                    status = 413
+                    payload = {"message": "Request entity too large", "code": 40005}
+                elif "wait=true" not in query:
+                    status = 204
+                    payload = None
+                else:
+                    status = 200
+                    with server.lock:
+                        server.message_id += 1
+                        message_id = server.message_id
+                    names = [name.decode(errors="replace")
+                             for _, name in sorted((int(i), n) for i, n in FILENAME_PATTERN.findall(body))]
+                    payload = {"id": str(message_id), "attachments": [
+                        {"id": str(i), "filename": name,
+                         "url": f"https://cdn.discordapp.com/attachments/{message_id}/{i}/{name}"}
+                        for i, name in enumerate(names)]}
+                if server.latency:
+                    time.sleep(server.latency)
+                data = json.dumps(payload).encode() if payload is not None else b""
+                # Logged before answering, so the client can't move on to the next scenario first
+                with server.lock:
+                    server.log.append((status, time.monotonic() - started, length))
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                if data:
+                    self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+# --- Helper Functions ---
+def make_files(folder, count, size, prefix="bench"):
+    """count files of random bytes (so no two digests match), alternating image and small video extensions."""
+    os.makedirs(folder, exist_ok=True)
+    exts = [".png", ".jpg", ".mp4"]
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f"{prefix}_{i:05d}{exts[i % len(exts)]}")
+        with open(path, "wb") as f:
+            f.write(os.urandom(size))
+        paths.append(path)
+    return paths
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def measure(server, name, items, item_bytes, run):
+    """Run one scenario and summarise it from the server's request log."""
+    server.take_log()
+    started = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - started
+    log = server.take_log()
+    statuses = {}
+    for status, _, _ in log:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    times = [t for _, t, _ in log]
+    result = {
+        "items": items,
+        "seconds": round(seconds, 3),
+        "items_per_s": round(items / seconds, 2) if seconds else 0.0,
+        "mb_per_s": round(item_bytes / seconds / (1024 * 1024), 2) if seconds else 0.0,
+        "requests": len(log),
+        "statuses": statuses,
+        "p50_ms": round(percentile(times, 0.50) * 1000, 1),
+        "p99_ms": round(percentile(times, 0.99) * 1000, 1),
+    }
+    print(f"[DEBUG] Benchmark {name}: {result}")
+    return result
+
+def run_scenarios(core, server, files, oversize_files, args):
+    """Drive each selected scenario through the uploader's own functions."""
+    url = server.webhook_url()
+    total_bytes = sum(os.path.getsize(f) for f in files)
+    results = {}
+    def pool_map(fn, items):
+        with ThreadPoolExecutor(max_workers=core.UPLOAD_WORKERS) as executor:
+            list(executor.map(fn, items))
+    for name in args.scenarios:
+        if name == "messages":
+            run = lambda: pool_map(lambda i: core.send_text_message(url, f"benchmark message {i}"), range(args.messages))
+            results[name] = measure(server, name, args.messages, 0, run)
+        elif name == "upload_file":
+            run = lambda: pool_map(lambda f: core.upload_file(f, url, queue_on_failure=False), files)
+            results[name] = measure(server, name, len(files), total_bytes, run)
+        elif name == "process_file":
+            run = lambda: pool_map(lambda f: core.process_file(f, url), files)
+            results[name] = measure(server, name, len(files), total_bytes, run)
+        elif name == "pipeline":
+            # The production path: batching, the async engine (with httpx) and the retry drain
+            run = lambda: core.run_upload(files, url)
+            results[name] = measure(server, name, len(files), total_bytes, run)
+        elif name == "oversize":
+            # Every request is over the server's limit, so this times how fast 413s are handled
+            run = lambda: pool_map(lambda f: core.upload_file(f, url, queue_on_failure=False), oversize_files)
+            results[name] = measure(server, name, len(oversize_files),
+                                    sum(os.path.getsize(f) for f in oversize_files), run)
+    return results
+
+def git_commit():
+    """Short hash of the checked-out commit, or None outside a git checkout."""
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+def load_results(path):
+    if not os.path.exists(path):
+        return []
+    runs = []
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                runs.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return runs
+
+def compare(run, previous, threshold=REGRESSION_THRESHOLD):
+    """Lines comparing run with the previous run of the same configuration, and whether anything regressed."""
+    lines = []
+    regressed = False
+    for name, result in run["results"].items():
+        before = previous["results"].get(name)
+        if not before or not before["items_per_s"]:
+            continue
+        change = (result["items_per_s"] - before["items_per_s"]) / before["items_per_s"]
+        flag = ""
+        if change < -threshold:
+            flag = "  REGRESSION"
+            regressed = True
+        lines.append(f"  {name:<13} {before['items_per_s']:>9.2f} -> {result['items_per_s']:>9.2f} items/s "
+                     f"({change:+.1%}){flag}")
+    return lines, regressed
+
+def report(run):
+    lines = [f"{'scenario':<13} {'items':>6} {'items/s':>9} {'MB/s':>8} {'requests':>9} {'p50 ms':>8} {'p99 ms':>8}  statuses"]
+    for name, r in run["results"].items():
+        lines.append(f"{name:<13} {r['items']:>6} {r['items_per_s']:>9.2f} {r['mb_per_s']:>8.2f} {r['requests']:>9} "
+                     f"{r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f}  {r['statuses']}")
+    return lines
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the upload path against a local fake Discord webhook.")
+    parser.add_argument("--files", type=int, default=200, help="synthetic files per scenario")
+    parser.add_argument("--size-kb", type=int, default=256, help="size of each synthetic file")
+    parser.add_argument("--messages", type=int, default=200, help="text messages for the messages scenario")
+    parser.add_argument("--oversize", type=int, default=5, help="files over the size limit for the oversize scenario")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="latency added to every response")
+    parser.add_argument("--bandwidth-mbps", type=float, default=0.0, help="shared upload bandwidth in Mbit/s (0: unlimited)")
+    parser.add_argument("--max-size-mb", type=float, default=8.0, help="request size over which the server answers 413")
+    parser.add_argument("--rate-limit", type=int, default=0, help="requests per window per webhook before 429 (0: none)")
+    parser.add_argument("--rate-window", type=float, default=2.0, help="rate limit window in seconds")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma separated: " + ", ".join(SCENARIOS))
+    parser.add_argument("--results", default=RESULTS_FILE, help="file the run is appended to")
+    parser.add_argument("--label", help="note stored with the run (e.g. the change being measured)")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="items/s drop (fraction) that counts as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="exit 1 if a scenario regressed against the previous run of the same configuration")
+    parser.add_argument("--verbose", action="store_true", help="keep the uploader's logging")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in args.scenarios if s not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(unknown)}")
+    results_path = os.path.abspath(args.results)
+    config = {"files": args.files, "size_kb": args.size_kb, "messages": args.messages, "oversize": args.oversize,
+              "latency_ms": args.latency_ms, "bandwidth_mbps": args.bandwidth_mbps, "max_size_mb": args.max_size_mb,
+              "rate_limit": args.rate_limit, "rate_window": args.rate_window, "scenarios": args.scenarios}
+    out = sys.stdout
+    if not args.verbose:
+        sys.stdout = open(os.devnull, "w")
+    max_size = int(args.max_size_mb * 1024 * 1024)
+    server = FakeWebhookServer(latency=args.latency_ms / 1000, bandwidth=args.bandwidth_mbps * 125000 or None,
+                               max_size=max_size, rate_limit=args.rate_limit or None, rate_window=args.rate_window).start()
+    # The uploader keeps its databases and retry queue in the working directory, so it runs in a scratch one
+    workdir = tempfile.mkdtemp(prefix="upload-benchmark-")
+    cwd = os.getcwd()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    try:
+        os.chdir(workdir)
+        import uploader_core as core
+        core.SKIP_UPLOADED = False   # Every scenario uploads the same set again
+        core.PROBE_SIZE_LIMITS = False   # Oversize videos are split at MAX_SIZE, not sent whole to find the fake's limit
+        files = make_files(os.path.join(workdir, "files"), args.files, args.size_kb * 1024)
+        oversize_files = make_files(os.path.join(workdir, "oversize"), args.oversize, max_size + 2 * MULTIPART_ALLOWANCE, "big")
+        results = run_scenarios(core, server, files, oversize_files, args)
+        core.RECORDS_STORE.flush()
+    finally:
+        os.chdir(cwd)
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+        sys.stdout = out
+    run = {"time": round(time.time(), 3), "commit": git_commit(), "label": args.label,
+           "python": sys.version.split()[0], "config": config, "results": results}
+    previous = [r for r in load_results(results_path) if r.get("config") == config]
+    with open(results_path, "a") as f:
+        f.write(json.dumps(run) + "\n")
+    print("\n".join(report(run)))
+    print(f"Saved to {results_path}")
+    regressed = False
+    if previous:
+        lines, regressed = compare(run, previous[-1], args.threshold)
+        print(f"Compared with {previous[-1].get('commit') or 'previous run'} "
+              f"({time.strftime('%Y-%m-%d %H:%M', time.localtime(previous[-1]['time']))}):")
+        print("\n".join(lines))
+    return 1 if regressed and args.fail_on_regression else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,13 +13,16 @@ import subprocess
 import threading
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
-import requests
 import time
 import multiprocessing
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import json  # For saving/loading webhooks and upload records
 import shutil  # For file operations
 import sys
+from records_store import RecordsStore
+from record_tree import LazyRecordTree
+from thumbnail_cache import ThumbnailCache, TreeThumbnails, THUMBNAIL_HEIGHT
+from download_manager import DownloadManager, download_plan, watch_progress
 
 # Import drag-and-drop support; install tkinterdnd2 via pip if needed
 try:
@@ -32,10 +35,11 @@ except ImportError:
 STOP_EVENT = threading.Event()      # When set, processing functions will abort
 GENERATED_FILES = []                # Temporary files (e.g. video segments)
 
-# UPLOADED_RECORDS stores a mapping: 
-# { folder_path: [ { "file": local_file_path, "urls": [discord_url, ...] }, ... ] }
-UPLOADED_RECORDS_FILE = "uploaded_records.json"
-UPLOADED_RECORDS = {}
+# Upload records live in RECORDS_STORE (sqlite, shared with discord_video_uploader.py);
+# the file manager tree reads them folder by folder as folders are opened.
+RECORDS_STORE = RecordsStore()
+DOWNLOAD_MANAGER = DownloadManager()
+THUMBNAIL_CACHE = ThumbnailCache()
 
 # --- Configuration ---
 MAX_SIZE = 8 * 1024 * 1024           # 8 MB in bytes
@@ -43,22 +47,6 @@ IMAGE_EXTS = ['.png', '.jpg', '.jpeg', '.gif']
 VIDEO_EXTS = ['.mp4', '.mov', '.avi', '.mkv']
 WEBHOOKS_FILE = "saved_webhooks.json"  # File to store saved webhooks
 
-# --- Helper Functions ---
-def load_uploaded_records():
-    global UPLOADED_RECORDS
-    if os.path.exists(UPLOADED_RECORDS_FILE):
-        with open(UPLOADED_RECORDS_FILE, 'r') as f:
-            try:
-                UPLOADED_RECORDS = json.load(f)
-            except json.JSONDecodeError:
-                UPLOADED_RECORDS = {}
-    else:
-        UPLOADED_RECORDS = {}
-
-def save_uploaded_records():
-    with open(UPLOADED_RECORDS_FILE, 'w') as f:
-        json.dump(UPLOADED_RECORDS, f, indent=4)
-
 # --- Main Application Class ---
 class App(TkinterDnD.Tk):
     def __init__(self):
@@ -67,7 +55,6 @@ class App(TkinterDnD.Tk):
         self.geometry("650x550")
         self.webhooks = {}  # Dictionary to store webhooks (name: url)
         self.load_webhooks()  # Load saved webhooks from file
-        load_uploaded_records()  # Load uploaded records from JSON
         self.create_widgets()
 
     def load_webhooks(self):
@@ -85,9 +72,12 @@ class App(TkinterDnD.Tk):
 
         # Treeview with folder structure and uploaded files
         self.columns = ("Local Path", "URLs")
-        self.tree = ttk.Treeview(file_manager_frame, columns=self.columns, show="tree")
+        self.tree = ttk.Treeview(file_manager_frame, columns=self.columns, show="tree", style="Thumbs.Treeview")
+        ttk.Style(self).configure("Thumbs.Treeview", rowheight=THUMBNAIL_HEIGHT + 4)
         self.tree.pack(fill="both", expand=True)
         self.tree.heading("#0", text="Folder / File", anchor="w")
+        self.thumbnails = TreeThumbnails(self.tree, THUMBNAIL_CACHE)
+        self.record_tree = LazyRecordTree(self.tree, RECORDS_STORE, VIDEO_EXTS, thumbnails=self.thumbnails)
 
         # Populate the file manager tree
         self.populate_file_manager()
@@ -100,21 +90,14 @@ class App(TkinterDnD.Tk):
         self.tree.bind("<Button-3>", self.open_context_menu)
 
     def populate_file_manager(self):
-        """Populate the file manager tree with uploaded records."""
-        self.tree.delete(*self.tree.get_children())
-        for folder, records in UPLOADED_RECORDS.items():
-            parent_id = self.tree.insert("", "end", iid=folder, text=folder, open=True, values=(folder,))
-            for rec in records:
-                ext = os.path.splitext(rec["file"])[1].lower()
-                if ext in VIDEO_EXTS:
-                    display = os.path.basename(rec["file"])
-                    self.tree.insert(parent_id, "end", text=display, values=(rec["file"], json.dumps(rec["urls"])))
+        """Populate the file manager tree with one node per folder; records are loaded when a folder is opened."""
+        self.record_tree.populate()
 
     def open_context_menu(self, event):
         """Open context menu on right-click."""
         item = self.tree.identify_row(event.y)
-        if not item:
-            return
+        if not item or (not self.record_tree.is_folder(item) and self.record_tree.record(item) is None):
+            return  # Placeholder and "Show more" nodes have no actions
 
         context_menu = tk.Menu(self, tearoff=0)
         context_menu.add_command(label="Delete", command=lambda: self.delete_item(item))
@@ -130,31 +113,24 @@ class App(TkinterDnD.Tk):
             return
 
         # Handle folder and file deletion
-        if item in UPLOADED_RECORDS:
-            del UPLOADED_RECORDS[item]  # Delete entire folder
+        folder = self.record_tree.folder_of(item)
+        if item == folder:
+            RECORDS_STORE.delete_folder(folder)  # Delete entire folder
         else:
-            parent = self.tree.parent(item)
-            if parent in UPLOADED_RECORDS:
-                records = UPLOADED_RECORDS.get(parent, [])
-                new_records = [rec for rec in records if rec["file"] != path]
-                if new_records:
-                    UPLOADED_RECORDS[parent] = new_records
-                else:
-                    del UPLOADED_RECORDS[parent]
-
-        # Save updated records and refresh tree
-        save_uploaded_records()
-        self.populate_file_manager()
+            RECORDS_STORE.delete_file(folder, path)
+
+        # Refresh only the affected folder node
+        self.record_tree.refresh_folder(folder)
         messagebox.showinfo("Info", f"Deleted '{path}' successfully.")
 
     def download_videos_from_item(self, item):
         """Download videos from the selected directory or file node."""
-        path = self.tree.item(item, "values")[0]
-        parent = self.tree.parent(item) if not path else item
-
-        # Get all video records for the selected folder
-        records = UPLOADED_RECORDS.get(parent, [])
-        video_records = [rec for rec in records if os.path.splitext(rec["file"])[1].lower() in VIDEO_EXTS and rec["urls"]]
+        rec = self.record_tree.record(item)
+        if rec is not None:
+            records = [rec]
+        else:
+            records = self.record_tree.records(self.record_tree.folder_of(item))
+        video_records = [rec for rec in records if rec["urls"]]
 
         if not video_records:
             messagebox.showinfo("Info", "No videos available for download.")
@@ -164,29 +140,16 @@ class App(TkinterDnD.Tk):
         if not dest:
             return
 
-        total_files = len(video_records)
-        self.download_progress["maximum"] = total_files
+        # Downloads run in the background; the progress bar is polled from the Tk loop
         self.download_progress["value"] = 0
+        job = DOWNLOAD_MANAGER.start(*download_plan(video_records, dest))
+        watch_progress(self, job, self.download_progress, on_finish=self.download_finished)
 
-        for count, rec in enumerate(video_records, 1):
-            base_name = os.path.basename(rec["file"])
-            for i, url in enumerate(rec["urls"]):
-                file_name = f"{base_name}" if len(rec["urls"]) == 1 else f"{os.path.splitext(base_name)[0]}_{i}{os.path.splitext(base_name)[1]}"
-                dest_path = os.path.join(dest, file_name)
-                try:
-                    r = requests.get(url, stream=True)
-                    if r.status_code == 200:
-                        with open(dest_path, "wb") as f:
-                            for chunk in r.iter_content(chunk_size=8192):
-                                f.write(chunk)
-                        print(f"[DEBUG] Downloaded {url} to {dest_path}")
-                    else:
-                        print(f"[ERROR] Failed to download {url}. Status: {r.status_code}")
-                except Exception as e:
-                    print(f"[ERROR] Exception downloading {url}: {e}")
-            self.download_progress["value"] = count
-
-        messagebox.showinfo("Info", "Download process completed.")
+    def download_finished(self, job):
+        if job.failed:
+            messagebox.showwarning("Warning", f"Download finished; {len(job.failed)} files failed (run it again to resume them).")
+        else:
+            messagebox.showinfo("Info", "Download process completed.")
 
 if __name__ == "__main__":
     app = App()
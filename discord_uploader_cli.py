@@ -0,0 +1,271 @@
+#headless command line for the uploader (upload, watch, reconcile, download, resume, status) for servers and cron; prints JSON progress events
+import time
+STARTED = time.perf_counter()
+import os
+import sys
+import json
+import signal
+import argparse
+import threading
+
+# --- Configuration ---
+PROGRESS_INTERVAL = 1.0   # Seconds between progress events
+
+# JSON events go to stdout, one per line; [DEBUG]/[ERROR] logging is moved to stderr
+EVENT_OUT = sys.stdout
+EVENT_LOCK = threading.Lock()
+
+# --- Helper Functions ---
+def emit(event, **fields):
+    """Write one JSON progress event."""
+    line = json.dumps({"event": event, "time": round(time.time(), 3), **fields})
+    with EVENT_LOCK:
+        EVENT_OUT.write(line + "\n")
+        EVENT_OUT.flush()
+
+def elapsed_ms():
+    """Milliseconds since this script started importing."""
+    return round((time.perf_counter() - STARTED) * 1000, 1)
+
+def resolve_webhooks(names, saved):
+    """Webhook URLs for --webhook values, each a saved webhook name or a URL."""
+    urls = []
+    for name in names:
+        if name in saved:
+            urls.append(saved[name])
+        elif name.startswith("http://") or name.startswith("https://"):
+            urls.append(name)
+        else:
+            raise SystemExit(f"Unknown webhook '{name}' (not in saved webhooks and not a URL).")
+    return urls
+
+def load_core(args):
+    """Import the upload engine (only the commands that upload pay for it) and apply the global options."""
+    import uploader_core as core
+    from ffmpeg_runner import add_listener
+    core.REENCODE_MODE = args.reencode
+    add_listener(emit_ffmpeg)
+    return core
+
+def emit_ffmpeg(event):
+    """ffmpeg runner listener: split and encode progress as "ffmpeg" events."""
+    emit("ffmpeg", **{k: round(v, 2) if isinstance(v, float) else v for k, v in event.items()})
+
+def run_with_progress(core, files, webhook_url, announcement, job, done_before=0):
+    """Run an upload on a worker thread, emitting progress events until it finishes; returns its status."""
+    total = done_before + len(files)
+    counter = {"done": done_before}
+    counter_lock = threading.Lock()
+    def files_done(count):
+        with counter_lock:
+            counter["done"] += count
+    result = {}
+    worker = threading.Thread(target=lambda: result.update(
+        status=core.run_upload(files, webhook_url, announcement, job, on_files_done=files_done)))
+    worker.start()
+    while worker.is_alive():
+        worker.join(PROGRESS_INTERVAL)
+        pipeline = core.ACTIVE_PIPELINE
+        emit("progress", job=job.id, done=counter["done"], total=total,
+             pipeline=pipeline.stats() if pipeline is not None else None)
+    return result.get("status", "failed")
+
+def stop_on_signals(core):
+    """Ctrl+C / SIGTERM stop the upload the same way the GUI's Stop button does."""
+    def handler(signum, frame):
+        print(f"[DEBUG] Signal {signum} received; stopping.")
+        core.STOP_EVENT.set()
+    signal.signal(signal.SIGINT, handler)
+    signal.signal(signal.SIGTERM, handler)
+
+# --- Commands ---
+def cmd_upload(args):
+    core = load_core(args)
+    urls = resolve_webhooks(args.webhook, core.load_webhooks())
+    files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            files.extend(core.find_media_files(path, args.recursive))
+        elif os.path.isfile(path):
+            files.append(path)
+        else:
+            print(f"[ERROR] No such file or folder: {path}")
+    # Absolute paths, so records and the resume journal match whatever directory the next run starts in
+    files = list(dict.fromkeys(os.path.abspath(f) for f in files))
+    if not files:
+        emit("finished", status="nothing_to_upload")
+        return 0
+    stop_on_signals(core)
+    job = core.JOB_JOURNAL.create(files, urls, args.announce)
+    emit("started", command="upload", job=job.id, files=len(files), webhooks=len(urls), ready_ms=elapsed_ms())
+    status = run_with_progress(core, files, core.webhook_target(urls), args.announce, job)
+    emit("finished", status=status, job=job.id, counts=job.counts(), retry_queue=len(core.RETRY_QUEUE))
+    return 0 if status == "done" else 1
+
+def cmd_resume(args):
+    core = load_core(args)
+    job = core.JOB_JOURNAL.latest_unfinished()
+    if job is None:
+        emit("finished", status="nothing_to_resume")
+        return 0
+    files = core.resumable_files(job)
+    total = sum(job.counts().values())
+    if not files:
+        job.set_status("done")
+        emit("finished", status="done", job=job.id, counts=job.counts())
+        return 0
+    stop_on_signals(core)
+    emit("started", command="resume", job=job.id, files=len(files), total=total, ready_ms=elapsed_ms())
+    status = run_with_progress(core, files, core.webhook_target(job.webhook_urls), None, job, total - len(files))
+    emit("finished", status=status, job=job.id, counts=job.counts(), retry_queue=len(core.RETRY_QUEUE))
+    return 0 if status == "done" else 1
+
+def cmd_discard(args):
+    core = load_core(args)
+    job = core.JOB_JOURNAL.latest_unfinished()
+    if job is None:
+        emit("finished", status="nothing_to_discard")
+        return 0
+    deleted = core.discard_job(job)
+    emit("finished", status="discarded", job=job.id, counts=job.counts(), deleted_segments=deleted)
+    return 0
+
+def cmd_watch(args):
+    core = load_core(args)
+    urls = resolve_webhooks(args.webhook, core.load_webhooks())
+    if not os.path.isdir(args.folder):
+        raise SystemExit(f"No such folder: {args.folder}")
+    stop_on_signals(core)
+    counter = {"done": 0, "total": 0}
+    counter_lock = threading.Lock()
+    def files_done(count):
+        with counter_lock:
+            counter["done"] += count
+    def batch(files):
+        with counter_lock:
+            counter["total"] += len(files)
+        emit("batch", files=files)
+    worker = threading.Thread(target=core.watch_folder, args=(args.folder, core.webhook_target(urls), args.recursive),
+                              kwargs={"on_files_done": files_done, "on_batch": batch})
+    worker.start()
+    emit("started", command="watch", folder=args.folder, webhooks=len(urls), ready_ms=elapsed_ms())
+    while worker.is_alive():
+        worker.join(PROGRESS_INTERVAL)
+        pipeline = core.ACTIVE_PIPELINE
+        if pipeline is not None:
+            emit("progress", done=counter["done"], total=counter["total"], pipeline=pipeline.stats())
+    emit("finished", status="stopped", done=counter["done"], total=counter["total"], retry_queue=len(core.RETRY_QUEUE))
+    return 0
+
+def cmd_reconcile(args):
+    core = load_core(args)
+    from reconcile import reconcile_folder, gap_job
+    if not os.path.isdir(args.folder):
+        raise SystemExit(f"No such folder: {args.folder}")
+    urls = resolve_webhooks(args.webhook, core.load_webhooks()) if args.webhook else []
+    result = reconcile_folder(args.folder, args.recursive)
+    fields = {"missing": result.missing, "partial": list(result.partial), "changed": result.changed,
+              "gone": result.gone} if args.list else {}
+    emit("reconcile", folder=args.folder, counts=result.counts(), **fields)
+    if not urls:
+        return 0 if not result.gaps() else 1
+    files, job = gap_job(result, urls)
+    if job is None:
+        emit("finished", status="nothing_to_upload")
+        return 0
+    stop_on_signals(core)
+    emit("started", command="reconcile", job=job.id, files=len(files), webhooks=len(urls), ready_ms=elapsed_ms())
+    status = run_with_progress(core, files, core.webhook_target(urls), None, job)
+    emit("finished", status=status, job=job.id, counts=job.counts(), retry_queue=len(core.RETRY_QUEUE))
+    return 0 if status == "done" else 1
+
+def cmd_download(args):
+    from records_store import RecordsStore
+    from download_manager import DownloadManager, download_plan
+    records = [rec for rec in RecordsStore().records(args.folder) if rec["urls"]]
+    if not records:
+        emit("finished", status="nothing_to_download", folder=args.folder)
+        return 0
+    tasks, joins = download_plan(records, args.dest, folder=args.folder)
+    job = DownloadManager(workers=args.workers).start(tasks, joins)
+    signal.signal(signal.SIGINT, lambda signum, frame: job.cancel())
+    signal.signal(signal.SIGTERM, lambda signum, frame: job.cancel())
+    emit("started", command="download", folder=args.folder, files=len(tasks), joins=len(joins))
+    while not job.finished.wait(PROGRESS_INTERVAL):
+        done_bytes, total_bytes, completed, total = job.progress()
+        emit("progress", done_bytes=done_bytes, total_bytes=total_bytes, done=completed, total=total)
+    status = "stopped" if job.cancelled.is_set() else "done"
+    emit("finished", status=status, done=job.completed, failed=job.failed)
+    return 0 if status == "done" and not job.failed else 1
+
+def cmd_status(args):
+    from records_store import RecordsStore
+    from job_journal import JobJournal
+    from upload_scheduler import RetryQueue, WebhookSizeLimits
+    job = JobJournal().latest_unfinished()
+    folders = RecordsStore().folders()
+    emit("status",
+         unfinished_job={"id": job.id, "counts": job.counts()} if job is not None else None,
+         retry_queue=len(RetryQueue()),
+         size_limits=WebhookSizeLimits().entries,
+         folders=folders if args.folders else len(folders))
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Upload media to Discord webhooks without the GUI.")
+    parser.add_argument("--quiet", action="store_true", help="drop all logging, leaving only the JSON events")
+    parser.add_argument("--reencode", choices=("never", "auto", "always"), default="never",
+                        help="re-encode videos that need splitting into fewer segments: never, when it saves enough uploads (auto), or always")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    upload = commands.add_parser("upload", help="upload files and folders")
+    upload.add_argument("paths", nargs="+", help="files or folders to upload")
+    upload.add_argument("--webhook", action="append", required=True,
+                        help="saved webhook name or URL; repeat to shard across several")
+    upload.add_argument("--recursive", action="store_true", help="include subfolders")
+    upload.add_argument("--announce", help="message sent with the first batch")
+    upload.set_defaults(func=cmd_upload)
+
+    resume = commands.add_parser("resume", help="continue the last stopped or crashed upload job")
+    resume.set_defaults(func=cmd_resume)
+
+    discard = commands.add_parser("discard", help="drop the last unfinished job and delete the segments it left on disk")
+    discard.set_defaults(func=cmd_discard)
+
+    watch = commands.add_parser("watch", help="keep running and upload new media as it lands in a folder")
+    watch.add_argument("folder", help="folder to watch; files already in it are ignored")
+    watch.add_argument("--webhook", action="append", required=True,
+                       help="saved webhook name or URL; repeat to shard across several")
+    watch.add_argument("--recursive", action="store_true", help="include subfolders")
+    watch.set_defaults(func=cmd_watch)
+
+    reconcile = commands.add_parser("reconcile", help="compare a folder with the upload records and upload the gaps")
+    reconcile.add_argument("folder", help="folder to check")
+    reconcile.add_argument("--recursive", action="store_true", help="include subfolders")
+    reconcile.add_argument("--list", action="store_true", help="list the files in each group, not just counts")
+    reconcile.add_argument("--webhook", action="append",
+                           help="upload the missing, partial and changed files here (saved name or URL; repeat to shard)")
+    reconcile.set_defaults(func=cmd_reconcile)
+
+    download = commands.add_parser("download", help="download an uploaded folder (split videos are reassembled)")
+    download.add_argument("folder", help="uploaded folder as shown by 'status --folders'")
+    download.add_argument("dest", help="destination folder")
+    download.add_argument("--workers", type=int, default=6, help="files downloaded at the same time")
+    download.set_defaults(func=cmd_download)
+
+    status = commands.add_parser("status", help="unfinished job, retry queue and uploaded folders")
+    status.add_argument("--folders", action="store_true", help="list the uploaded folders")
+    status.set_defaults(func=cmd_status)
+    return parser
+
+def main(argv=None):
+    global EVENT_OUT
+    args = build_parser().parse_args(argv)
+    EVENT_OUT = sys.stdout
+    # Keep stdout for JSON events only
+    sys.stdout = open(os.devnull, "w") if args.quiet else sys.stderr
+    emit("startup", command=args.command, startup_ms=elapsed_ms())
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
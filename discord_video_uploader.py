@@ -1,17 +1,25 @@
 #uploads videos in a folder in discord using discord webhooks , splits files bigger than 8mb into smaller sectionf of 8mb
 import os
-import math
 import subprocess
 import threading
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
-import requests
-import time
-import multiprocessing
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import json  # For saving/loading webhooks and upload records
+import json  # For saving/loading webhooks
 import shutil  # For file operations
 import sys
+import queue
+import uploader_core
+from uploader_core import (STOP_EVENT, RECORDS_STORE, JOB_JOURNAL, RETRY_QUEUE, DOWNLOAD_MANAGER,
+                           IMAGE_EXTS, VIDEO_EXTS, WEBHOOKS_FILE, SPLIT_WORKERS,
+                           save_uploaded_records, drain_retry_queue, discard_job, cleanup_generated_files, load_webhooks, webhook_target,
+                           resumable_files, run_upload, watch_folder)
+from media_scanner import scan_media
+from record_tree import LazyRecordTree
+from thumbnail_cache import ThumbnailCache, TreeThumbnails, THUMBNAIL_HEIGHT
+from download_manager import download_plan, watch_progress
+from upload_scheduler import WebhookShards
+from reconcile import reconcile_folder, gap_job
+from ffmpeg_runner import RunBoard, FileProgress, add_listener
 
 # Import drag-and-drop support; install tkinterdnd2 via pip if needed
 try:
@@ -20,229 +28,48 @@ except ImportError:
     messagebox.showerror("Import Error", "Please install tkinterdnd2 (pip install tkinterdnd2)")
     raise
 
-# --- Global cancellation, cleanup and upload tracking ---
-STOP_EVENT = threading.Event()      # When set, processing functions will abort
-GENERATED_FILES = []                # Temporary files (e.g. video segments)
-
-# UPLOADED_RECORDS stores a mapping: 
-# { folder_path: [ { "file": local_file_path, "urls": [discord_url, ...] }, ... ] }
-UPLOADED_RECORDS_FILE = "uploaded_records.json"
-UPLOADED_RECORDS = {}
+# The upload engine lives in uploader_core.py (shared with discord_uploader_cli.py)
+THUMBNAIL_CACHE = ThumbnailCache()
 
 # --- Configuration ---
-MAX_SIZE = 8 * 1024 * 1024           # 8 MB in bytes
-IMAGE_EXTS = ['.png', '.jpg', '.jpeg', '.gif']
-VIDEO_EXTS = ['.mp4', '.mov', '.avi', '.mkv']
-WEBHOOKS_FILE = "saved_webhooks.json"  # File to store saved webhooks
-
-# --- Helper Functions ---
-def load_uploaded_records():
-    global UPLOADED_RECORDS
-    if os.path.exists(UPLOADED_RECORDS_FILE):
-        with open(UPLOADED_RECORDS_FILE, 'r') as f:
-            try:
-                UPLOADED_RECORDS = json.load(f)
-            except json.JSONDecodeError:
-                UPLOADED_RECORDS = {}
-    else:
-        UPLOADED_RECORDS = {}
-
-def save_uploaded_records():
-    with open(UPLOADED_RECORDS_FILE, 'w') as f:
-        json.dump(UPLOADED_RECORDS, f, indent=4)
-
-def send_text_message(webhook_url, message_text):
-    """Send a plain text message to the Discord webhook."""
-    print(f"[DEBUG] Sending message: {message_text}")
-    try:
-        payload = {"content": message_text}
-        response = requests.post(webhook_url, json=payload)
-        if response.status_code in (200, 204):
-            print("[DEBUG] Message sent successfully!")
-        else:
-            print(f"[ERROR] Failed to send message. Status: {response.status_code}")
-    except Exception as e:
-        print(f"[ERROR] Exception sending message: {e}")
-
-def upload_file(file_path, webhook_url):
-    """Upload a file to Discord via webhook and record its information in UPLOADED_RECORDS."""
-    if STOP_EVENT.is_set():
-        print(f"[DEBUG] Upload cancelled for file: {file_path}")
-        return
-    print(f"[DEBUG] Uploading file: {file_path}")
-    # Ensure wait=true so that Discord returns a JSON response
-    if "wait=true" not in webhook_url:
-        if "?" in webhook_url:
-            upload_url = webhook_url + "&wait=true"
-        else:
-            upload_url = webhook_url + "?wait=true"
-    else:
-        upload_url = webhook_url
-    try:
-        with open(file_path, "rb") as f:
-            files = {"file": f}
-            response = requests.post(upload_url, files=files)
-        if response.status_code in (200, 204):
-            try:
-                data = response.json()
-                urls = []
-                if "attachments" in data:
-                    urls = [att.get("url") for att in data["attachments"] if att.get("url")]
-                print(f"[DEBUG] Uploaded URLs for {file_path}: {urls}")
-            except Exception as e:
-                print(f"[ERROR] Could not decode JSON response for {file_path}: {e}")
-                urls = []
-            folder = os.path.dirname(file_path)
-            record = {"file": file_path, "urls": urls}
-            if folder in UPLOADED_RECORDS:
-                UPLOADED_RECORDS[folder].append(record)
-            else:
-                UPLOADED_RECORDS[folder] = [record]
-            save_uploaded_records()
-            print(f"[DEBUG] Uploaded {file_path} successfully!")
-        else:
-            print(f"[ERROR] Failed to upload {file_path}. Status: {response.status_code}")
-    except Exception as e:
-        print(f"[ERROR] Exception uploading {file_path}: {e}")
-
-def get_video_duration(input_file):
-    """Use ffprobe to obtain video duration in seconds."""
-    cmd = [
-        "ffprobe", "-v", "error", "-select_streams", "v:0",
-        "-show_entries", "format=duration",
-        "-of", "default=noprint_wrappers=1:nokey=1", input_file
-    ]
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    try:
-        duration = float(result.stdout.strip())
-        print(f"[DEBUG] Duration of {input_file}: {duration} seconds")
-        return duration
-    except Exception as e:
-        print(f"[ERROR] Could not get duration for {input_file}: {e}")
-        return None
-
-def split_video(input_file, output_pattern):
-    """
-    Splits the video into segments using ffmpeg.
-    Each segment resets timestamps to avoid audio/video glitches.
-    """
-    duration = get_video_duration(input_file)
-    if duration is None:
-        return []
-    file_size = os.path.getsize(input_file)
-    num_segments = math.ceil(file_size / MAX_SIZE)
-    seg_duration = duration / num_segments
-    seg_duration_str = f"{seg_duration:.2f}"
-    print(f"[DEBUG] Splitting {input_file} into {num_segments} segments (approx {seg_duration_str} sec each)")
-    cmd = [
-        "ffmpeg", "-i", input_file, "-c", "copy", "-map", "0",
-        "-segment_time", seg_duration_str, "-reset_timestamps", "1",
-        "-f", "segment", output_pattern
-    ]
-    print(f"[DEBUG] Running ffmpeg: {' '.join(cmd)}")
-    subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    base_dir = os.path.dirname(input_file)
-    base_name = os.path.splitext(os.path.basename(input_file))[0]
-    ext = os.path.splitext(input_file)[1]
-    segments = []
-    for filename in os.listdir(base_dir):
-        if (filename.startswith(base_name) and filename.endswith(ext)
-            and filename != os.path.basename(input_file)):
-            seg_path = os.path.join(base_dir, filename)
-            segments.append(seg_path)
-            GENERATED_FILES.append(seg_path)
-    segments.sort()
-    print(f"[DEBUG] Segments found: {segments}")
-    return segments
-
-def process_video_file(file_path, webhook_url):
-    """Process a video file: upload directly if small or split and upload segments if too large."""
-    if STOP_EVENT.is_set():
-        print(f"[DEBUG] Skipping video {file_path} due to stop request.")
-        return
-    print(f"[DEBUG] Processing video file: {file_path}")
-    file_size = os.path.getsize(file_path)
-    if file_size <= MAX_SIZE:
-        upload_file(file_path, webhook_url)
-    else:
-        dir_name = os.path.dirname(file_path)
-        base_name, ext = os.path.splitext(os.path.basename(file_path))
-        output_pattern = os.path.join(dir_name, f"{base_name}_%03d{ext}")
-        segments = split_video(file_path, output_pattern)
-        for seg in segments:
-            if STOP_EVENT.is_set():
-                print("[DEBUG] Stop requested during segment upload; aborting further uploads.")
-                break
-            upload_file(seg, webhook_url)
-            time.sleep(0.5)
-        for seg in segments:
-            if os.path.exists(seg):
-                try:
-                    os.remove(seg)
-                    print(f"[DEBUG] Deleted segment: {seg}")
-                    if seg in GENERATED_FILES:
-                        GENERATED_FILES.remove(seg)
-                except Exception as e:
-                    print(f"[ERROR] Could not delete segment {seg}: {e}")
-
-def process_image_file(file_path, webhook_url):
-    """Process an image file by uploading it."""
-    if STOP_EVENT.is_set():
-        print(f"[DEBUG] Skipping image {file_path} due to stop request.")
-        return
-    print(f"[DEBUG] Processing image file: {file_path}")
-    upload_file(file_path, webhook_url)
-
-def process_file(file_path, webhook_url):
-    """Determine file type and process accordingly."""
-    if STOP_EVENT.is_set():
-        print(f"[DEBUG] Skipping file {file_path} due to stop request.")
-        return
-    ext = os.path.splitext(file_path)[1].lower()
-    if ext in IMAGE_EXTS:
-        process_image_file(file_path, webhook_url)
-    elif ext in VIDEO_EXTS:
-        process_video_file(file_path, webhook_url)
-    else:
-        print(f"[DEBUG] Skipping unsupported file: {file_path}")
-
-def cleanup_generated_files():
-    """Delete all temporary files recorded in GENERATED_FILES."""
-    print("[DEBUG] Cleaning up generated temporary files...")
-    for f in GENERATED_FILES.copy():
-        if os.path.exists(f):
-            try:
-                os.remove(f)
-                print(f"[DEBUG] Deleted generated file: {f}")
-                GENERATED_FILES.remove(f)
-            except Exception as e:
-                print(f"[ERROR] Could not delete generated file {f}: {e}")
+PIPELINE_REPORT_INTERVAL = 1000        # Milliseconds between pipeline status updates in the GUI
+SCAN_POLL_INTERVAL = 50                # Milliseconds between checks for scanned files
+SCAN_INSERT_PER_TICK = 5000            # Most paths added to the file list per check
 
 # --- GUI Application ---
 class App(TkinterDnD.Tk):
     def __init__(self):
         super().__init__()
         self.title("Discord Media Uploader")
-        self.geometry("650x550")
+        self.geometry("650x620")
         self.webhooks = {}  # Dictionary to store webhooks (name: url)
         self.load_webhooks()  # Load saved webhooks from file
-        load_uploaded_records()  # Load uploaded records from JSON
+        if len(RETRY_QUEUE):
+            # Uploads left over from a previous run are retried in the background
+            threading.Thread(target=drain_retry_queue, daemon=True).start()
         self.selected_webhook = tk.StringVar()  # Selected webhook name
         self.folder_path = tk.StringVar()
         self.recursive = tk.BooleanVar(value=False)  # Checkbox for recursive search
+        self.sharded = tk.BooleanVar(value=False)  # Spread one upload across several webhooks
+        self.reencode_mode = tk.StringVar(value=uploader_core.REENCODE_MODE)  # Re-encode badly compressed videos into fewer segments
+        self.reencode_mode.trace_add("write", lambda *args: setattr(uploader_core, "REENCODE_MODE", self.reencode_mode.get()))
         self.file_list = []  # List of full file paths to upload
+        self.file_index = set()  # Same paths, for O(1) duplicate checks
+        self.scan_results = queue.Queue()  # Batches of paths from the background folder scan
+        self.check_results = queue.Queue()  # Folder checks (reconciliations) finished in the background
         self.total_files = 0
         self.processed_files = 0
+        self.watching = False  # Watch mode uploads new files as they land in the selected folder
+        self.running = False  # An upload or watch thread is working
+        self.reporting = False  # The pipeline report loop is scheduled (at most one at a time)
+        self.ffmpeg_runs = RunBoard()  # ffmpeg jobs in progress, shown under the pipeline status
+        self.file_progress = FileProgress()  # Share of each file's ffmpeg work done, for the progress bar
         self.create_widgets()
+        add_listener(self.ffmpeg_progress)
 
     def load_webhooks(self):
         """Load saved webhooks from the JSON file."""
-        if os.path.exists(WEBHOOKS_FILE):
-            with open(WEBHOOKS_FILE, 'r') as file:
-                try:
-                    self.webhooks = json.load(file)
-                except json.JSONDecodeError:
-                    self.webhooks = {}
+        self.webhooks = load_webhooks()
 
     def save_webhooks(self):
         """Save webhooks to the JSON file."""
@@ -264,6 +91,13 @@ class App(TkinterDnD.Tk):
         tk.Label(webhook_frame, text="Select Webhook:").pack(side="left", padx=5)
         self.webhook_dropdown = ttk.Combobox(webhook_frame, textvariable=self.selected_webhook, state="readonly")
         self.webhook_dropdown.pack(side="left", padx=5)
+
+        # Sharding frame: pick several webhooks to spread one upload across
+        shard_frame = tk.Frame(self)
+        shard_frame.pack(pady=5, fill="x", padx=10)
+        tk.Checkbutton(shard_frame, text="Shard upload across webhooks:", variable=self.sharded).pack(side="left")
+        self.shard_listbox = tk.Listbox(shard_frame, selectmode="multiple", height=3, exportselection=False)
+        self.shard_listbox.pack(side="left", fill="x", expand=True, padx=5)
         self.update_webhook_dropdown()
 
         # Folder selection frame
@@ -274,6 +108,8 @@ class App(TkinterDnD.Tk):
         tk.Button(folder_frame, text="Browse", command=self.browse_folder).pack(side="left", padx=5)
         tk.Button(folder_frame, text="Add Folder Files", command=self.add_folder_files).pack(side="left", padx=5)
         tk.Checkbutton(folder_frame, text="Recursive File Search", variable=self.recursive).pack(side="left", padx=5)
+        self.check_button = tk.Button(folder_frame, text="Check Folder", command=self.check_folder)
+        self.check_button.pack(side="left", padx=5)
         tk.Button(folder_frame, text="Download Videos", command=self.download_videos).pack(side="left", padx=5)
         tk.Button(folder_frame, text="Open File Manager", command=self.open_file_manager).pack(side="left", padx=5)
 
@@ -290,18 +126,33 @@ class App(TkinterDnD.Tk):
         btn_frame = tk.Frame(self)
         btn_frame.pack(pady=10)
         tk.Button(btn_frame, text="Clear File List", command=self.clear_file_list).pack(side="left", padx=5)
-        tk.Button(btn_frame, text="Start Upload", command=self.start_upload).pack(side="left", padx=5)
+        self.start_button = tk.Button(btn_frame, text="Start Upload", command=self.start_upload)
+        self.start_button.pack(side="left", padx=5)
         tk.Button(btn_frame, text="Stop Upload", command=self.stop_upload).pack(side="left", padx=5)
+        self.resume_button = tk.Button(btn_frame, text="Resume Job", command=self.resume_job)
+        self.resume_button.pack(side="left", padx=5)
+        tk.Label(btn_frame, text="Re-encode to fit:").pack(side="left", padx=5)
+        ttk.Combobox(btn_frame, textvariable=self.reencode_mode, values=("never", "auto", "always"),
+                     state="readonly", width=7).pack(side="left")
 
         # Progress bar for upload progress
         self.progress = ttk.Progressbar(self, orient="horizontal", length=550, mode="determinate")
         self.progress.pack(pady=10)
+        self.pipeline_status = tk.Label(self, text="")
+        self.pipeline_status.pack()
+        self.ffmpeg_status = tk.Label(self, text="")
+        self.ffmpeg_status.pack()
+        self.watch_button = tk.Button(self, text="Watch Folder", command=self.toggle_watch)
+        self.watch_button.pack(pady=5)
 
     def update_webhook_dropdown(self):
         """Update the webhook dropdown with the current list of webhooks."""
         self.webhook_dropdown['values'] = list(self.webhooks.keys())
         if self.webhook_dropdown['values']:
             self.selected_webhook.set(self.webhook_dropdown['values'][0])
+        self.shard_listbox.delete(0, tk.END)
+        for name in self.webhooks:
+            self.shard_listbox.insert(tk.END, name)
 
     def save_webhook(self):
         """Save a new webhook or update an existing one."""
@@ -339,78 +190,291 @@ class App(TkinterDnD.Tk):
         if not folder:
             messagebox.showerror("Error", "Please select a folder first.")
             return
-        if self.recursive.get():
-            for root, _, files in os.walk(folder):
-                for file in files:
-                    file_full = os.path.join(root, file)
-                    ext = os.path.splitext(file_full)[1].lower()
-                    if ext in IMAGE_EXTS or ext in VIDEO_EXTS:
-                        if file_full not in self.file_list:
-                            self.file_list.append(file_full)
-                            self.file_listbox.insert(tk.END, file_full)
-        else:
-            for entry in os.listdir(folder):
-                file_full = os.path.join(folder, entry)
-                if os.path.isfile(file_full):
-                    ext = os.path.splitext(file_full)[1].lower()
-                    if ext in IMAGE_EXTS or ext in VIDEO_EXTS:
-                        if file_full not in self.file_list:
-                            self.file_list.append(file_full)
-                            self.file_listbox.insert(tk.END, file_full)
+        # Scan in the background; batches are added to the list from the Tk loop as they arrive
+        recursive = self.recursive.get()
+        def scan():
+            scan_media(folder, IMAGE_EXTS + VIDEO_EXTS, recursive, on_batch=self.scan_results.put)
+            self.scan_results.put(None)
+        threading.Thread(target=scan, daemon=True).start()
+        self.after(SCAN_POLL_INTERVAL, self.drain_scan_results)
+
+    def drain_scan_results(self):
+        """Add scanned batches to the file list, at most SCAN_INSERT_PER_TICK paths per tick to keep the window responsive."""
+        added = 0
+        while added < SCAN_INSERT_PER_TICK:
+            try:
+                batch = self.scan_results.get_nowait()
+            except queue.Empty:
+                break
+            if batch is None:
+                print(f"[DEBUG] Folder scan finished; {len(self.file_list)} files in the list.")
+                return
+            added += self.add_files(batch)
+        self.after(SCAN_POLL_INTERVAL, self.drain_scan_results)
+
+    def add_files(self, paths):
+        """Append paths not already in the list (set lookup) with a single Listbox insert. Returns how many were new."""
+        new = [p for p in paths if p not in self.file_index]
+        self.file_index.update(new)
+        self.file_list.extend(new)
+        if new:
+            self.file_listbox.insert(tk.END, *new)
+        return len(new)
 
     def on_drop(self, event):
-        files = self.tk.splitlist(event.data)
-        for f in files:
-            if os.path.isfile(f):
-                ext = os.path.splitext(f)[1].lower()
-                if ext in IMAGE_EXTS or ext in VIDEO_EXTS:
-                    if f not in self.file_list:
-                        self.file_list.append(f)
-                        self.file_listbox.insert(tk.END, f)
-                        print(f"[DEBUG] Added via drag-and-drop: {f}")
+        files = [f for f in self.tk.splitlist(event.data)
+                 if os.path.splitext(f)[1].lower() in IMAGE_EXTS + VIDEO_EXTS and os.path.isfile(f)]
+        added = self.add_files(files)
+        print(f"[DEBUG] Added {added} files via drag-and-drop.")
 
     def clear_file_list(self):
         self.file_list = []
+        self.file_index = set()
         self.file_listbox.delete(0, tk.END)
 
-    def start_upload(self):
+    def selected_webhook_target(self):
+        """The selected webhook URL, or WebhookShards when sharding; None (after telling the user) if nothing valid is selected."""
         selected_webhook_name = self.selected_webhook.get()
         if not selected_webhook_name:
             messagebox.showerror("Error", "Please select a webhook to use.")
-            return
+            return None
         webhook_url = self.webhooks[selected_webhook_name]
+        if self.sharded.get():
+            names = [self.shard_listbox.get(i) for i in self.shard_listbox.curselection()]
+            if len(names) < 2:
+                messagebox.showerror("Error", "Select at least two webhooks to shard across.")
+                return None
+            webhook_url = WebhookShards([self.webhooks[name] for name in names])
+            print(f"[DEBUG] Sharding upload across webhooks: {names}")
+        return webhook_url
+
+    def start_upload(self):
+        if self.busy():
+            return
+        webhook_url = self.selected_webhook_target()
+        if webhook_url is None:
+            return
         if not self.file_list:
             messagebox.showinfo("Info", "No files to process. Drag and drop files or add folder files.")
             return
+        unfinished = JOB_JOURNAL.latest_unfinished()
+        if unfinished is not None:
+            # Starting over instead of resuming: offer to drop the old job and the split segments it left on disk
+            answer = messagebox.askyesnocancel(
+                "Unfinished Job", f"Job {unfinished.id} never finished. Discard it and delete its "
+                                  f"{len(unfinished.leftover_segments())} leftover segments?\n\nNo keeps it for Resume Job.")
+            if answer is None:
+                return
+            if answer:
+                discard_job(unfinished)
         folder = self.folder_path.get().strip()
+        announcement = None
         if folder:
             folder_name = os.path.basename(folder)
-            send_text_message(webhook_url, f"Uploading media from folder: {folder_name}")
+            announcement = f"Uploading media from folder: {folder_name}"
         STOP_EVENT.clear()
         self.total_files = len(self.file_list)
         self.processed_files = 0
         self.progress["maximum"] = self.total_files
-        num_workers = max(1, multiprocessing.cpu_count() // 2)
-        print(f"[DEBUG] Using {num_workers} worker threads for processing.")
-        threading.Thread(target=self.process_files_thread, args=(self.file_list.copy(), webhook_url, num_workers)).start()
-
-    def process_files_thread(self, files, webhook_url, num_workers):
-        with ThreadPoolExecutor(max_workers=num_workers) as executor:
-            futures = {executor.submit(process_file, f, webhook_url): f for f in files}
-            for future in as_completed(futures):
-                if STOP_EVENT.is_set():
-                    print("[DEBUG] Stop event detected; aborting remaining tasks.")
-                    break
-                self.processed_files += 1
-                self.progress["value"] = self.processed_files
-                print(f"[DEBUG] Completed {self.processed_files} of {self.total_files} files.")
+        num_workers = SPLIT_WORKERS
+        print(f"[DEBUG] Using {num_workers} split workers.")
+        self.begin_run()
+        webhook_urls = webhook_url.webhook_urls if isinstance(webhook_url, WebhookShards) else [webhook_url]
+        job = JOB_JOURNAL.create(self.file_list, webhook_urls, announcement)
+        threading.Thread(target=self.process_files_thread,
+                         args=(self.file_list.copy(), webhook_url, num_workers, announcement, job)).start()
+
+    def resume_job(self):
+        """Continue the last stopped or crashed job without re-splitting or re-uploading finished parts."""
+        if self.busy():
+            return
+        job = JOB_JOURNAL.latest_unfinished()
+        if job is None:
+            messagebox.showinfo("Info", "There is no unfinished upload job to resume.")
+            return
+        counts = job.counts()
+        files = resumable_files(job)
+        if not files:
+            job.set_status("done")
+            messagebox.showinfo("Info", "Every file of the last job has been uploaded or queued for retry.")
+            return
+        total = sum(counts.values())
+        if not messagebox.askyesno("Resume Job", f"Resume job {job.id}? {len(files)} of {total} files are left."):
+            return
+        webhook_url = webhook_target(job.webhook_urls)
+        STOP_EVENT.clear()
+        self.total_files = total
+        self.processed_files = total - len(files)
+        self.progress["maximum"] = self.total_files
+        self.progress["value"] = self.processed_files
+        num_workers = SPLIT_WORKERS
+        print(f"[DEBUG] Resuming job {job.id}: {len(files)} files left.")
+        self.begin_run()
+        threading.Thread(target=self.process_files_thread,
+                         args=(files, webhook_url, num_workers, None, job)).start()
+
+    def check_folder(self):
+        """Compare the selected folder with the upload records and offer to upload only the gaps."""
+        folder = self.folder_path.get().strip()
+        if not folder or not os.path.isdir(folder):
+            messagebox.showerror("Error", "Please select a folder to check.")
+            return
+        recursive = self.recursive.get()
+        self.pipeline_status.config(text=f"Checking {folder} against the upload records...")
+        threading.Thread(target=lambda: self.check_results.put(reconcile_folder(folder, recursive)), daemon=True).start()
+        self.after(SCAN_POLL_INTERVAL, self.show_reconciliation)
+
+    def show_reconciliation(self):
+        try:
+            result = self.check_results.get_nowait()
+        except queue.Empty:
+            self.after(SCAN_POLL_INTERVAL, self.show_reconciliation)
+            return
+        self.pipeline_status.config(text="")
+        gaps = result.gaps()
+        if not gaps:
+            messagebox.showinfo("Folder Check", result.summary())
+            return
+        if not messagebox.askyesno("Folder Check", f"{result.summary()}\n\nUpload the {len(gaps)} missing, partly uploaded and changed files?"):
+            return
+        if self.busy():
+            return
+        webhook_url = self.selected_webhook_target()
+        if webhook_url is None:
+            return
+        STOP_EVENT.clear()
+        self.total_files = len(gaps)
+        self.processed_files = 0
+        self.progress["maximum"] = self.total_files
+        self.progress["value"] = 0
+        self.begin_run()
+        webhook_urls = webhook_url.webhook_urls if isinstance(webhook_url, WebhookShards) else [webhook_url]
+        def upload_gaps():
+            # Seeding partial videos plans their cuts (ffprobe), so it runs off the Tk thread too
+            try:
+                files, job = gap_job(result, webhook_urls)
+            except Exception:
+                self.end_run()
+                raise
+            self.process_files_thread(files, webhook_url, SPLIT_WORKERS, None, job)
+        threading.Thread(target=upload_gaps).start()
+
+    def busy(self):
+        """True (after telling the user) while an upload or watch is running: they share the stop event and pipeline state."""
+        if self.running:
+            messagebox.showinfo("Info", "Wait for the current upload or watch to finish, or stop it first.")
+        return self.running
+
+    def begin_run(self, watch=False):
+        """
+        Mark an upload or watch as running, disable the controls that would start a second one
+        and start the pipeline report loop unless one is already polling.
+        """
+        self.running = True
+        self.file_progress.clear()
+        self.progress["value"] = self.processed_files
+        for button in (self.start_button, self.resume_button, self.check_button):
+            button.config(state="disabled")
+        if not watch:
+            self.watch_button.config(state="disabled")
+        if not self.reporting:
+            self.reporting = True
+            self.after(PIPELINE_REPORT_INTERVAL, self.report_pipeline)
+
+    def end_run(self):
+        """Worker thread callback: the run is over, so the upload and watch controls are available again."""
+        self.running = False
+        self.after(0, self.enable_run_controls)
+
+    def enable_run_controls(self):
+        for button in (self.start_button, self.resume_button, self.check_button, self.watch_button):
+            button.config(state="normal")
+
+    def process_files_thread(self, files, webhook_url, num_workers, announcement=None, job=None):
+        try:
+            status = run_upload(files, webhook_url, announcement, job, on_files_done=self.files_done, split_workers=num_workers)
+        finally:
+            self.end_run()
         print("[DEBUG] File processing thread ending.")
-        if STOP_EVENT.is_set():
-            cleanup_generated_files()
+        if status == "stopped":
             messagebox.showinfo("Info", "Upload stopped and temporary files cleaned up.")
         else:
             messagebox.showinfo("Info", "Upload process completed.")
 
+    def files_done(self, count):
+        """Pipeline callback: advance the progress bar as files complete."""
+        self.processed_files += count
+        self.after(0, self.update_progress)
+        print(f"[DEBUG] Completed {self.processed_files} of {self.total_files} files.")
+
+    def ffmpeg_progress(self, event):
+        """ffmpeg runner listener (called on ffmpeg's reader thread): hand the event to the Tk thread."""
+        self.after(0, self.show_ffmpeg_progress, event)
+
+    def show_ffmpeg_progress(self, event):
+        """Show the percent, speed and ETA of the running splits/encodes and move the bar through their files."""
+        self.ffmpeg_status.config(text=self.ffmpeg_runs.update(event))
+        self.file_progress.update(event)
+        self.update_progress()
+
+    def update_progress(self):
+        """Files done plus the share of ffmpeg work done on the others. A file whose split has finished
+        drops out of the share before its uploads are acknowledged, so the bar only ever moves forward."""
+        value = min(self.total_files, self.processed_files + self.file_progress.partial())
+        self.progress["value"] = max(self.progress["value"], value)
+
+    def report_pipeline(self):
+        """Show per-stage queue depth while a pipeline is running (polled on the Tk thread until the run ends)."""
+        pipeline = uploader_core.ACTIVE_PIPELINE
+        if pipeline is not None:
+            st = pipeline.stats()
+            self.pipeline_status.config(
+                text=f"Split: {st['split_waiting']} waiting, {st['split_busy']}/{st['split_workers']} busy  |  "
+                     f"Upload: {st['upload_queued']} queued, {st['upload_in_flight']}/{st['upload_slots']} in flight")
+        elif not self.running:
+            self.pipeline_status.config(text="")
+            self.reporting = False
+            return
+        self.after(PIPELINE_REPORT_INTERVAL, self.report_pipeline)
+
+    def toggle_watch(self):
+        """Start or stop uploading new media as it appears in the selected folder."""
+        if self.watching:
+            self.stop_upload()
+            return
+        folder = self.folder_path.get().strip()
+        if not folder or not os.path.isdir(folder):
+            messagebox.showerror("Error", "Please select a folder to watch.")
+            return
+        selected_webhook_name = self.selected_webhook.get()
+        if not selected_webhook_name:
+            messagebox.showerror("Error", "Please select a webhook to use.")
+            return
+        if self.busy():
+            return
+        STOP_EVENT.clear()
+        self.watching = True
+        self.watch_button.config(text="Stop Watching")
+        self.total_files = 0
+        self.processed_files = 0
+        self.progress["value"] = 0
+        self.begin_run(watch=True)
+        threading.Thread(target=self.watch_thread,
+                         args=(folder, self.webhooks[selected_webhook_name], self.recursive.get()), daemon=True).start()
+
+    def watch_thread(self, folder, webhook_url, recursive):
+        try:
+            watch_folder(folder, webhook_url, recursive, on_files_done=self.files_done, on_batch=self.watch_batch)
+        finally:
+            self.end_run()
+        self.watching = False
+        self.watch_button.config(text="Watch Folder")
+
+    def watch_batch(self, files):
+        """Watch mode callback: new files join the progress bar's total."""
+        self.total_files += len(files)
+        self.progress["maximum"] = self.total_files
+
     def stop_upload(self):
         """Stop processing and clean up generated files."""
         STOP_EVENT.set()
@@ -456,107 +520,6 @@ class App(TkinterDnD.Tk):
                             print(f"[ERROR] Failed to copy {source_path}: {e}")
         messagebox.showinfo("Info", "Download process completed.")
 
-    def open_file_manager(self):
-        """Open a file manager window (similar to Disbox) displaying the uploaded records.
-        In this window you can browse uploaded folders and download all videos from a selected folder."""
-        load_uploaded_records()  # Refresh UPLOADED_RECORDS from JSON
-        fm_window = tk.Toplevel(self)
-        fm_window.title("Uploaded Files Manager")
-        fm_window.geometry("650x500")
-        
-        # Treeview for folder structure with columns for file and URL(s)
-        columns = ("Local Path", "URLs")
-        tree = ttk.Treeview(fm_window, columns=columns, show="tree")
-        tree.pack(fill="both", expand=True, padx=10, pady=10)
-        tree.heading("#0", text="Folder / File", anchor="w")
-        
-        # Populate tree: each folder is a parent node; each uploaded record as a child.
-        for folder, records in UPLOADED_RECORDS.items():
-            parent_id = tree.insert("", "end", iid=folder, text=folder, open=True, values=(folder,))
-            for rec in records:
-                ext = os.path.splitext(rec["file"])[1].lower()
-                # Only include video files in the manager.
-                if ext in VIDEO_EXTS:
-                    display = os.path.basename(rec["file"])
-                    tree.insert(parent_id, "end", text=display, values=(rec["file"], json.dumps(rec["urls"])))
-        
-        # Download progress bar in file manager window
-        fm_progress = ttk.Progressbar(fm_window, orient="horizontal", length=600, mode="determinate")
-        fm_progress.pack(pady=5)
-        
-        # Function to download all uploaded videos for the selected folder
-        def download_selected_folder():
-            selected = tree.selection()
-            if not selected:
-                messagebox.showerror("Error", "Please select a folder node.")
-                return
-            folder_node = selected[0]
-            # Ensure a folder node is selected (if a file is selected, get its parent)
-            if tree.parent(folder_node):
-                folder_node = tree.parent(folder_node)
-            folder_path = tree.item(folder_node, "values")[0]
-            dest = filedialog.askdirectory(title="Select Destination Folder for Downloaded Videos")
-            if not dest:
-                return
-            # Get all records for the folder
-            records = UPLOADED_RECORDS.get(folder_path, [])
-            video_records = [rec for rec in records if os.path.splitext(rec["file"])[1].lower() in VIDEO_EXTS and rec["urls"]]
-            total = len(video_records)
-            if total == 0:
-                messagebox.showinfo("Info", "No uploaded video files found for the selected folder.")
-                return
-            fm_progress["maximum"] = total
-            fm_progress["value"] = 0
-            count = 0
-            for rec in video_records:
-                base_name = os.path.basename(rec["file"])
-                for i, url in enumerate(rec["urls"]):
-                    if len(rec["urls"]) > 1:
-                        name, ext = os.path.splitext(base_name)
-                        file_name = f"{name}_{i}{ext}"
-                    else:
-                        file_name = base_name
-                    rel_path = os.path.relpath(os.path.dirname(rec["file"]), start=folder_path)
-                    dest_path = os.path.join(dest, rel_path, file_name)
-                    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-                    try:
-                        r = requests.get(url, stream=True)
-                        if r.status_code == 200:
-                            with open(dest_path, "wb") as f:
-                                for chunk in r.iter_content(chunk_size=8192):
-                                    f.write(chunk)
-                            print(f"[DEBUG] Downloaded {url} to {dest_path}")
-                        else:
-                            print(f"[ERROR] Failed to download {url}. Status: {r.status_code}")
-                    except Exception as e:
-                        print(f"[ERROR] Exception downloading {url}: {e}")
-                count += 1
-                fm_progress["value"] = count
-            messagebox.showinfo("Info", "Download process completed.")
-        
-        # Button frame in file manager window
-        btn_frame = tk.Frame(fm_window)
-        btn_frame.pack(pady=5)
-        tk.Button(btn_frame, text="Download Selected Folder", command=download_selected_folder).pack(side="left", padx=5)
-        
-        # Bind double-click to open folder in file explorer
-        def on_double_click(event):
-            item = tree.selection()
-            if not item:
-                return
-            item = item[0]
-            path = tree.item(item, "values")[0]
-            try:
-                if sys.platform.startswith('win'):
-                    os.startfile(path)
-                elif sys.platform.startswith('darwin'):
-                    subprocess.call(["open", path])
-                else:
-                    subprocess.call(["xdg-open", path])
-            except Exception as e:
-                messagebox.showerror("Error", f"Could not open folder: {e}")
-        tree.bind("<Double-1>", on_double_click)
-        
     def download_videos(self):
         """(Legacy download) Download video files from the selected folder preserving folder structure."""
         source_folder = self.folder_path.get().strip()
@@ -598,26 +561,23 @@ class App(TkinterDnD.Tk):
 
     def open_file_manager(self):
         """Open a file manager window after uploading (similar to Disbox).
-        This window displays the uploaded folders and files from UPLOADED_RECORDS and provides download functionality."""
-        load_uploaded_records()  # Refresh the uploaded records
+        This window displays the uploaded folders and files from RECORDS_STORE and provides download functionality."""
+        save_uploaded_records()  # Make pending inserts visible to the tree
         fm_window = tk.Toplevel(self)
         fm_window.title("Uploaded Files Manager")
         fm_window.geometry("650x500")
         
         # Treeview with folder hierarchy
         columns = ("Local Path", "URLs")
-        tree = ttk.Treeview(fm_window, columns=columns, show="tree")
+        tree = ttk.Treeview(fm_window, columns=columns, show="tree", style="Thumbs.Treeview")
+        ttk.Style(fm_window).configure("Thumbs.Treeview", rowheight=THUMBNAIL_HEIGHT + 4)
         tree.pack(fill="both", expand=True, padx=10, pady=10)
         tree.heading("#0", text="Folder / File", anchor="w")
+        thumbnails = TreeThumbnails(tree, THUMBNAIL_CACHE)
         
-        # Populate tree: each key in UPLOADED_RECORDS becomes a parent node.
-        for folder, records in UPLOADED_RECORDS.items():
-            parent_id = tree.insert("", "end", iid=folder, text=folder, open=True, values=(folder,))
-            for rec in records:
-                ext = os.path.splitext(rec["file"])[1].lower()
-                if ext in VIDEO_EXTS:
-                    tree.insert(parent_id, "end", text=os.path.basename(rec["file"]),
-                                values=(rec["file"], json.dumps(rec["urls"])))
+        # Populate tree: one node per uploaded folder; its files are loaded when it is opened.
+        record_tree = LazyRecordTree(tree, RECORDS_STORE, VIDEO_EXTS, thumbnails=thumbnails)
+        record_tree.populate()
         
         # Download progress bar in file manager window
         fm_progress = ttk.Progressbar(fm_window, orient="horizontal", length=600, mode="determinate")
@@ -629,47 +589,24 @@ class App(TkinterDnD.Tk):
             if not selected:
                 messagebox.showerror("Error", "Please select a folder node.")
                 return
-            folder_node = selected[0]
-            if tree.parent(folder_node):
-                folder_node = tree.parent(folder_node)
-            folder_path = tree.item(folder_node, "values")[0]
+            folder_path = record_tree.folder_of(selected[0])
             dest = filedialog.askdirectory(title="Select Destination Folder for Downloaded Videos")
             if not dest:
                 return
-            records = UPLOADED_RECORDS.get(folder_path, [])
-            video_records = [rec for rec in records if os.path.splitext(rec["file"])[1].lower() in VIDEO_EXTS and rec["urls"]]
-            total = len(video_records)
-            if total == 0:
+            video_records = [rec for rec in record_tree.records(folder_path) if rec["urls"]]
+            if not video_records:
                 messagebox.showinfo("Info", "No uploaded video files found for the selected folder.")
                 return
-            fm_progress["maximum"] = total
             fm_progress["value"] = 0
-            count = 0
-            for rec in video_records:
-                base_name = os.path.basename(rec["file"])
-                for i, url in enumerate(rec["urls"]):
-                    if len(rec["urls"]) > 1:
-                        name, ext = os.path.splitext(base_name)
-                        file_name = f"{name}_{i}{ext}"
-                    else:
-                        file_name = base_name
-                    rel_path = os.path.relpath(os.path.dirname(rec["file"]), start=folder_path)
-                    dest_path = os.path.join(dest, rel_path, file_name)
-                    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-                    try:
-                        r = requests.get(url, stream=True)
-                        if r.status_code == 200:
-                            with open(dest_path, "wb") as f:
-                                for chunk in r.iter_content(chunk_size=8192):
-                                    f.write(chunk)
-                            print(f"[DEBUG] Downloaded {url} to {dest_path}")
-                        else:
-                            print(f"[ERROR] Failed to download {url}. Status: {r.status_code}")
-                    except Exception as e:
-                        print(f"[ERROR] Exception downloading {url}: {e}")
-                count += 1
-                fm_progress["value"] = count
-            messagebox.showinfo("Info", "Folder download completed.")
+            # Downloads run in the background; the progress bar is polled from the Tk loop
+            job = DOWNLOAD_MANAGER.start(*download_plan(video_records, dest, folder=folder_path))
+            watch_progress(fm_window, job, fm_progress, on_finish=download_finished)
+
+        def download_finished(job):
+            if job.failed:
+                messagebox.showwarning("Warning", f"Folder download finished; {len(job.failed)} files failed (run it again to resume them).")
+            else:
+                messagebox.showinfo("Info", "Folder download completed.")
         
         # Button to trigger download
         btn_frame = tk.Frame(fm_window)
@@ -682,7 +619,9 @@ class App(TkinterDnD.Tk):
             if not item:
                 return
             item = item[0]
-            path = tree.item(item, "values")[0]
+            path = tree.item(item, "values")[0] if tree.item(item, "values") else ""
+            if not path:
+                return  # Placeholder and "Show more" nodes
             try:
                 if sys.platform.startswith('win'):
                     os.startfile(path)
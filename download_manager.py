@@ -0,0 +1,239 @@
+#parallel, resumable downloads of uploaded media in the background, with byte-level progress
+import os
+import subprocess
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Configuration ---
+DOWNLOAD_WORKERS = 6                  # Files downloaded at the same time
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024     # Bytes read from the socket per chunk
+WRITE_BUFFER_SIZE = 4 * 1024 * 1024   # Buffered bytes per open file before hitting the disk
+PART_SUFFIX = ".part"                 # Unfinished downloads; resumed with a Range request
+PROGRESS_INTERVAL = 200               # Milliseconds between progress bar updates in the GUI
+JOIN_WORKERS = 2                      # ffmpeg remuxes of split videos running alongside the downloads
+
+# --- Helper Functions ---
+def download_plan(records, dest, folder=None):
+    """
+    What to download for upload records: (tasks, joins).
+    tasks are (url, dest_path) pairs; with folder, the records' paths relative to it are kept
+    under dest, otherwise every file lands directly in dest. A record with several URLs (a split
+    video) downloads as name_000.ext, name_001.ext, ... and gets a join (dest_path, [segment paths])
+    that reassembles it under its original name. Files already on disk are left out.
+    """
+    tasks = []
+    joins = []
+    for rec in records:
+        base_name = os.path.basename(rec["file"])
+        name, ext = os.path.splitext(base_name)
+        dest_dir = dest
+        if folder is not None:
+            dest_dir = os.path.join(dest, os.path.relpath(os.path.dirname(rec["file"]), start=folder))
+        dest_path = os.path.join(dest_dir, base_name)
+        if len(rec["urls"]) == 1:
+            tasks.append((rec["urls"][0], dest_path))
+            continue
+        if os.path.exists(dest_path):
+            print(f"[DEBUG] Already downloaded: {dest_path}")
+            continue
+        segments = [os.path.join(dest_dir, f"{name}_{i:03d}{ext}") for i in range(len(rec["urls"]))]
+        tasks.extend(zip(rec["urls"], segments))
+        joins.append((dest_path, segments))
+    return tasks, joins
+
+def join_segments(segments, dest_path):
+    """Losslessly concatenate downloaded segments into dest_path (ffmpeg concat demuxer, stream copy).
+    The segments are deleted once the joined file is in place. Returns True on success."""
+    list_path = dest_path + ".concat.txt"
+    with open(list_path, "w", encoding="utf-8") as f:
+        for seg in segments:
+            # Single quotes in the path are closed, escaped and reopened
+            f.write("file '" + os.path.abspath(seg).replace("'", "'\\''") + "'\n")
+    name, ext = os.path.splitext(dest_path)
+    tmp_path = f"{name}.joining{ext}"
+    cmd = ["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path,
+           "-map", "0", "-c", "copy", tmp_path]
+    print(f"[DEBUG] Joining {len(segments)} segments into {dest_path}")
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True)
+    finally:
+        os.remove(list_path)
+    if result.returncode != 0:
+        print(f"[ERROR] Could not join segments into {dest_path}: {result.stderr.strip()}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, dest_path)
+    for seg in segments:
+        os.remove(seg)
+    print(f"[DEBUG] Reassembled {dest_path}")
+    return True
+
+class DownloadJob:
+    """
+    Progress of one batch of downloads, safe to read from the Tk thread.
+    total_bytes is an estimate until every response has reported its Content-Length:
+    files that haven't started yet count as the average size of the ones that have.
+    """
+    def __init__(self, tasks, joins=()):
+        self.tasks = tasks
+        self.joins = list(joins)
+        # segment path -> [join index, segments still downloading, any failed]
+        self.join_state = {}
+        for index, (_, segments) in enumerate(self.joins):
+            state = [index, len(segments), False]
+            for seg in segments:
+                self.join_state[seg] = state
+        self.lock = threading.Lock()
+        self.sizes = {}          # dest_path -> expected bytes
+        self.done_bytes = 0
+        self.completed = 0
+        self.failed = []
+        self.finished = threading.Event()
+        self.cancelled = threading.Event()
+
+    def set_size(self, dest_path, size):
+        with self.lock:
+            self.sizes[dest_path] = size
+
+    def add_bytes(self, count):
+        with self.lock:
+            self.done_bytes += count
+
+    def file_finished(self, dest_path, ok):
+        """Count a finished download; returns the join it completed, if any."""
+        with self.lock:
+            self.completed += 1
+            if not ok:
+                self.failed.append(dest_path)
+            state = self.join_state.get(dest_path)
+            if state is None:
+                return None
+            state[1] -= 1
+            state[2] = state[2] or not ok
+            if state[1] == 0 and not state[2]:
+                return self.joins[state[0]]
+            return None
+
+    def join_failed(self, dest_path):
+        with self.lock:
+            self.failed.append(dest_path)
+
+    def progress(self):
+        """(done_bytes, estimated total_bytes, files completed, total files)."""
+        with self.lock:
+            known = sum(self.sizes.values())
+            if self.sizes:
+                known += (len(self.tasks) - len(self.sizes)) * known // len(self.sizes)
+            return self.done_bytes, max(known, self.done_bytes), self.completed, len(self.tasks)
+
+    def cancel(self):
+        self.cancelled.set()
+
+class DownloadManager:
+    """
+    Downloads (url, dest_path) tasks on a worker pool sharing one pooled requests.Session.
+    Each file is written to dest_path + ".part" and renamed when complete; an existing
+    .part file is resumed with an HTTP Range request. A split video is joined as soon as its
+    last segment lands, while the other downloads carry on.
+    """
+    def __init__(self, workers=DOWNLOAD_WORKERS):
+        self.workers = workers
+        self.join_executor = ThreadPoolExecutor(max_workers=JOIN_WORKERS)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def start(self, tasks, joins=(), on_done=None):
+        """Download tasks (and reassemble joins) in a background thread. Returns the DownloadJob
+        right away; on_done(job) runs on that background thread once every file is finished."""
+        job = DownloadJob(tasks, joins)
+        job.join_futures = []
+        def run():
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for url, dest_path in tasks:
+                    executor.submit(self.download_safe, job, url, dest_path)
+            for future in list(job.join_futures):
+                future.result()
+            job.finished.set()
+            print(f"[DEBUG] Downloads finished: {job.completed} files, {len(job.failed)} failed.")
+            if on_done:
+                on_done(job)
+        threading.Thread(target=run, daemon=True).start()
+        return job
+
+    def download_safe(self, job, url, dest_path):
+        ok = False
+        try:
+            if not job.cancelled.is_set():
+                ok = self.download(job, url, dest_path)
+        except Exception as e:
+            print(f"[ERROR] Exception downloading {url}: {e}")
+        join = job.file_finished(dest_path, ok)
+        if join is not None:
+            job.join_futures.append(self.join_executor.submit(self.join_safe, job, *join))
+
+    def join_safe(self, job, dest_path, segments):
+        try:
+            ok = join_segments(segments, dest_path)
+        except Exception as e:
+            print(f"[ERROR] Exception joining {dest_path}: {e}")
+            ok = False
+        if not ok:
+            job.join_failed(dest_path)
+
+    def download(self, job, url, dest_path):
+        """Download one URL to dest_path, resuming a leftover .part file. Returns True on success."""
+        if os.path.exists(dest_path):
+            print(f"[DEBUG] Already downloaded: {dest_path}")
+            job.set_size(dest_path, os.path.getsize(dest_path))
+            job.add_bytes(os.path.getsize(dest_path))
+            return True
+        os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+        part_path = dest_path + PART_SUFFIX
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        with self.session.get(url, headers=headers, stream=True, timeout=60) as r:
+            if r.status_code == 416 and offset:
+                # The .part file already holds the whole file
+                job.set_size(dest_path, offset)
+                job.add_bytes(offset)
+                os.replace(part_path, dest_path)
+                return True
+            if r.status_code not in (200, 206):
+                print(f"[ERROR] Failed to download {url}. Status: {r.status_code}")
+                return False
+            if r.status_code == 200:
+                offset = 0  # Server ignored the Range header; start over
+            elif offset:
+                print(f"[DEBUG] Resuming {dest_path} at {offset} bytes.")
+            length = int(r.headers.get("Content-Length", 0))
+            job.set_size(dest_path, offset + length)
+            job.add_bytes(offset)
+            with open(part_path, "ab" if offset else "wb", buffering=WRITE_BUFFER_SIZE) as f:
+                for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    if job.cancelled.is_set():
+                        return False
+                    f.write(chunk)
+                    job.add_bytes(len(chunk))
+        if length and os.path.getsize(part_path) < offset + length:
+            print(f"[ERROR] Download of {url} ended early; the .part file will be resumed next time.")
+            return False
+        os.replace(part_path, dest_path)
+        print(f"[DEBUG] Downloaded {url} to {dest_path}")
+        return True
+
+def watch_progress(widget, job, progress_bar, on_finish=None):
+    """Mirror a DownloadJob's byte progress on a ttk.Progressbar by polling from the Tk loop;
+    on_finish(job) is then called on the Tk thread."""
+    done_bytes, total_bytes, _, _ = job.progress()
+    progress_bar["maximum"] = max(total_bytes, 1)
+    progress_bar["value"] = done_bytes
+    if job.finished.is_set():
+        if on_finish:
+            on_finish(job)
+        return
+    widget.after(PROGRESS_INTERVAL, watch_progress, widget, job, progress_bar, on_finish)
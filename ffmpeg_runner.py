@@ -0,0 +1,264 @@
+#runs ffmpeg with -progress pipe:1 and turns its output into percent / speed / ETA events for the GUIs and the CLI
+import os
+import signal
+import subprocess
+import threading
+import multiprocessing
+from collections import deque
+from contextlib import contextmanager
+
+# --- Configuration ---
+STDERR_TAIL_LINES = 20      # Last lines of ffmpeg's log kept for error messages
+FFMPEG_THREADS = multiprocessing.cpu_count()  # CPU threads shared by all ffmpeg runs of this process (-threads)
+
+# Callbacks that receive every progress event from every ffmpeg run (GUI status lines, CLI events)
+LISTENERS = []
+LISTENERS_LOCK = threading.Lock()
+
+# --- Helper Functions ---
+def add_listener(callback):
+    with LISTENERS_LOCK:
+        LISTENERS.append(callback)
+
+def remove_listener(callback):
+    with LISTENERS_LOCK:
+        if callback in LISTENERS:
+            LISTENERS.remove(callback)
+
+def parse_speed(value):
+    """ffmpeg's "2.35x" as a float, or None for "N/A"."""
+    try:
+        return float(value.rstrip("x"))
+    except (AttributeError, ValueError):
+        return None
+
+def describe(event):
+    """One-line summary of an event for status labels: "name: 45% at 3.2x, 12s left"."""
+    text = event["label"]
+    if event["percent"] is not None:
+        text += f": {event['percent']:.0f}%"
+    if event["speed"]:
+        text += f" at {event['speed']:.1f}x"
+    if event["eta"] is not None:
+        text += f", {event['eta']:.0f}s left"
+    return text
+
+class ThreadBudget:
+    """
+    The -threads of every ffmpeg run come out of one budget, so concurrent splits and encodes never
+    ask for more threads than there are cores. A run takes up to the threads it wants from those
+    free (waiting while none are) and gives them back when it ends, so runs that start later, like
+    the last encodes of a batch, get the threads the finished ones held.
+    """
+    def __init__(self, total=FFMPEG_THREADS):
+        self.total = total
+        self.free = total
+        self.cond = threading.Condition()
+
+    @contextmanager
+    def share(self, want):
+        """Hold up to want threads (at least one) for an ffmpeg run; yields how many were granted."""
+        with self.cond:
+            while self.free < 1:
+                self.cond.wait()
+            threads = max(1, min(want, self.free))
+            self.free -= threads
+        try:
+            yield threads
+        finally:
+            with self.cond:
+                self.free += threads
+                self.cond.notify_all()
+
+    def in_use(self):
+        with self.cond:
+            return self.total - self.free
+
+THREAD_BUDGET = ThreadBudget()
+
+class RunBoard:
+    """Latest event of every ffmpeg run still going, as one status line (a GUI label shows several runs at once)."""
+    def __init__(self, shown=3):
+        self.lock = threading.Lock()
+        self.runs = {}   # label -> latest event
+        self.shown = shown
+
+    def update(self, event):
+        """Take an event; returns the status line for the runs still going."""
+        with self.lock:
+            if event["done"]:
+                self.runs.pop(event["label"], None)
+            else:
+                self.runs[event["label"]] = event
+            runs = list(self.runs.values())
+        text = "  |  ".join(describe(e) for e in runs[:self.shown])
+        if len(runs) > self.shown:
+            text += f"  (+{len(runs) - self.shown} more)"
+        return text
+
+class FileProgress:
+    """
+    How much of each file's ffmpeg work is done, added up from the events' file and weight
+    (a file split as several range jobs, or encoded in two passes, reports through several runs).
+    partial() is the sum over files still being worked on, so a progress bar counting whole files
+    can move through a large one instead of sitting still until it finishes.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.runs = {}   # file -> { label: (weight, fraction done) }
+
+    def update(self, event):
+        if event["file"] is None:
+            return
+        with self.lock:
+            runs = self.runs.setdefault(event["file"], {})
+            weight, fraction = runs.get(event["label"], (event["weight"], 0.0))
+            if event["percent"] is not None:
+                fraction = event["percent"] / 100
+            runs[event["label"]] = (weight, fraction)
+            if sum(w * f for w, f in runs.values()) >= 1.0:
+                del self.runs[event["file"]]   # All of its ffmpeg work is done
+
+    def forget(self, file):
+        """Drop a file once the caller counts it as finished."""
+        with self.lock:
+            self.runs.pop(file, None)
+
+    def clear(self):
+        with self.lock:
+            self.runs.clear()
+
+    def partial(self):
+        with self.lock:
+            return sum(min(1.0, sum(w * f for w, f in runs.values())) for runs in self.runs.values())
+
+class FfmpegProcess:
+    """
+    One ffmpeg run with machine-readable progress. ffmpeg writes key=value blocks to stdout
+    (-progress pipe:1); each completed block becomes an event
+    { "label", "file", "weight", "out_time", "duration", "percent", "speed", "eta", "size", "done" }
+    handed to on_progress and every registered listener as it arrives.
+    duration (seconds of output expected) makes percent and ETA possible; file and weight
+    (the share of that file this run covers) let callers add several runs up per file.
+    """
+    def __init__(self, args, duration=None, label=None, file=None, weight=1.0, on_progress=None):
+        # ffmpeg reports progress about twice a second
+        self.cmd = ["ffmpeg", "-nostdin", "-nostats", "-progress", "pipe:1", *args]
+        self.duration = duration
+        self.label = label or os.path.basename(args[-1])
+        self.file = file
+        self.weight = weight
+        self.on_progress = on_progress
+        self.stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+        self.proc = None
+        self.readers = []
+        self.terminated = False
+        self.paused = False
+        self.finished = False   # Seen ffmpeg's progress=end
+
+    def start(self):
+        print(f"[DEBUG] Running ffmpeg: {' '.join(self.cmd)}")
+        self.proc = subprocess.Popen(self.cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                     text=True, errors="replace")
+        self.readers = [threading.Thread(target=self.read_progress, daemon=True),
+                        threading.Thread(target=self.read_stderr, daemon=True)]
+        for reader in self.readers:
+            reader.start()
+        return self
+
+    def read_stderr(self):
+        for line in self.proc.stderr:
+            self.stderr_tail.append(line.rstrip())
+
+    def read_progress(self):
+        block = {}
+        for line in self.proc.stdout:
+            key, _, value = line.strip().partition("=")
+            if key != "progress":
+                block[key] = value
+                continue
+            self.emit(block, done=value == "end")
+            block = {}
+        if not self.finished:
+            # Killed or failed before its last block: listeners still get to drop the run
+            self.emit({}, done=True)
+
+    def emit(self, block, done=False):
+        try:
+            out_time = int(block.get("out_time_us", "")) / 1e6
+        except ValueError:
+            out_time = None
+        try:
+            size = int(block.get("total_size", ""))
+        except ValueError:
+            size = None
+        speed = parse_speed(block.get("speed"))
+        self.finished = done
+        percent = eta = None
+        if self.duration and out_time is not None:
+            percent = 100.0 if done else min(100.0, max(0.0, out_time / self.duration * 100))
+            if speed and not done:
+                eta = max(0.0, (self.duration - out_time) / speed)
+        event = {"label": self.label, "file": self.file, "weight": self.weight, "out_time": out_time,
+                 "duration": self.duration, "percent": percent, "speed": speed, "eta": eta, "size": size, "done": done}
+        with LISTENERS_LOCK:
+            callbacks = list(LISTENERS)
+        if self.on_progress is not None:
+            callbacks.append(self.on_progress)
+        for callback in callbacks:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"[ERROR] ffmpeg progress callback failed: {e}")
+
+    def poll(self):
+        return self.proc.poll()
+
+    def pause(self):
+        """Stop ffmpeg in place (SIGSTOP) until resume(), e.g. while its output waits for a full queue.
+        A no-op where the signal doesn't exist (Windows)."""
+        if hasattr(signal, "SIGSTOP") and not self.paused and self.proc.poll() is None:
+            self.proc.send_signal(signal.SIGSTOP)
+            self.paused = True
+
+    def resume(self):
+        if self.paused:
+            self.paused = False
+            if self.proc.poll() is None:
+                self.proc.send_signal(signal.SIGCONT)
+
+    def terminate(self):
+        # A stopped process only acts on SIGTERM once it runs again
+        self.resume()
+        if self.proc.poll() is None:
+            self.terminated = True
+            self.proc.terminate()
+        self.wait()
+
+    def wait(self, timeout=None):
+        """Wait for ffmpeg (and its output readers) to finish; returns the exit code."""
+        returncode = self.proc.wait(timeout=timeout)
+        for reader in self.readers:
+            reader.join()
+        if returncode != 0 and self.stderr_tail and not self.terminated:
+            print(f"[ERROR] ffmpeg exited with {returncode}: {self.stderr_tail[-1]}")
+        return returncode
+
+    def run(self, stop_event=None, poll_interval=0.2):
+        """Start, then wait until ffmpeg exits or stop_event is set (ffmpeg is terminated). Returns the exit code."""
+        self.start()
+        while True:
+            try:
+                return self.wait(timeout=poll_interval)
+            except subprocess.TimeoutExpired:
+                if stop_event is not None and stop_event.is_set():
+                    self.terminate()
+                    return self.proc.returncode
+
+def run_ffmpeg(args, duration=None, label=None, file=None, weight=1.0, stop_event=None, on_progress=None, check=False):
+    """Run ffmpeg with progress events (see FfmpegProcess). Returns the exit code; check=True raises on failure."""
+    process = FfmpegProcess(args, duration, label, file, weight, on_progress)
+    returncode = process.run(stop_event)
+    if check and returncode != 0:
+        raise subprocess.CalledProcessError(returncode, process.cmd, stderr="\n".join(process.stderr_tail))
+    return returncode
@@ -0,0 +1,125 @@
+#re-encodes badly compressed videos into the fewest segments that fit the upload limit (two-pass x264/x265 per segment)
+import os
+import math
+import glob
+import multiprocessing
+from media_probe import probe, video_stream
+from ffmpeg_runner import run_ffmpeg, THREAD_BUDGET
+
+# --- Configuration ---
+REENCODE_CODEC = "libx264"            # or "libx265" (smaller output, slower encode)
+BITS_PER_PIXEL = {"libx264": 0.06, "libx265": 0.04}  # Bits per pixel per frame that still look good for each codec
+AUDIO_BITRATE = 128 * 1000            # AAC bitrate for re-encoded audio (bits/s)
+SIZE_MARGIN = 0.05                    # Fraction of each segment's budget kept back for rate control misses
+SEGMENT_OVERHEAD = 64 * 1024          # Container header/trailer reserved per segment (bytes)
+MIN_SAVINGS = 0.3                     # "auto" re-encodes only if it saves at least this fraction of the uploads...
+MIN_SAVED_UPLOADS = 2                 # ...and at least this many uploads
+ENCODE_RETRIES = 2                    # Re-encodes of a segment that came out over the limit, each at a lower bitrate
+ENCODE_THREADS = min(4, multiprocessing.cpu_count())  # -threads an encode asks for while all ENCODE_WORKERS are busy
+ENCODE_WORKERS = max(1, multiprocessing.cpu_count() // ENCODE_THREADS)  # Encodes at once, so workers x threads = cores
+
+# --- Helper Functions ---
+def frame_rate(stream):
+    """Frames per second from ffprobe's "30000/1001" style rates, or None."""
+    for key in ("avg_frame_rate", "r_frame_rate"):
+        num, _, den = str(stream.get(key, "")).partition("/")
+        try:
+            rate = float(num) / float(den or 1)
+        except (ValueError, ZeroDivisionError):
+            continue
+        if rate > 0:
+            return rate
+    return None
+
+def fit_plan(input_file, max_size, copy_parts, codec=REENCODE_CODEC):
+    """
+    How input_file would be re-encoded to fit max_size per segment:
+    { "parts", "cuts", "video_bitrate", "audio", "codec", "copy_parts", "max_size" }, or None if it can't be planned.
+    The total size comes from a bitrate that looks good for the resolution and frame rate (never more
+    than the source's own), the segment count from that size, and each segment then gets the full
+    bitrate its share of the budget allows.
+    """
+    info = probe(input_file)
+    video = video_stream(info)
+    if not info or not video or not info.get("duration"):
+        return None
+    fps = frame_rate(video)
+    if not fps or not video.get("width") or not video.get("height"):
+        return None
+    duration = info["duration"]
+    audio = any(s.get("codec_type") == "audio" for s in info["streams"])
+    audio_bitrate = AUDIO_BITRATE if audio else 0
+    good_bitrate = video["width"] * video["height"] * fps * BITS_PER_PIXEL.get(codec, BITS_PER_PIXEL["libx264"])
+    source_bitrate = os.path.getsize(input_file) * 8 / duration - audio_bitrate
+    target_bitrate = min(good_bitrate, max(source_bitrate, 1))
+    budget = (max_size - SEGMENT_OVERHEAD) * 8 * (1 - SIZE_MARGIN)   # Bits per segment
+    parts = max(1, math.ceil((target_bitrate + audio_bitrate) * duration / budget))
+    seg_duration = duration / parts
+    return {
+        "parts": parts,
+        "cuts": [round(seg_duration * i, 3) for i in range(1, parts)],
+        "video_bitrate": int(budget / seg_duration - audio_bitrate),
+        "audio": audio,
+        "codec": codec,
+        "copy_parts": copy_parts,
+        "max_size": max_size,
+    }
+
+def worth_reencoding(plan, mode):
+    """mode "always" re-encodes whenever there is a plan; "auto" only when it saves enough uploads."""
+    if plan is None or mode == "never":
+        return False
+    if mode == "always":
+        return True
+    saved = plan["copy_parts"] - plan["parts"]
+    return saved >= MIN_SAVED_UPLOADS and saved >= plan["copy_parts"] * MIN_SAVINGS
+
+def encode_args(plan, bitrate, pass_number, passlog, threads):
+    """Video codec arguments for one pass of a two-pass encode."""
+    if plan["codec"] == "libx265":
+        return ["-c:v", "libx265", "-b:v", str(bitrate),
+                "-x265-params", f"pass={pass_number}:stats={passlog}.log:pools={threads}"]
+    return ["-c:v", plan["codec"], "-b:v", str(bitrate), "-pass", str(pass_number), "-passlogfile", passlog,
+            "-threads", str(threads)]
+
+def encode_segment(input_file, out_path, start, end, plan, max_size, stop_event=None, threads=ENCODE_THREADS,
+                   duration=None, weight=1.0):
+    """
+    Two-pass encode of [start, end) of input_file into out_path at the plan's bitrate.
+    Each pass asks THREAD_BUDGET for up to threads encoder threads.
+    The output is checked against max_size; one that came out too big is encoded again at a
+    bitrate scaled down by how much it missed. Returns True once a segment under the limit is written.
+    duration and weight (the segment's share of the video) go into the progress events, where each
+    pass counts for half of the segment.
+    """
+    seek = (["-ss", f"{start:.3f}"] if start else []) + (["-to", f"{end:.3f}"] if end is not None else [])
+    passlog = out_path + ".pass"
+    bitrate = plan["video_bitrate"]
+    try:
+        audio = ["-map", "0:a:0", "-c:a", "aac", "-b:a", str(AUDIO_BITRATE)] if plan["audio"] else []
+        name = os.path.basename(out_path)
+        for attempt in range(ENCODE_RETRIES + 1):
+            for pass_number in (1, 2):
+                with THREAD_BUDGET.share(threads) as granted:
+                    codec = encode_args(plan, bitrate, pass_number, passlog, granted)
+                    if pass_number == 1:
+                        args = ["-y", *seek, "-i", input_file, "-map", "0:v:0", *codec, "-an", "-f", "null", os.devnull]
+                    else:
+                        args = ["-y", *seek, "-i", input_file, "-map", "0:v:0", *audio,
+                                *codec, "-movflags", "+faststart", out_path]
+                    if run_ffmpeg(args, duration=duration, label=f"{name} (pass {pass_number})", file=input_file,
+                                  weight=weight / 2, stop_event=stop_event) != 0:
+                        return False
+                if stop_event is not None and stop_event.is_set():
+                    return False
+            size = os.path.getsize(out_path)
+            if size <= max_size:
+                print(f"[DEBUG] Encoded {out_path}: {size} bytes at {bitrate // 1000} kb/s")
+                return True
+            print(f"[DEBUG] {out_path} came out at {size} bytes (limit {max_size}).")
+            bitrate = int(bitrate * max_size / size * (1 - SIZE_MARGIN))
+        print(f"[ERROR] Could not encode {out_path} under {max_size} bytes in {ENCODE_RETRIES + 1} attempts.")
+        return False
+    finally:
+        for log in glob.glob(glob.escape(passlog) + "*"):
+            os.remove(log)
@@ -0,0 +1,182 @@
+#watches a folder for new media (inotify on linux, polling elsewhere) and reports files once they stop changing
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import threading
+from media_scanner import scan_media
+
+# --- Configuration ---
+WATCH_SETTLE_SECONDS = 2.0     # A file is ready once its size and mtime haven't changed for this long
+WATCH_CHECK_INTERVAL = 0.5     # Seconds between checks of files that are still being written
+WATCH_POLL_INTERVAL = 2.0      # Seconds between rescans when inotify isn't available
+
+# inotify constants from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+INOTIFY_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE   # Growing files are followed by stat, not IN_MODIFY
+EVENT_HEADER = struct.Struct("iIII")   # wd, mask, cookie, len
+
+class Inotify:
+    """Minimal inotify binding through ctypes (no extra dependency); Linux only."""
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.ctypes = ctypes
+        self.dirs = {}   # watch descriptor -> directory
+
+    def add_watch(self, directory):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), INOTIFY_MASK)
+        if wd < 0:
+            err = self.ctypes.get_errno()
+            if err == errno.ENOSPC:
+                print("[ERROR] Out of inotify watches (raise fs.inotify.max_user_watches).")
+            raise OSError(err, f"inotify_add_watch failed for {directory}")
+        self.dirs[wd] = directory
+
+    def read(self, timeout):
+        """Events within timeout seconds as (path, is_dir) pairs; None means the kernel queue overflowed."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        data = os.read(self.fd, 64 * 1024)
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if wd in self.dirs and name:
+                events.append((os.path.join(self.dirs[wd], os.fsdecode(name)), bool(mask & IN_ISDIR)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+class FolderWatcher:
+    """
+    Calls on_files(paths) with media files that appear in folder after the watch starts.
+    Files already there are ignored. A new file is only reported once its size and mtime
+    have been stable for settle seconds, so files still being written (downloads,
+    Telegram saving a video) are never picked up half-finished. Nothing under the exclude
+    folders is reported (the uploader's own split segments, if the watch covers them).
+    """
+    def __init__(self, folder, on_files, exts, recursive=False, settle=WATCH_SETTLE_SECONDS,
+                 poll_interval=WATCH_POLL_INTERVAL, stop_event=None, exclude=()):
+        self.folder = folder
+        self.on_files = on_files
+        self.exts = set(exts)
+        self.recursive = recursive
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.stop_event = stop_event or threading.Event()
+        self.exclude = [os.path.join(os.path.abspath(d), "") for d in exclude]
+        self.known = set()     # Files reported (or present when the watch started)
+        self.pending = {}      # path -> ((size, mtime_ns), time the signature was first seen)
+
+    def is_media(self, path):
+        return os.path.splitext(path)[1].lower() in self.exts
+
+    def is_excluded(self, path):
+        path = os.path.join(os.path.abspath(path), "")
+        return any(path.startswith(d) for d in self.exclude)
+
+    def scan(self, folder=None):
+        """Media files under folder (recursing if enabled)."""
+        return scan_media(folder or self.folder, self.exts, self.recursive)
+
+    def directories(self, folder=None):
+        dirs = [folder or self.folder]
+        if self.recursive:
+            for root, subdirs, _ in os.walk(dirs[0]):
+                subdirs[:] = [d for d in subdirs if not self.is_excluded(os.path.join(root, d))]
+                dirs.extend(os.path.join(root, d) for d in subdirs)
+        return dirs
+
+    def notice(self, path):
+        if path not in self.known and path not in self.pending and self.is_media(path) and not self.is_excluded(path):
+            self.pending[path] = None
+
+    def rescan(self):
+        for path in self.scan():
+            self.notice(path)
+
+    def check_pending(self):
+        """Report the pending files whose size and mtime have stopped changing."""
+        now = time.monotonic()
+        ready = []
+        for path, seen in list(self.pending.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self.pending[path]  # Deleted or renamed away before it settled
+                continue
+            signature = (st.st_size, st.st_mtime_ns)
+            if seen is None or seen[0] != signature:
+                self.pending[path] = (signature, now)
+            elif now - seen[1] >= self.settle and st.st_size > 0:
+                del self.pending[path]
+                ready.append(path)
+        if ready:
+            self.known.update(ready)
+            print(f"[DEBUG] Watch: {len(ready)} new files ready.")
+            self.on_files(ready)
+
+    def run(self):
+        """Watch until stop_event is set."""
+        self.known = set(self.scan())
+        inotify = None
+        if sys.platform.startswith("linux"):
+            try:
+                inotify = Inotify()
+                for directory in self.directories():
+                    inotify.add_watch(directory)
+            except (OSError, AttributeError) as e:
+                print(f"[DEBUG] inotify unavailable ({e}); polling every {self.poll_interval}s instead.")
+                if inotify is not None:
+                    inotify.close()
+                inotify = None
+        print(f"[DEBUG] Watching {self.folder} ({'inotify' if inotify else 'polling'}), {len(self.known)} existing files ignored.")
+        last_poll = time.monotonic()
+        try:
+            while not self.stop_event.is_set():
+                if inotify is not None:
+                    events = inotify.read(WATCH_CHECK_INTERVAL)
+                    if events is None:
+                        print("[DEBUG] inotify queue overflowed; rescanning.")
+                        self.rescan()
+                        events = []
+                    for path, is_dir in events:
+                        if is_dir:
+                            if self.recursive and not self.is_excluded(path):
+                                # Watch the new folder (and any folders moved in with it) and pick up its files
+                                for directory in self.directories(path):
+                                    try:
+                                        inotify.add_watch(directory)
+                                    except OSError as e:
+                                        print(f"[ERROR] Could not watch {directory}: {e}")
+                                for file_path in self.scan(path):
+                                    self.notice(file_path)
+                        else:
+                            self.notice(path)
+                else:
+                    self.stop_event.wait(WATCH_CHECK_INTERVAL)
+                    if time.monotonic() - last_poll >= self.poll_interval:
+                        self.rescan()
+                        last_poll = time.monotonic()
+                self.check_pending()
+        finally:
+            if inotify is not None:
+                inotify.close()
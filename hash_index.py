@@ -0,0 +1,53 @@
+#content digests for media files, cached by (path, size, mtime) so unchanged files are never read twice
+import os
+import mmap
+import hashlib
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Configuration ---
+HASH_CHUNK_SIZE = 8 * 1024 * 1024     # Read size when a file can't be memory-mapped
+HASH_WORKERS = max(2, multiprocessing.cpu_count())  # hashlib releases the GIL, so threads hash in parallel
+DIGEST_SIZE = 20                      # BLAKE2b digest bytes
+
+# --- Helper Functions ---
+def hash_file(path):
+    """BLAKE2b digest of a file's content, reading it through mmap (or large buffered reads)."""
+    h = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    with open(path, "rb") as f:
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                h.update(mm)
+        except (ValueError, OSError):
+            # Empty files can't be mapped; some filesystems refuse mmap
+            f.seek(0)
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                h.update(chunk)
+    return h.hexdigest()
+
+class HashIndex:
+    """Digest lookups backed by the records store's (path, size, mtime) cache."""
+    def __init__(self, store):
+        self.store = store
+
+    def digest(self, path):
+        """Digest of path; only re-hashed if its size or mtime changed since last time."""
+        st = os.stat(path)
+        cached = self.store.cached_digest(path, st.st_size, st.st_mtime_ns)
+        if cached:
+            return cached
+        digest = hash_file(path)
+        self.store.save_digest(path, st.st_size, st.st_mtime_ns, digest)
+        return digest
+
+    def digest_many(self, paths, workers=HASH_WORKERS):
+        """Digest every path in a worker pool. Returns { path: digest }, leaving out unreadable files."""
+        def safe_digest(path):
+            try:
+                return path, self.digest(path)
+            except OSError as e:
+                print(f"[ERROR] Could not hash {path}: {e}")
+                return path, None
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = dict(executor.map(safe_digest, paths))
+        return {path: digest for path, digest in results.items() if digest}
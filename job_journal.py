@@ -0,0 +1,146 @@
+#crash-safe journal of upload jobs so a stopped or crashed run can resume where it left off
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+
+# --- Configuration ---
+JOBS_DB_FILE = "upload_jobs.db"   # Kept apart from the records db so journal writes never wait on batched commits
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    webhooks TEXT NOT NULL,
+    announcement TEXT,
+    status TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_files (
+    job_id TEXT NOT NULL,
+    file TEXT NOT NULL,
+    state TEXT NOT NULL,
+    cuts TEXT,
+    parts INTEGER,
+    PRIMARY KEY (job_id, file)
+);
+CREATE TABLE IF NOT EXISTS job_segments (
+    job_id TEXT NOT NULL,
+    file TEXT NOT NULL,
+    part INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    state TEXT NOT NULL,
+    url TEXT,
+    PRIMARY KEY (job_id, file, part)
+);
+"""
+
+# Job states: running -> done or stopped, or discarded when a new upload replaced an unfinished job.
+# File states: pending -> splitting -> done, or queued when the retry queue took it over.
+# Segment states: ready (on disk, complete) -> done (uploaded, url set), or queued.
+
+class JobJournal:
+    """
+    Every state change is committed immediately, so after a crash the journal says exactly
+    which files, and which segments of split videos, made it to Discord.
+    """
+    def __init__(self, path=JOBS_DB_FILE):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def execute(self, sql, args=()):
+        with self.lock:
+            self.conn.execute(sql, args)
+            self.conn.commit()
+
+    def query(self, sql, args=()):
+        with self.lock:
+            return self.conn.execute(sql, args).fetchall()
+
+    def create(self, files, webhook_urls, announcement=None):
+        """Start a job for files; returns an UploadJob."""
+        job_id = uuid.uuid4().hex[:12]
+        with self.lock:
+            self.conn.execute("INSERT INTO jobs (id, created, webhooks, announcement, status) VALUES (?, ?, ?, ?, 'running')",
+                              (job_id, time.time(), json.dumps(webhook_urls), announcement))
+            self.conn.executemany("INSERT OR IGNORE INTO job_files (job_id, file, state) VALUES (?, ?, 'pending')",
+                                  [(job_id, f) for f in files])
+            self.conn.commit()
+        print(f"[DEBUG] Created upload job {job_id} with {len(files)} files.")
+        return UploadJob(self, job_id, webhook_urls, announcement)
+
+    def latest_unfinished(self):
+        """The most recent job that was stopped or never finished (e.g. after a crash), or None."""
+        rows = self.query("SELECT id, webhooks, announcement FROM jobs WHERE status NOT IN ('done', 'discarded') "
+                          "ORDER BY created DESC LIMIT 1")
+        if not rows:
+            return None
+        job_id, webhooks, announcement = rows[0]
+        return UploadJob(self, job_id, json.loads(webhooks), announcement)
+
+class UploadJob:
+    """One job in the journal."""
+    def __init__(self, journal, job_id, webhook_urls, announcement=None):
+        self.journal = journal
+        self.id = job_id
+        self.webhook_urls = webhook_urls
+        self.announcement = announcement
+
+    def set_status(self, status):
+        self.journal.execute("UPDATE jobs SET status = ? WHERE id = ?", (status, self.id))
+
+    def set_file_state(self, file_path, state):
+        self.journal.execute("UPDATE job_files SET state = ? WHERE job_id = ? AND file = ?", (state, self.id, file_path))
+
+    def files(self, states=None):
+        rows = self.journal.query("SELECT file, state FROM job_files WHERE job_id = ? ORDER BY rowid", (self.id,))
+        return [f for f, state in rows if states is None or state in states]
+
+    def counts(self):
+        """{ state: number_of_files } for the job."""
+        return dict(self.journal.query("SELECT state, COUNT(*) FROM job_files WHERE job_id = ? GROUP BY state", (self.id,)))
+
+    def set_plan(self, file_path, cuts, parts):
+        """Remember where a video is cut so a resume can split only the missing range."""
+        self.journal.execute("UPDATE job_files SET state = 'splitting', cuts = ?, parts = ? WHERE job_id = ? AND file = ?",
+                             (json.dumps(cuts), parts, self.id, file_path))
+
+    def plan(self, file_path):
+        """(cuts, parts) recorded for a video, or None if it was never split."""
+        rows = self.journal.query("SELECT cuts, parts FROM job_files WHERE job_id = ? AND file = ?", (self.id, file_path))
+        if not rows or rows[0][0] is None:
+            return None
+        return json.loads(rows[0][0]), rows[0][1]
+
+    def segment_ready(self, file_path, part, path):
+        self.journal.execute("INSERT OR REPLACE INTO job_segments (job_id, file, part, path, state) VALUES (?, ?, ?, ?, 'ready')",
+                             (self.id, file_path, part, path))
+
+    def set_segment_state(self, file_path, part, state, url=None):
+        self.journal.execute("UPDATE job_segments SET state = ?, url = ? WHERE job_id = ? AND file = ? AND part = ?",
+                             (state, url, self.id, file_path, part))
+
+    def segments(self, file_path):
+        """{ part: (path, state, url) } for a split video."""
+        rows = self.journal.query("SELECT part, path, state, url FROM job_segments WHERE job_id = ? AND file = ?",
+                                  (self.id, file_path))
+        return {part: (path, state, url) for part, path, state, url in rows}
+
+    def segment_done(self, file_path, part, url):
+        """Mark a segment uploaded; the whole file is done once every part is."""
+        self.set_segment_state(file_path, part, "done", url)
+        plan = self.plan(file_path)
+        if plan is None:
+            return
+        done = sum(1 for _, state, _ in self.segments(file_path).values() if state == "done")
+        if done >= plan[1]:
+            self.set_file_state(file_path, "done")
+
+    def leftover_segments(self):
+        """Segment files still on disk that were split but never uploaded (for discarding a job)."""
+        rows = self.journal.query("SELECT path FROM job_segments WHERE job_id = ? AND state = 'ready'", (self.id,))
+        return [path for (path,) in rows if os.path.exists(path)]
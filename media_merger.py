@@ -1,13 +1,14 @@
 #merges all media in a folder , small videos into a single video , merges all photos into a gif , photos and videos into a video , can adjust time for each photo
 import os
 import threading
-import subprocess
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from pathlib import Path
 import time
 import traceback
 from PIL import Image, ImageOps
+from media_probe import probe, video_stream
+from ffmpeg_runner import describe, run_ffmpeg
 
 class MediaMergerApp:
     def __init__(self, root):
@@ -45,6 +46,9 @@ class MediaMergerApp:
         self.progress = ttk.Progressbar(root, orient="horizontal", mode="determinate", length=400)
         self.progress.pack(pady=10)
 
+        self.status_label = tk.Label(root, text="")
+        self.status_label.pack(pady=2)
+
         self.merge_button = tk.Button(root, text="Merge to Output", command=self.start_merge)
         self.merge_button.pack(pady=5)
 
@@ -90,6 +94,13 @@ class MediaMergerApp:
     def cancel_process(self):
         self.cancel_requested = True
 
+    def show_ffmpeg_progress(self, done_files, event):
+        """Move the bar through the file ffmpeg is converting, instead of jumping a whole file at a time."""
+        if event["percent"] is not None:
+            self.progress["value"] = done_files + event["percent"] / 100
+        self.status_label.config(text="" if event["done"] else describe(event))
+        self.root.update_idletasks()
+
     def merge_media(self, image_duration):
         temp_dir = Path(self.selected_folder) / "__temp_ffmpeg__"
         temp_dir.mkdir(exist_ok=True)
@@ -148,27 +159,30 @@ class MediaMergerApp:
 
                     if media.suffix.lower() in ['.jpg', '.jpeg', '.png', '.bmp', '.webp']:
                         temp_file = temp_dir / f"image_{image_index}.ts"
-                        cmd = [
-                            "ffmpeg", "-y", "-loop", "1",
+                        args = [
+                            "-y", "-loop", "1",
                             "-t", str(image_duration),
                             "-i", str(media),
                             "-vf", "format=yuv420p",
                             "-c:v", "libx264", "-preset", "veryfast", "-f", "mpegts",
                             str(temp_file)
                         ]
-                        print(f"[DEBUG] Running ffmpeg for image: {cmd}")
-                        subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+                        run_ffmpeg(args, duration=image_duration, label=media.name, check=True,
+                                   on_progress=lambda event, i=i: self.show_ffmpeg_progress(i, event))
                         temp_files.append(temp_file)
                         image_index += 1
+                    elif video_stream(probe(str(media))) is None:
+                        # Probed once and cached; unreadable files no longer abort the whole merge
+                        print(f"[WARN] Skipping {media}: no readable video stream")
                     else:
                         temp_file = temp_dir / f"video_{video_index}.ts"
-                        cmd = [
-                            "ffmpeg", "-y", "-i", str(media),
+                        args = [
+                            "-y", "-i", str(media),
                             "-c:v", "libx264", "-preset", "veryfast", "-c:a", "aac", "-f", "mpegts",
                             str(temp_file)
                         ]
-                        print(f"[DEBUG] Running ffmpeg for video: {cmd}")
-                        subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+                        run_ffmpeg(args, duration=probe(str(media)).get("duration"), label=media.name, check=True,
+                                   on_progress=lambda event, i=i: self.show_ffmpeg_progress(i, event))
                         temp_files.append(temp_file)
                         video_index += 1
 
@@ -176,12 +190,12 @@ class MediaMergerApp:
                     self.root.update_idletasks()
 
                 concat_list = '|'.join([f.as_posix() for f in temp_files])
-                cmd = [
-                    "ffmpeg", "-y", "-i", f"concat:{concat_list}",
+                args = [
+                    "-y", "-i", f"concat:{concat_list}",
                     "-c", "copy", str(output_path)
                 ]
-                print(f"[DEBUG] Running ffmpeg for final merge: {cmd}")
-                subprocess.run(cmd, check=True)
+                self.status_label.config(text=f"Joining {len(temp_files)} files...")
+                run_ffmpeg(args, label=output_path.name, check=True)
 
             messagebox.showinfo("Success", f"Merged output saved to:\n{output_path}")
 
@@ -204,6 +218,7 @@ class MediaMergerApp:
             self.cancel_button.config(state=tk.DISABLED)
             self.merge_button.config(state=tk.NORMAL)
             self.progress["value"] = 0
+            self.status_label.config(text="")
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,109 @@
+#ffprobe metadata (duration, streams, codecs, bitrate, keyframes) cached on disk by (path, size, mtime), shared by all the tools
+import os
+import json
+import sqlite3
+import threading
+import subprocess
+
+# --- Configuration ---
+PROBE_DB_FILE = "media_probe.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS probes (
+    path TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (path, kind)
+);
+"""
+
+# Stream fields kept from ffprobe's output
+STREAM_FIELDS = ("index", "codec_type", "codec_name", "profile", "width", "height", "pix_fmt",
+                 "r_frame_rate", "avg_frame_rate", "sample_rate", "channels", "bit_rate", "duration", "nb_frames")
+
+class ProbeCache:
+    """
+    Results of probing a file, stored per (path, kind) together with the file's size and
+    mtime when it was probed. A lookup costs one stat; a changed file is probed again.
+    kind "info" is the ffprobe summary from probe(); other tools store their own kinds
+    (the split planner keeps the keyframe/GOP sizes it reads from the packets).
+    """
+    def __init__(self, path=PROBE_DB_FILE):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def get(self, path, kind):
+        """Cached data for path, or None if it was never stored or the file changed since."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM probes WHERE path = ? AND kind = ? AND size = ? AND mtime_ns = ?",
+                                    (path, kind, st.st_size, st.st_mtime_ns)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, path, kind, data):
+        st = os.stat(path)
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO probes (path, kind, size, mtime_ns, data) VALUES (?, ?, ?, ?, ?)",
+                              (path, kind, st.st_size, st.st_mtime_ns, json.dumps(data)))
+            self.conn.commit()
+
+PROBE_CACHE = ProbeCache()
+
+# --- Helper Functions ---
+def run_ffprobe(path):
+    """One ffprobe call for format and streams, reduced to the fields the tools use; None if unreadable."""
+    cmd = ["ffprobe", "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path]
+    print(f"[DEBUG] Probing: {path}")
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    try:
+        raw = json.loads(result.stdout)
+    except json.JSONDecodeError:
+        raw = {}
+    if result.returncode != 0 or "format" not in raw:
+        print(f"[ERROR] ffprobe could not read {path}: {result.stderr.strip()}")
+        return None
+    fmt = raw["format"]
+    streams = [{k: s[k] for k in STREAM_FIELDS if k in s} for s in raw.get("streams", [])]
+    def number(value, cast=float):
+        try:
+            return cast(value)
+        except (TypeError, ValueError):
+            return None
+    return {
+        "format": fmt.get("format_name"),
+        "duration": number(fmt.get("duration")),
+        "bit_rate": number(fmt.get("bit_rate"), int),
+        "size": number(fmt.get("size"), int),
+        "streams": streams,
+    }
+
+def probe(path):
+    """Metadata for a media file: { format, duration, bit_rate, size, streams: [...] }, or None if ffprobe can't read it.
+    Files that fail are remembered too, so they aren't probed again until they change."""
+    cached = PROBE_CACHE.get(path, "info")
+    if cached is not None:
+        return cached.get("info")
+    info = run_ffprobe(path)
+    if os.path.exists(path):
+        PROBE_CACHE.put(path, "info", {"info": info})
+    return info
+
+def probe_duration(path):
+    """Duration in seconds, or None."""
+    info = probe(path)
+    return info["duration"] if info else None
+
+def video_stream(info):
+    """The first video stream of probe() output, or None."""
+    for stream in (info or {}).get("streams", []):
+        if stream.get("codec_type") == "video":
+            return stream
+    return None
@@ -0,0 +1,61 @@
+#fast media file scanner: os.scandir with DirEntry type data, optional parallel walking of subfolders, results in batches
+import os
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# --- Configuration ---
+SCAN_WORKERS = min(8, multiprocessing.cpu_count() * 2)  # scandir releases the GIL, so threads overlap the I/O
+SCAN_BATCH_SIZE = 500                                    # Paths handed to on_batch at a time
+
+# --- Helper Functions ---
+def scan_dir(path, exts):
+    """(media files, subfolders) of one folder. DirEntry's type info comes with the listing, so no stat per file."""
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif os.path.splitext(entry.name)[1].lower() in exts and entry.is_file():
+                    files.append(entry.path)
+    except OSError as e:
+        print(f"[ERROR] Could not scan {path}: {e}")
+    return files, subdirs
+
+def scan_media(folder, exts, recursive=False, workers=SCAN_WORKERS, on_batch=None, batch_size=SCAN_BATCH_SIZE):
+    """
+    Media files in folder (and its subfolders when recursive). With workers > 1, subfolders
+    are scanned in parallel. on_batch(paths), if given, receives the results batch_size at a
+    time while the scan is still running. Returns every path found.
+    """
+    exts = {ext.lower() for ext in exts}
+    found = []
+    batch = []
+    def deliver(files):
+        found.extend(files)
+        if on_batch is None:
+            return
+        batch.extend(files)
+        while len(batch) >= batch_size:
+            on_batch(batch[:batch_size])
+            del batch[:batch_size]
+    if not recursive or workers <= 1:
+        stack = [folder]
+        while stack:
+            files, subdirs = scan_dir(stack.pop(), exts)
+            deliver(files)
+            if recursive:
+                stack.extend(subdirs)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = {executor.submit(scan_dir, folder, exts)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    files, subdirs = future.result()
+                    deliver(files)
+                    pending.update(executor.submit(scan_dir, d, exts) for d in subdirs)
+    if on_batch is not None and batch:
+        on_batch(batch)
+    return found
@@ -0,0 +1,100 @@
+#compares a folder with the upload records: which files are uploaded, missing, partly uploaded or changed since upload
+import os
+from uploader_core import (RECORDS_STORE, HASH_INDEX, JOB_JOURNAL, MAX_SIZE, find_media_files, plan_split, size_limit,
+                           webhook_target)
+
+class FolderReconciliation:
+    """
+    Result of reconcile_folder().
+    uploaded: files whose current content has every URL in the records.
+    missing: files with no upload record.
+    partial: split videos with some segments uploaded, as { file: { "parts", "done": { part: url } } }.
+    changed: files that were uploaded, but whose content has changed since.
+    gone: recorded files that are no longer on disk.
+    """
+    def __init__(self, folder, recursive):
+        self.folder = folder
+        self.recursive = recursive
+        self.uploaded = []
+        self.missing = []
+        self.partial = {}
+        self.changed = []
+        self.gone = []
+
+    def counts(self):
+        return {"files": len(self.uploaded) + len(self.missing) + len(self.partial) + len(self.changed),
+                "uploaded": len(self.uploaded), "missing": len(self.missing), "partial": len(self.partial),
+                "changed": len(self.changed), "gone": len(self.gone)}
+
+    def gaps(self):
+        """Files that still have to be uploaded for the folder to match the records."""
+        return self.missing + list(self.partial) + self.changed
+
+    def summary(self):
+        counts = self.counts()
+        return (f"{counts['uploaded']} of {counts['files']} files in {self.folder} are uploaded.\n"
+                f"Missing: {counts['missing']}, partly uploaded: {counts['partial']}, "
+                f"changed since upload: {counts['changed']}.\n"
+                f"Recorded but no longer on disk: {counts['gone']}.")
+
+# --- Helper Functions ---
+def reconcile_folder(folder, recursive=False):
+    """
+    Diff a folder against the upload records. The folder's records are read in one indexed range
+    query and matched to the files on disk through a dict, so 100k files take one pass.
+    Only recorded files are hashed to spot changes, and unchanged ones hit the digest cache.
+    Files are matched by path: a renamed copy of uploaded content shows as missing (the upload
+    itself still skips it by digest). Records imported from JSON have no digest, so a change to
+    those files can't be detected.
+    """
+    on_disk = find_media_files(folder, recursive)
+    states = RECORDS_STORE.file_states(folder, recursive)
+    result = FolderReconciliation(folder, recursive)
+    local = set(on_disk)
+    result.gone = sorted(f for f in states if f not in local)
+    digests = HASH_INDEX.digest_many([f for f in on_disk if any(d is not None for d in states.get(f, ()))])
+    for f in on_disk:
+        by_digest = states.get(f)
+        if not by_digest:
+            result.missing.append(f)
+            continue
+        state = by_digest.get(digests.get(f)) or by_digest.get(None)
+        if state is None:
+            result.changed.append(f)
+        elif state["whole"] or (state["parts"] and len(state["done"]) >= state["parts"]):
+            result.uploaded.append(f)
+        elif state["done"]:
+            result.partial[f] = {"parts": state["parts"], "done": state["done"]}
+        else:
+            result.missing.append(f)
+    print(f"[DEBUG] Reconciled {folder}: {result.counts()}")
+    return result
+
+def seed_partial(job, file_path, partial, max_size=None):
+    """
+    Journal the segments of a partly uploaded video as done, so the upload splits and sends only
+    the missing ones (the same way a resumed job does). Only possible while the video still splits
+    into the same cuts at the destination's max_size; otherwise it is uploaded whole again.
+    """
+    cuts = plan_split(file_path, max_size or MAX_SIZE)
+    if cuts is None or len(cuts) + 1 != partial["parts"]:
+        print(f"[DEBUG] Split plan for {file_path} no longer matches its {partial['parts']} recorded parts; uploading all of it.")
+        return False
+    job.set_plan(file_path, cuts, partial["parts"])
+    for part, url in partial["done"].items():
+        job.segment_ready(file_path, part, "")
+        job.segment_done(file_path, part, url)
+    print(f"[DEBUG] {file_path}: {len(partial['done'])} of {partial['parts']} parts already uploaded.")
+    return True
+
+def gap_job(result, webhook_urls):
+    """A journaled upload job for the gaps of a reconciliation. Returns (files, job), or ([], None) if there are none."""
+    files = result.gaps()
+    if not files:
+        return [], None
+    job = JOB_JOURNAL.create(files, webhook_urls)
+    max_size = size_limit(webhook_target(webhook_urls))
+    for file_path, partial in result.partial.items():
+        if os.path.exists(file_path):
+            seed_partial(job, file_path, partial, max_size)
+    return files, job
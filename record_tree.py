@@ -0,0 +1,112 @@
+#lazily populated ttk.Treeview of upload records, so the file manager opens instantly on very large archives
+import os
+
+# --- Configuration ---
+PAGE_SIZE = 500              # Records inserted per page when a folder is opened
+PLACEHOLDER_TEXT = "Loading..."
+
+class LazyRecordTree:
+    """
+    Fills a ttk.Treeview from a RecordsStore on demand.
+    Only folder nodes are inserted up front, each with a placeholder child so it can be opened.
+    Opening a folder reads and inserts its first PAGE_SIZE records; a "Show more" node at the end
+    of the folder reads the next page from the store, so a folder is never loaded whole.
+    """
+    def __init__(self, tree, store, exts, thumbnails=None, page_size=PAGE_SIZE):
+        self.tree = tree
+        self.store = store
+        self.exts = exts
+        self.thumbnails = thumbnails
+        self.page_size = page_size
+        self.cursors = {}          # folder -> id of the last record row read, once opened
+        self.items = {}            # record item -> record
+        self.more_items = {}       # "Show more" item -> folder
+        tree.bind("<<TreeviewOpen>>", self.on_open, add="+")
+        tree.bind("<<TreeviewSelect>>", self.on_select, add="+")
+
+    def populate(self):
+        """(Re)build the tree with one collapsed node per folder in the store."""
+        self.tree.delete(*self.tree.get_children())
+        self.cursors.clear()
+        self.items.clear()
+        self.more_items.clear()
+        if self.thumbnails:
+            self.thumbnails.images.clear()
+        for folder in self.store.folders():
+            self.insert_folder(folder)
+
+    def insert_folder(self, folder, index="end"):
+        self.tree.insert("", index, iid=folder, text=folder, open=False, values=(folder,))
+        self.tree.insert(folder, "end", text=PLACEHOLDER_TEXT)
+
+    def is_folder(self, item):
+        return item != "" and self.tree.parent(item) == ""
+
+    def folder_of(self, item):
+        """The folder a tree item belongs to (the item itself for folder nodes)."""
+        return item if self.is_folder(item) else self.tree.parent(item)
+
+    def record(self, item):
+        """The upload record shown by item, or None for folder and paging nodes."""
+        return self.items.get(item)
+
+    def shows(self, rec):
+        return os.path.splitext(rec["file"])[1].lower() in self.exts
+
+    def records(self, folder):
+        """Every record of a folder (for downloading it whole), read from the store."""
+        return [rec for rec in self.store.records(folder) if self.shows(rec)]
+
+    def on_open(self, event):
+        folder = self.tree.focus()
+        if self.is_folder(folder) and folder not in self.cursors:
+            self.tree.delete(*self.tree.get_children(folder))
+            self.cursors[folder] = 0
+            self.load_page(folder)
+
+    def on_select(self, event):
+        for item in self.tree.selection():
+            if item in self.more_items:
+                self.load_page(self.more_items.pop(item), more_item=item)
+
+    def load_page(self, folder, more_item=None):
+        """Insert the next page of a folder's records, with a "Show more" node if any are left."""
+        if more_item is not None:
+            self.tree.delete(more_item)
+        records = []
+        more = True
+        # Records with other extensions are skipped, so keep reading until the page is full or the folder ends
+        while more and len(records) < self.page_size:
+            page, self.cursors[folder] = self.store.records_page(folder, self.cursors[folder], self.page_size)
+            more = len(page) == self.page_size
+            records.extend(rec for rec in page if self.shows(rec))
+        for rec in records:
+            item = self.tree.insert(folder, "end", text=os.path.basename(rec["file"]), values=(rec["file"],))
+            self.items[item] = rec
+            if self.thumbnails:
+                self.thumbnails.add(item, rec)
+        if more:
+            item = self.tree.insert(folder, "end", text="Show more", values=("",))
+            self.more_items[item] = folder
+
+    def refresh_folder(self, folder):
+        """Re-read one folder from the store after it changed, leaving the rest of the tree alone."""
+        if not self.tree.exists(folder):
+            return
+        index = self.tree.index(folder)
+        was_open = self.tree.item(folder, "open")
+        for item in self.tree.get_children(folder):
+            self.items.pop(item, None)
+            self.more_items.pop(item, None)
+            if self.thumbnails:
+                self.thumbnails.forget(item)
+        self.tree.delete(folder)
+        self.cursors.pop(folder, None)
+        if not self.store.has_folder(folder):
+            return
+        self.insert_folder(folder, index)
+        if was_open:
+            self.tree.item(folder, open=True)
+            self.tree.delete(*self.tree.get_children(folder))
+            self.cursors[folder] = 0
+            self.load_page(folder)
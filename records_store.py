@@ -0,0 +1,268 @@
+#stores upload records in sqlite so each upload is an O(1) insert instead of rewriting uploaded_records.json
+import os
+import json
+import time
+import sqlite3
+import atexit
+import threading
+
+# --- Configuration ---
+RECORDS_DB_FILE = "uploaded_records.db"
+LEGACY_RECORDS_FILE = "uploaded_records.json"   # Imported once, then left in place as a backup
+COMMIT_EVERY = 100                               # Inserts per commit
+COMMIT_INTERVAL = 1.0                            # Seconds before pending inserts are committed anyway
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    folder TEXT NOT NULL,
+    file TEXT NOT NULL,
+    urls TEXT NOT NULL,
+    webhook TEXT,
+    uploaded_at REAL,
+    digest TEXT,
+    part INTEGER,
+    parts INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_records_folder ON records(folder);
+CREATE INDEX IF NOT EXISTS idx_records_file ON records(file);
+CREATE TABLE IF NOT EXISTS digests (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# Columns added after the first release of the store, with their types
+MIGRATED_COLUMNS = [("digest", "TEXT"), ("part", "INTEGER"), ("parts", "INTEGER")]
+
+class RecordsStore:
+    """
+    Upload records in SQLite (WAL mode), safe to share between worker threads.
+    Inserts are committed in batches; flush() forces pending inserts to disk.
+    Records are returned in the same shape as the old JSON: { "file", "urls", "webhook" },
+    plus the content "digest" (None for records imported from JSON).
+    A split video is stored as one row per segment (part of parts) and read back as a
+    single record whose urls are in segment order.
+    """
+    def __init__(self, path=RECORDS_DB_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        existing = {row[1] for row in self.conn.execute("PRAGMA table_info(records)")}
+        for column, column_type in MIGRATED_COLUMNS:
+            if column not in existing:
+                self.conn.execute(f"ALTER TABLE records ADD COLUMN {column} {column_type}")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_records_digest ON records(digest)")
+        self.conn.commit()
+        self.pending = 0
+        self.last_commit = time.monotonic()
+        atexit.register(self.flush)
+        if os.path.exists(LEGACY_RECORDS_FILE) and not self.get_meta("json_imported"):
+            self.import_json(LEGACY_RECORDS_FILE)
+
+    def get_meta(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def import_json(self, json_path):
+        """Import an uploaded_records.json file ({ folder: [ { "file", "urls" }, ... ] }) in one transaction."""
+        with open(json_path, 'r') as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError as e:
+                print(f"[ERROR] Could not import {json_path}: {e}")
+                return 0
+        rows = [(folder, rec["file"], json.dumps(rec.get("urls", [])), rec.get("webhook"), None)
+                for folder, records in data.items() for rec in records]
+        with self.lock:
+            self.conn.executemany(
+                "INSERT INTO records (folder, file, urls, webhook, uploaded_at) VALUES (?, ?, ?, ?, ?)", rows)
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_imported', ?)", (json_path,))
+            self.conn.commit()
+        print(f"[DEBUG] Imported {len(rows)} records from {json_path}")
+        return len(rows)
+
+    def add(self, folder, file_path, urls, webhook=None, digest=None, part=None, parts=None):
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO records (folder, file, urls, webhook, uploaded_at, digest, part, parts) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (folder, file_path, json.dumps(urls), webhook, time.time(), digest, part, parts))
+            self.pending += 1
+            if self.pending >= COMMIT_EVERY or time.monotonic() - self.last_commit >= COMMIT_INTERVAL:
+                self._commit()
+
+    def set_parts(self, file_path, digest, parts):
+        """Correct the segment count of a split video once ffmpeg has finished."""
+        with self.lock:
+            self.conn.execute("UPDATE records SET parts = ? WHERE file = ? AND digest = ? AND part IS NOT NULL",
+                              (parts, file_path, digest))
+            self._commit()
+
+    def _commit(self):
+        self.conn.commit()
+        self.pending = 0
+        self.last_commit = time.monotonic()
+
+    def flush(self):
+        with self.lock:
+            if self.pending:
+                self._commit()
+
+    @staticmethod
+    def _group(rows):
+        """
+        Turn (folder, file, urls, webhook, digest, part, parts) rows (in id order) into (folder, record) pairs,
+        merging the segment rows of a split video into one record. Segments are grouped by digest, so a video
+        that was uploaded again after it changed never mixes parts of two versions: the record is the newest
+        version with every segment uploaded, or the newest version if none is complete.
+        """
+        result = []
+        split = {}   # (folder, file) -> (index in result, { digest: record })
+        for row_number, (folder, file_path, urls, webhook, digest, part, parts) in enumerate(rows):
+            if part is None:
+                result.append((folder, {"file": file_path, "urls": json.loads(urls), "webhook": webhook, "digest": digest}))
+                continue
+            key = (folder, file_path)
+            if key not in split:
+                split[key] = (len(result), {})
+                result.append(None)
+            versions = split[key][1]
+            if digest not in versions:
+                versions[digest] = {"file": file_path, "urls": [], "webhook": webhook, "digest": digest,
+                                    "parts": parts, "_parts": {}}
+            record = versions[digest]
+            record["parts"] = parts
+            record["_last"] = row_number
+            urls = json.loads(urls)
+            if urls:
+                record["_parts"][part] = urls[0]
+        for (folder, _), (index, versions) in split.items():
+            for record in versions.values():
+                done = record.pop("_parts")
+                record["urls"] = [done[i] for i in sorted(done)]
+            complete = [r for r in versions.values() if r["parts"] and len(r["urls"]) >= r["parts"]]
+            record = max(complete or versions.values(), key=lambda r: r["_last"])
+            for r in versions.values():
+                del r["_last"]
+            result[index] = (folder, record)
+        return result
+
+    def _select(self, where="", args=()):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT folder, file, urls, webhook, digest, part, parts FROM records " + where + " ORDER BY id",
+                args).fetchall()
+        return self._group(rows)
+
+    def folders(self):
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT DISTINCT folder FROM records ORDER BY folder")]
+
+    def has_folder(self, folder):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM records WHERE folder = ? LIMIT 1", (folder,)).fetchone() is not None
+
+    def records(self, folder):
+        return [record for _, record in self._select("WHERE folder = ?", (folder,))]
+
+    def records_page(self, folder, after_id=0, limit=500):
+        """
+        Up to limit records of a folder whose first row comes after after_id, so big folders can be
+        read a page at a time. Returns (records, last_id); pass last_id back as after_id for the next page.
+        A split video is paged by its first segment row; all of its segment rows are read so _group
+        can return the newest complete version.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, file, part FROM records AS r WHERE folder = ? AND id > ? AND (part IS NULL OR id = "
+                "(SELECT MIN(id) FROM records WHERE file = r.file AND folder = r.folder AND part IS NOT NULL)) "
+                "ORDER BY id LIMIT ?", (folder, after_id, limit)).fetchall()
+        if not rows:
+            return [], after_id
+        ids = [row_id for row_id, _, part in rows if part is None]
+        split_files = [file_path for _, file_path, part in rows if part is not None]
+        where = (f"WHERE folder = ? AND (id IN ({','.join('?' * len(ids))}) "
+                 f"OR (part IS NOT NULL AND file IN ({','.join('?' * len(split_files))})))")
+        records = [record for _, record in self._select(where, (folder, *ids, *split_files))]
+        return records, rows[-1][0]
+
+    def records_for_file(self, file_path):
+        return [record for _, record in self._select("WHERE file = ?", (file_path,))]
+
+    def file_states(self, folder, recursive=False):
+        """
+        Upload state of every recorded file in folder (and its subfolders when recursive), read with
+        one range scan of the file index: { file: { digest: { "whole", "parts", "done": { part: url } } } }.
+        "whole" is True if the file has a whole-file record with URLs; "done" holds the segments that have one.
+        """
+        prefix = os.path.join(folder, "")
+        with self.lock:
+            rows = self.conn.execute("SELECT file, digest, urls, part, parts FROM records WHERE file >= ? AND file < ?",
+                                     (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1))).fetchall()
+        states = {}
+        for file_path, digest, urls, part, parts in rows:
+            if not recursive and os.path.dirname(file_path) != os.path.dirname(prefix):
+                continue
+            state = states.setdefault(file_path, {}).setdefault(digest, {"whole": False, "parts": None, "done": {}})
+            if urls == "[]":
+                continue
+            if part is None:
+                state["whole"] = True
+            else:
+                state["parts"] = parts
+                state["done"][part] = json.loads(urls)[0]
+        return states
+
+    # --- Content digests ---
+    def cached_digest(self, path, size, mtime_ns):
+        with self.lock:
+            row = self.conn.execute("SELECT digest FROM digests WHERE path = ? AND size = ? AND mtime_ns = ?",
+                                    (path, size, mtime_ns)).fetchone()
+        return row[0] if row else None
+
+    def save_digest(self, path, size, mtime_ns, digest):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO digests (path, size, mtime_ns, digest) VALUES (?, ?, ?, ?)",
+                              (path, size, mtime_ns, digest))
+            self.pending += 1
+            if self.pending >= COMMIT_EVERY or time.monotonic() - self.last_commit >= COMMIT_INTERVAL:
+                self._commit()
+
+    def has_live_urls(self, digest):
+        """True if content with this digest is fully uploaded: a whole-file record with URLs,
+        or every segment of a split upload."""
+        with self.lock:
+            if self.conn.execute("SELECT 1 FROM records WHERE digest = ? AND part IS NULL AND urls != '[]' LIMIT 1",
+                                 (digest,)).fetchone():
+                return True
+            rows = self.conn.execute(
+                "SELECT parts, COUNT(DISTINCT part) FROM records "
+                "WHERE digest = ? AND part IS NOT NULL AND urls != '[]' GROUP BY file, parts",
+                (digest,)).fetchall()
+        return any(parts and count >= parts for parts, count in rows)
+
+    def adopt_legacy_records(self, file_path, digest):
+        """Attach a digest to records imported from JSON (which had none) for the same path."""
+        with self.lock:
+            cursor = self.conn.execute("UPDATE records SET digest = ? WHERE file = ? AND digest IS NULL AND part IS NULL",
+                                       (digest, file_path))
+            self._commit()
+        return cursor.rowcount
+
+    def delete_folder(self, folder):
+        with self.lock:
+            self.conn.execute("DELETE FROM records WHERE folder = ?", (folder,))
+            self._commit()
+
+    def delete_file(self, folder, file_path):
+        with self.lock:
+            self.conn.execute("DELETE FROM records WHERE folder = ? AND file = ?", (folder, file_path))
+            self._commit()
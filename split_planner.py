@@ -0,0 +1,149 @@
+#plans where to cut a video so that every stream-copied segment stays under a byte limit
+import math
+import os
+import subprocess
+import bisect
+from media_probe import PROBE_CACHE, probe_duration
+
+# --- Configuration ---
+SEGMENT_OVERHEAD = 64 * 1024   # Container header/trailer reserved per segment (bytes)
+PACKET_OVERHEAD = 16           # Index entry cost per packet in the output container (bytes)
+CUT_EPSILON = 0.001            # Seconds subtracted from each cut so ffmpeg lands on the keyframe itself
+
+# --- Helper Functions ---
+def probe_packets(input_file):
+    """
+    Read every packet of the file once with ffprobe.
+    Returns (keyframe_times, packets) where packets is a list of (pts_time, size).
+    """
+    cmd = [
+        "ffprobe", "-v", "error",
+        "-show_entries", "packet=codec_type,pts_time,size,flags",
+        "-of", "csv=p=0", input_file
+    ]
+    print(f"[DEBUG] Probing packets: {' '.join(cmd)}")
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    keyframes = []
+    packets = []
+    for line in result.stdout.splitlines():
+        parts = line.strip().split(",")
+        if len(parts) < 4:
+            continue
+        codec_type, pts_time, size, flags = parts[0], parts[1], parts[2], parts[3]
+        try:
+            pts = float(pts_time)
+            size = int(size)
+        except ValueError:
+            continue
+        packets.append((pts, size))
+        if codec_type == "video" and "K" in flags:
+            keyframes.append(pts)
+    keyframes.sort()
+    print(f"[DEBUG] {input_file}: {len(packets)} packets, {len(keyframes)} keyframes")
+    return keyframes, packets
+
+def gop_sizes(keyframes, packets):
+    """Sum packet bytes (plus index overhead) into the keyframe interval each packet belongs to."""
+    sizes = [0] * len(keyframes)
+    for pts, size in packets:
+        # Packets before the first keyframe (e.g. leading audio) travel with the first GOP
+        idx = max(0, bisect.bisect_right(keyframes, pts) - 1)
+        sizes[idx] += size + PACKET_OVERHEAD
+    return sizes
+
+def keyframe_gops(input_file):
+    """(keyframe_times, gop_sizes) of a file, from the probe cache or one packet scan."""
+    cached = PROBE_CACHE.get(input_file, "gops")
+    if cached is not None:
+        return cached["keyframes"], cached["sizes"]
+    keyframes, packets = probe_packets(input_file)
+    if not keyframes or not packets:
+        return [], []
+    sizes = gop_sizes(keyframes, packets)
+    PROBE_CACHE.put(input_file, "gops", {"keyframes": keyframes, "sizes": sizes})
+    return keyframes, sizes
+
+def plan_cuts(keyframes, sizes, max_size):
+    """
+    Greedily pack consecutive GOPs into segments no larger than max_size.
+    Greedy packing of a fixed sequence gives the fewest segments possible.
+    Returns (cut_times, oversize_gops); cut_times excludes the start of the file.
+    """
+    budget = max_size - SEGMENT_OVERHEAD
+    cuts = []
+    oversize = []
+    current = 0
+    for i, size in enumerate(sizes):
+        if size > budget:
+            oversize.append(keyframes[i])
+        if current and current + size > budget:
+            cuts.append(keyframes[i])
+            current = 0
+        current += size
+    return cuts, oversize
+
+def plan_segments(input_file, max_size):
+    """
+    Compute explicit ffmpeg -segment_times for input_file so each segment fits in max_size.
+    Returns (cuts, oversize_gops): the cut times in seconds, or None if the file could not be planned,
+    and the start times of keyframe intervals bigger than max_size on their own. A stream copy can't
+    fit those, so callers re-encode the video (fit_encoder) or skip it.
+    """
+    keyframes, sizes = keyframe_gops(input_file)
+    if not keyframes:
+        print(f"[ERROR] No keyframes found in {input_file}; cannot plan cuts.")
+        return None, []
+    cuts, oversize = plan_cuts(keyframes, sizes, max_size)
+    if oversize:
+        print(f"[ERROR] {len(oversize)} keyframe interval(s) in {input_file} exceed the size limit on their own "
+              f"(first at {oversize[0]:.2f}s); those segments cannot fit without re-encoding.")
+    print(f"[DEBUG] Planned {len(cuts) + 1} segments for {input_file}")
+    return cuts, oversize
+
+def plan_split(input_file, max_size):
+    """
+    Cut times (seconds) for stream-copying input_file, so the segment count is len(cuts) + 1.
+    Cut points come from the packet/keyframe planner so every segment fits in max_size;
+    if the file cannot be planned we fall back to equal-duration segments.
+    Returns None if the video can't be read at all, or can't be stream-copied under max_size.
+    """
+    cuts, oversize = plan_segments(input_file, max_size)
+    if oversize:
+        return None
+    if cuts is not None:
+        print(f"[DEBUG] Splitting {input_file} into {len(cuts) + 1} segments at planned keyframes")
+        return cuts
+    duration = probe_duration(input_file)
+    if duration is None:
+        print(f"[ERROR] Could not get duration for {input_file}")
+        return None
+    num_segments = math.ceil(os.path.getsize(input_file) / max_size)
+    seg_duration = duration / num_segments
+    print(f"[DEBUG] Splitting {input_file} into {num_segments} segments (approx {seg_duration:.2f} sec each)")
+    return [seg_duration * i for i in range(1, num_segments)]
+
+def split_args(cuts, start_part=0):
+    """
+    ffmpeg (input_args, output_args) that cut at cuts.
+    With start_part > 0 ffmpeg seeks to the start of that segment and numbers output from it,
+    so a resumed job only splits the range that is still missing.
+    """
+    input_args = []
+    offset = 0.0
+    if start_part:
+        # Seek just past the keyframe the segment starts on; stream copy lands on that keyframe
+        offset = cuts[start_part - 1] + CUT_EPSILON
+        input_args = ["-ss", f"{offset:.3f}"]
+    remaining = [c - offset for c in cuts[start_part:]]
+    if remaining:
+        output_args = ["-segment_times", format_segment_times(remaining)]
+    else:
+        # Everything left fits in one segment; use a segment time longer than any video
+        output_args = ["-segment_time", "999999"]
+    if start_part:
+        output_args += ["-segment_start_number", str(start_part)]
+    return input_args, output_args
+
+def format_segment_times(cuts):
+    """Format cut times for ffmpeg's -segment_times option."""
+    return ",".join(f"{max(0.0, t - CUT_EPSILON):.3f}" for t in cuts)
@@ -0,0 +1,77 @@
+#splitting a video inside a watched folder must not report its segments as new media
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import subprocess
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORK_DIR = tempfile.mkdtemp()
+ORIGINAL_DIR = os.getcwd()
+
+def setUpModule():
+    # uploader_core opens its databases in the working directory on import
+    os.chdir(WORK_DIR)
+    global core
+    import uploader_core as core
+
+def tearDownModule():
+    os.chdir(ORIGINAL_DIR)
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+@unittest.skipUnless(shutil.which("ffmpeg") and shutil.which("ffprobe"), "needs ffmpeg and ffprobe")
+class WatchIgnoresSegmentsTest(unittest.TestCase):
+    def test_split_inside_watched_folder_reports_nothing(self):
+        folder = os.path.join(WORK_DIR, "watched")
+        os.makedirs(folder)
+        video = os.path.join(folder, "big.mp4")
+        subprocess.run(["ffmpeg", "-v", "error", "-y", "-f", "lavfi", "-i", "testsrc=duration=4:size=320x240:rate=25",
+                        "-c:v", "mpeg4", "-b:v", "2M", "-g", "25", video], check=True)
+
+        from folder_watcher import FolderWatcher
+        reported = []
+        stop = threading.Event()
+        watcher = FolderWatcher(folder, reported.extend, core.VIDEO_EXTS, recursive=True, settle=0.2,
+                                poll_interval=0.2, stop_event=stop, exclude=[core.SEGMENTS_DIR])
+        thread = threading.Thread(target=watcher.run, daemon=True)
+        thread.start()
+        time.sleep(0.5)
+
+        pattern = core.segment_pattern(video)
+        segments = list(core.split_segments(video, pattern, max_size=256 * 1024))
+        self.assertGreater(len(segments), 1)
+        for seg in segments:
+            self.assertFalse(seg.startswith(os.path.join(folder, "")), seg)
+        time.sleep(1.0)   # Several settle periods for anything the watcher might have noticed
+        stop.set()
+        thread.join()
+        self.assertEqual(reported, [])
+
+    def test_excluded_folder_inside_watched_tree(self):
+        folder = os.path.join(WORK_DIR, "tree")
+        excluded = os.path.join(folder, "segments")
+        os.makedirs(excluded)
+        from folder_watcher import FolderWatcher
+        reported = []
+        stop = threading.Event()
+        watcher = FolderWatcher(folder, reported.extend, [".mp4"], recursive=True, settle=0.2,
+                                poll_interval=0.2, stop_event=stop, exclude=[excluded])
+        thread = threading.Thread(target=watcher.run, daemon=True)
+        thread.start()
+        time.sleep(0.5)
+        for name in ("big_000.mp4", "big_001.mp4"):
+            with open(os.path.join(excluded, name), "wb") as f:
+                f.write(b"x" * 1000)
+        with open(os.path.join(folder, "new.mp4"), "wb") as f:
+            f.write(b"x" * 1000)
+        time.sleep(1.5)
+        stop.set()
+        thread.join()
+        self.assertEqual(reported, [os.path.join(folder, "new.mp4")])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,161 @@
+#video thumbnails for the file manager, generated in the background and kept in a size-capped LRU cache on disk
+import os
+import queue
+import hashlib
+import subprocess
+import threading
+import multiprocessing
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Configuration ---
+THUMBNAIL_DIR = "thumbnails"
+THUMBNAIL_CACHE_BYTES = 64 * 1024 * 1024   # Least recently used thumbnails are evicted above this
+THUMBNAIL_WORKERS = max(1, multiprocessing.cpu_count() // 2)  # ffmpeg processes running at once
+THUMBNAIL_WIDTH = 64
+THUMBNAIL_HEIGHT = 36
+THUMBNAIL_SEEK = 1.0                       # Seconds into the video the frame is taken from
+THUMBNAIL_POLL_INTERVAL = 200              # Milliseconds between checks for finished thumbnails
+
+# --- Helper Functions ---
+def thumbnail_key(rec):
+    """Cache key for an upload record: its content digest, or (for records without one) a hash of its first URL."""
+    if rec.get("digest"):
+        return rec["digest"]
+    return hashlib.blake2b(rec["urls"][0].encode("utf-8"), digest_size=20).hexdigest()
+
+def thumbnail_source(rec):
+    """Where to read the frame from: the local file if it still exists, else the first uploaded segment."""
+    if os.path.exists(rec["file"]):
+        return rec["file"]
+    return rec["urls"][0] if rec["urls"] else None
+
+def extract_frame(source, out_path, seek=THUMBNAIL_SEEK):
+    """One ffmpeg call: seek to the nearest keyframe before decoding (input -ss), scale and pad one frame."""
+    scale = (f"scale={THUMBNAIL_WIDTH}:{THUMBNAIL_HEIGHT}:force_original_aspect_ratio=decrease,"
+             f"pad={THUMBNAIL_WIDTH}:{THUMBNAIL_HEIGHT}:(ow-iw)/2:(oh-ih)/2")
+    cmd = ["ffmpeg", "-y", "-loglevel", "error", "-ss", str(seek), "-i", source,
+           "-frames:v", "1", "-vf", scale, out_path]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    return result.returncode == 0 and os.path.exists(out_path)
+
+class ThumbnailCache:
+    """
+    PNG thumbnails in THUMBNAIL_DIR named by content key. A file's mtime is its last use,
+    so eviction deletes the oldest ones once the directory grows past max_bytes.
+    Generation runs on a bounded worker pool (one ffmpeg process per thumbnail).
+    """
+    def __init__(self, directory=THUMBNAIL_DIR, max_bytes=THUMBNAIL_CACHE_BYTES, workers=THUMBNAIL_WORKERS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.lock = threading.Lock()
+        self.pending = {}   # key -> callbacks waiting for a thumbnail being generated
+        self.failed = set()   # Keys ffmpeg couldn't make a thumbnail for this session
+        self.total_bytes = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".png")
+
+    def get(self, key):
+        """Path of a cached thumbnail (marking it recently used), or None."""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def request(self, key, source, on_ready):
+        """Call on_ready(path) once the thumbnail for key exists; generates it in the background if needed.
+        on_ready may run on a worker thread."""
+        path = self.get(key)
+        if path:
+            on_ready(path)
+            return
+        with self.lock:
+            if key in self.pending:
+                self.pending[key].append(on_ready)
+                return
+            if key in self.failed or not source:
+                return
+            self.pending[key] = [on_ready]
+        self.executor.submit(self.generate, key, source)
+
+    def generate(self, key, source):
+        path = self.path(key)
+        tmp_path = os.path.join(self.directory, key + ".tmp.png")
+        try:
+            ok = extract_frame(source, tmp_path)
+            if ok:
+                os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"[ERROR] Thumbnail failed for {source}: {e}")
+            ok = False
+        with self.lock:
+            waiting = self.pending.pop(key, [])
+            if not ok:
+                self.failed.add(key)
+                return
+            self.total_bytes += os.path.getsize(path)
+            over = self.total_bytes > self.max_bytes
+        if over:
+            self.evict()
+        for on_ready in waiting:
+            on_ready(path)
+
+    def evict(self):
+        """Delete least recently used thumbnails until the cache is back under 90% of max_bytes."""
+        with self.lock:
+            entries = sorted((e for e in os.scandir(self.directory) if e.is_file()), key=lambda e: e.stat().st_mtime)
+            self.total_bytes = sum(e.stat().st_size for e in entries)
+            for entry in entries:
+                if self.total_bytes <= self.max_bytes * 0.9:
+                    break
+                size = entry.stat().st_size
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    continue
+                self.total_bytes -= size
+        print(f"[DEBUG] Thumbnail cache trimmed to {self.total_bytes // 1024} KB.")
+
+class TreeThumbnails:
+    """
+    Shows thumbnails on ttk.Treeview items. Requests go to the cache's workers; finished
+    thumbnails are handed back through a queue and loaded on the Tk thread, so the window
+    never waits on ffmpeg.
+    """
+    def __init__(self, tree, cache):
+        self.tree = tree
+        self.cache = cache
+        self.ready = queue.Queue()
+        self.images = {}   # item -> PhotoImage (Tk drops images that aren't referenced)
+        self.tree.after(THUMBNAIL_POLL_INTERVAL, self.poll)
+
+    def add(self, item, rec):
+        if not rec["urls"]:
+            return
+        self.cache.request(thumbnail_key(rec), thumbnail_source(rec), lambda path: self.ready.put((item, path)))
+
+    def forget(self, item):
+        self.images.pop(item, None)
+
+    def poll(self):
+        if not self.tree.winfo_exists():
+            return
+        while True:
+            try:
+                item, path = self.ready.get_nowait()
+            except queue.Empty:
+                break
+            if not self.tree.exists(item):
+                continue
+            try:
+                image = tk.PhotoImage(file=path)
+            except tk.TclError:
+                continue
+            self.images[item] = image
+            self.tree.item(item, image=image)
+        self.tree.after(THUMBNAIL_POLL_INTERVAL, self.poll)
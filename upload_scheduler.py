@@ -0,0 +1,330 @@
+#paces webhook requests to Discord's rate limits, packs files into batches and keeps a persisted queue of uploads to retry
+import os
+import json
+import time
+import threading
+import asyncio
+from contextlib import contextmanager
+
+# --- Configuration ---
+DEFAULT_BUCKET_LIMIT = 5          # Discord webhooks allow ~5 requests per bucket window
+DEFAULT_BUCKET_WINDOW = 2.0       # Seconds for a full bucket to refill
+RETRY_QUEUE_FILE = "retry_queue.json"
+MAX_ATTACHMENTS = 10              # Discord accepts up to 10 attachments per message
+MULTIPART_OVERHEAD = 512          # Bytes of multipart headers budgeted per attachment
+DEFAULT_LATENCY = 1.0             # Assumed seconds per request until a webhook has been measured
+LATENCY_SMOOTHING = 0.3           # Weight of the newest sample in the latency moving average
+SIZE_LIMITS_FILE = "webhook_limits.json"  # Learned upload limits per webhook, next to saved_webhooks.json
+SIZE_TIERS = [8 * 1024 * 1024, 50 * 1024 * 1024, 100 * 1024 * 1024]  # Discord's upload limits by server boost level
+
+# When Discord reports a global rate limit every webhook has to wait
+GLOBAL_BLOCKED_UNTIL = 0.0
+GLOBAL_LOCK = threading.Lock()
+
+# --- Rate limiting ---
+class WebhookRateLimiter:
+    """
+    Token bucket for a single webhook.
+    Tokens refill at limit / window per second; Discord's X-RateLimit headers and 429
+    responses correct the local estimate so we pace ahead of the server instead of after it.
+    """
+    def __init__(self, limit=DEFAULT_BUCKET_LIMIT, window=DEFAULT_BUCKET_WINDOW):
+        self.limit = limit
+        self.window = window
+        self.tokens = float(limit)
+        self.last_refill = time.monotonic()
+        self.blocked_until = 0.0
+        self.latency = DEFAULT_LATENCY
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.last_refill
+        self.tokens = min(self.limit, self.tokens + elapsed * self.limit / self.window)
+        self.last_refill = now
+
+    def try_acquire(self):
+        """Take a token if one is free. Returns 0 on success, else the seconds to wait before trying again."""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(self.blocked_until, GLOBAL_BLOCKED_UNTIL) - now
+            if wait <= 0:
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return 0
+                wait = (1 - self.tokens) * self.window / self.limit
+            return wait
+
+    def acquire(self, stop_event=None):
+        """Block until a request may be sent. Returns False if stop_event was set while waiting."""
+        while True:
+            if stop_event is not None and stop_event.is_set():
+                return False
+            wait = self.try_acquire()
+            if not wait:
+                return True
+            # Sleep in short slices so a stop request is noticed quickly
+            time.sleep(min(wait, 0.5))
+
+    async def acquire_async(self, stop_event=None):
+        """asyncio version of acquire for the async upload engine."""
+        while True:
+            if stop_event is not None and stop_event.is_set():
+                return False
+            wait = self.try_acquire()
+            if not wait:
+                return True
+            await asyncio.sleep(min(wait, 0.5))
+
+    def estimated_wait(self):
+        """Seconds until this webhook could send its next request."""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(self.blocked_until, GLOBAL_BLOCKED_UNTIL) - now
+            if self.tokens < 1:
+                wait = max(wait, (1 - self.tokens) * self.window / self.limit)
+            return max(0.0, wait)
+
+    def record_latency(self, seconds):
+        """Fold a measured request time into the moving average."""
+        with self.lock:
+            self.latency += LATENCY_SMOOTHING * (seconds - self.latency)
+
+    def update(self, status_code, headers, body=None):
+        """Feed a response back into the bucket. Returns the seconds to wait before retrying a 429, else 0."""
+        global GLOBAL_BLOCKED_UNTIL
+        now = time.monotonic()
+        retry_after = 0.0
+        with self.lock:
+            limit = headers.get("X-RateLimit-Limit")
+            remaining = headers.get("X-RateLimit-Remaining")
+            reset_after = headers.get("X-RateLimit-Reset-After")
+            try:
+                if limit is not None and int(limit) > 0:
+                    self.limit = int(limit)
+                if reset_after is not None and float(reset_after) > 0:
+                    self.window = max(self.window, float(reset_after))
+                if remaining is not None:
+                    self._refill(now)
+                    self.tokens = min(self.tokens, float(remaining))
+                    if int(remaining) == 0 and reset_after is not None:
+                        self.blocked_until = max(self.blocked_until, now + float(reset_after))
+            except ValueError:
+                print(f"[ERROR] Could not parse rate limit headers: {limit}, {remaining}, {reset_after}")
+            if status_code == 429:
+                retry_after = parse_retry_after(headers, body)
+                self.tokens = 0.0
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+        if status_code == 429 and (headers.get("X-RateLimit-Global") or (body or {}).get("global")):
+            with GLOBAL_LOCK:
+                GLOBAL_BLOCKED_UNTIL = max(GLOBAL_BLOCKED_UNTIL, now + retry_after)
+        if retry_after:
+            print(f"[DEBUG] Rate limited; waiting {retry_after:.2f}s before retrying.")
+        return retry_after
+
+def parse_retry_after(headers, body=None):
+    """Seconds to wait from a 429 response (Retry-After header, or retry_after in the JSON body)."""
+    for value in (headers.get("Retry-After"), (body or {}).get("retry_after")):
+        try:
+            if value is not None:
+                return max(0.0, float(value))
+        except (TypeError, ValueError):
+            continue
+    return DEFAULT_BUCKET_WINDOW
+
+LIMITERS = {}
+LIMITERS_LOCK = threading.Lock()
+
+def get_limiter(webhook_url):
+    """Return the shared rate limiter for a webhook URL (query string ignored)."""
+    key = webhook_url.split("?")[0]
+    with LIMITERS_LOCK:
+        if key not in LIMITERS:
+            LIMITERS[key] = WebhookRateLimiter()
+        return LIMITERS[key]
+
+# --- Sharding ---
+def webhook_id(webhook_url):
+    """The numeric id from a .../webhooks/<id>/<token> URL (safe to store, unlike the token)."""
+    parts = webhook_url.split("?")[0].rstrip("/").split("/")
+    if "webhooks" in parts and parts.index("webhooks") + 1 < len(parts):
+        return parts[parts.index("webhooks") + 1]
+    return parts[-1]
+
+class WebhookShards:
+    """
+    Several webhooks serving one upload job. Each task is sent to whichever webhook
+    can serve it soonest, judged by its remaining rate budget, measured latency and
+    the tasks already assigned to it.
+    """
+    def __init__(self, webhook_urls):
+        self.webhook_urls = list(webhook_urls)
+        self.active = {url: 0 for url in self.webhook_urls}
+        self.lock = threading.Lock()
+
+    def score(self, url):
+        limiter = get_limiter(url)
+        return limiter.estimated_wait() + (self.active[url] + 1) * limiter.latency
+
+    def acquire(self):
+        with self.lock:
+            url = min(self.webhook_urls, key=self.score)
+            self.active[url] += 1
+        return url
+
+    def release(self, url):
+        with self.lock:
+            self.active[url] -= 1
+
+@contextmanager
+def use_webhook(target):
+    """Resolve a webhook URL or WebhookShards to the URL a task should use for its whole run."""
+    if not isinstance(target, WebhookShards):
+        yield target
+        return
+    url = target.acquire()
+    print(f"[DEBUG] Shard webhook {webhook_id(url)} selected.")
+    try:
+        yield url
+    finally:
+        target.release(url)
+
+# --- Size limits ---
+class WebhookSizeLimits:
+    """
+    Upload size limit of each webhook, learned from Discord's answers and persisted to
+    SIZE_LIMITS_FILE by webhook id: { id: { "accepted": largest upload that went through,
+    "rejected": smallest upload answered with 413 } }.
+    Limits come in SIZE_TIERS steps, so one upload above a tier settles it either way.
+    Newer answers win: a 413 below an accepted size means the server lost its boost.
+    """
+    def __init__(self, path=SIZE_LIMITS_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                try:
+                    self.entries = json.load(f)
+                except json.JSONDecodeError:
+                    self.entries = {}
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def tiers(self, webhook_url, default):
+        """Limits still possible for a webhook: default, then the larger tiers below its smallest 413."""
+        with self.lock:
+            rejected = self.entries.get(webhook_id(webhook_url), {}).get("rejected")
+        return [default] + [t for t in SIZE_TIERS if t > default and (rejected is None or t < rejected)]
+
+    def limit(self, webhook_url, default):
+        """Largest upload (bytes) the webhook takes: the smallest possible tier that covers what it accepted."""
+        with self.lock:
+            accepted = self.entries.get(webhook_id(webhook_url), {}).get("accepted", 0)
+        tiers = self.tiers(webhook_url, default)
+        return next((t for t in tiers if t >= accepted), tiers[-1])
+
+    def next_tier(self, webhook_url, default):
+        """The tier above the current limit that hasn't been ruled out, or None once the limit is settled."""
+        limit = self.limit(webhook_url, default)
+        return next((t for t in self.tiers(webhook_url, default) if t > limit), None)
+
+    def record(self, webhook_url, size, accepted):
+        """Learn from an upload of size bytes that Discord accepted (or rejected with 413)."""
+        key = webhook_id(webhook_url)
+        with self.lock:
+            entry = self.entries.setdefault(key, {})
+            if accepted:
+                if size <= entry.get("accepted", 0):
+                    return
+                entry["accepted"] = size
+                if entry.get("rejected") is not None and entry["rejected"] <= size:
+                    del entry["rejected"]
+            else:
+                if entry.get("rejected") is not None and entry["rejected"] <= size:
+                    return
+                entry["rejected"] = size
+                if entry.get("accepted", 0) >= size:
+                    entry["accepted"] = 0
+            self.save()
+        print(f"[DEBUG] Webhook {key} {'accepted' if accepted else 'rejected (413)'} {size} bytes.")
+
+# --- Retry queue ---
+class RetryQueue:
+    """
+    Uploads that were rejected, persisted to RETRY_QUEUE_FILE so they survive restarts.
+    Each entry is { "file": path, "webhook": url, "temporary": bool, "attempts": n, "origin": dict or None },
+    where origin identifies the original video a segment belongs to.
+    """
+    def __init__(self, path=RETRY_QUEUE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = []
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                try:
+                    self.entries = json.load(f)
+                except json.JSONDecodeError:
+                    self.entries = []
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def add(self, file_path, webhook_url, temporary=False, origin=None):
+        with self.lock:
+            for entry in self.entries:
+                if entry["file"] == file_path and entry["webhook"] == webhook_url:
+                    entry["attempts"] += 1
+                    break
+            else:
+                self.entries.append({"file": file_path, "webhook": webhook_url,
+                                     "temporary": temporary, "attempts": 1, "origin": origin})
+            self.save()
+        print(f"[DEBUG] Queued {file_path} for retry ({len(self.entries)} pending).")
+
+    def pending(self):
+        """Snapshot of the queued entries."""
+        with self.lock:
+            return [dict(entry) for entry in self.entries]
+
+    def remove(self, file_path, webhook_url):
+        with self.lock:
+            self.entries = [e for e in self.entries
+                            if not (e["file"] == file_path and e["webhook"] == webhook_url)]
+            self.save()
+
+    def __len__(self):
+        return len(self.entries)
+
+# --- Batching ---
+def plan_batches(items, max_size, max_files=MAX_ATTACHMENTS):
+    """
+    Pack (path, size) items into as few webhook requests as possible (first-fit decreasing).
+    Each batch holds at most max_files attachments and stays under max_size including
+    multipart overhead. Items too big to share a request get a batch of their own.
+    """
+    bins = []  # [total_bytes, [paths]]
+    for path, size in sorted(items, key=lambda item: item[1], reverse=True):
+        cost = size + MULTIPART_OVERHEAD
+        for b in bins:
+            if len(b[1]) < max_files and b[0] + cost <= max_size:
+                b[0] += cost
+                b[1].append(path)
+                break
+        else:
+            bins.append([cost, [path]])
+    return [paths for _, paths in bins]
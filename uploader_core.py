@@ -0,0 +1,1170 @@
+#upload engine behind discord_video_uploader.py and the command line: splitting, batching, rate-limited webhook uploads and upload records (no GUI imports)
+import os
+import math
+import hashlib
+import threading
+import requests
+import time
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import json  # For saving/loading webhooks and upload records
+import queue
+import asyncio
+import functools
+from collections import deque
+from contextlib import ExitStack
+from media_probe import probe, probe_duration, video_stream
+from ffmpeg_runner import FfmpegProcess, run_ffmpeg, THREAD_BUDGET, FFMPEG_THREADS
+from split_planner import plan_segments, plan_split, split_args, CUT_EPSILON
+from fit_encoder import fit_plan, worth_reencoding, encode_segment, frame_rate, ENCODE_WORKERS
+from records_store import RecordsStore
+from hash_index import HashIndex
+from job_journal import JobJournal
+from download_manager import DownloadManager
+from folder_watcher import FolderWatcher
+from media_scanner import scan_media
+from upload_scheduler import (get_limiter, RetryQueue, plan_batches, WebhookShards, use_webhook, webhook_id,
+                              WebhookSizeLimits)
+
+# Optional async HTTP client; without it uploads use the thread pool and requests
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# --- Global cancellation, cleanup and upload tracking ---
+STOP_EVENT = threading.Event()      # When set, processing functions will abort
+GENERATED_FILES = []                # Temporary files (e.g. video segments)
+
+# Upload records live in RECORDS_STORE (sqlite) and are read from it a page or a file at a time:
+# each is { "file": local_file_path, "urls": [discord_url, ...], "webhook": webhook_id } under its folder
+RECORDS_STORE = RecordsStore()
+
+# Content digests: HASH_INDEX caches them by (path, size, mtime); FILE_DIGESTS holds this run's lookups
+HASH_INDEX = HashIndex(RECORDS_STORE)
+FILE_DIGESTS = {}
+
+# Segments of a split video, recorded against the original: { seg_path: { "file", "digest", "part", "parts" } }
+SEGMENT_ORIGINS = {}
+
+# Journal of upload jobs; ACTIVE_JOB is the job the current run reports progress to
+JOB_JOURNAL = JobJournal()
+ACTIVE_JOB = None
+ACTIVE_PIPELINE = None   # UploadPipeline of the running upload, for status reporting
+ENCODES_RUNNING = 0      # Re-encodes in progress, which split the ffmpeg thread budget between them
+ENCODE_COUNT_LOCK = threading.Lock()
+
+# Uploads rejected by Discord (429s that kept failing, network errors) waiting to be retried
+RETRY_QUEUE = RetryQueue()
+DRAIN_LOCK = threading.Lock()       # Held by the drain in progress, so the startup and end-of-run drains never overlap
+SIZE_LIMITS = WebhookSizeLimits()   # Upload limit learned for each webhook (boosted servers take more)
+DOWNLOAD_MANAGER = DownloadManager()  # Shared by file manager windows and the CLI
+
+# --- Configuration ---
+MAX_SIZE = 8 * 1024 * 1024           # 8 MB in bytes: the limit of a webhook until a larger one is learned (SIZE_LIMITS)
+IMAGE_EXTS = ['.png', '.jpg', '.jpeg', '.gif']
+VIDEO_EXTS = ['.mp4', '.mov', '.avi', '.mkv']
+WEBHOOKS_FILE = "saved_webhooks.json"  # File to store saved webhooks
+SEGMENTS_DIR = "split_segments"        # Segments are written here (a folder per video), never next to the source video
+STREAMING_SPLIT = True                 # Upload each segment as soon as ffmpeg finishes writing it
+SEGMENT_POLL_INTERVAL = 0.2            # Seconds between checks of ffmpeg's segment list
+STREAMING_QUEUE_SIZE = 2               # Segments of a streaming split waiting for upload before ffmpeg is paused
+MAX_RATE_LIMIT_RETRIES = 5             # 429 retries per request before it goes to the retry queue
+MAX_RETRY_ATTEMPTS = 5                 # Failed uploads of a queued file before it is dropped from the retry queue
+SKIP_UPLOADED = True                   # Skip files whose content already has live URLs in the records
+SPLIT_WORKERS = multiprocessing.cpu_count()  # Pipeline split stage: one ffmpeg per core
+UPLOAD_WORKERS = 16                    # Pipeline upload stage without httpx: concurrent requests
+PIPELINE_QUEUE_SIZE = 8                # Items waiting between the stages before splitting pauses
+ASYNC_MAX_IN_FLIGHT = 200              # Concurrent requests for the asyncio engine (network bound, not CPU bound)
+ASYNC_TIMEOUT = 300                    # Seconds before an async request is abandoned
+PARALLEL_SPLIT = True                  # Split very large videos as parallel -ss/-to range jobs
+PARALLEL_SPLIT_MIN_SIZE = 1024 * 1024 * 1024  # Videos from this size up are split in parallel (smaller ones stream from one ffmpeg)
+SPLIT_IO_BUDGET = 4                    # Range jobs reading the disk at once (NVMe copes with more, a spinning disk with 1-2)
+RANGE_SPLIT_JOBS = max(1, min(multiprocessing.cpu_count(), SPLIT_IO_BUDGET))
+RANGE_SPLIT_SLOTS = threading.BoundedSemaphore(RANGE_SPLIT_JOBS)  # Shared by every video, so the budget holds across the pipeline
+REENCODE_MODE = "never"                # "auto" re-encodes videos when that saves enough uploads, "always" whenever they need splitting
+ENCODE_SLOTS = threading.BoundedSemaphore(ENCODE_WORKERS)  # Encodes across all videos, sharing THREAD_BUDGET
+COPY_SPLIT_RATE = 200 * 1024 * 1024    # Bytes/s a stream-copy split gets through (estimate for scheduling)
+ENCODE_PIXEL_RATE = 20 * 1000 * 1000   # Pixels/s one encoder thread gets through per pass (estimate for scheduling)
+PROBE_SIZE_LIMITS = True               # Send a video unsplit when it could fit the webhook's next size tier (split after a 413)
+PROBE_LOCK = threading.Lock()
+
+# --- Helper Functions ---
+def save_uploaded_records():
+    """Commit any record inserts still pending in RECORDS_STORE."""
+    RECORDS_STORE.flush()
+
+def with_wait(webhook_url):
+    """Ensure wait=true so that Discord returns a JSON response."""
+    if "wait=true" in webhook_url:
+        return webhook_url
+    return webhook_url + ("&wait=true" if "?" in webhook_url else "?wait=true")
+
+def build_request(json_payload, file_paths, stack):
+    """Keyword arguments for a webhook POST; file handles are opened on the given ExitStack."""
+    if not file_paths:
+        return {"json": json_payload}
+    files = {f"files[{i}]": (os.path.basename(path), stack.enter_context(open(path, "rb")))
+             for i, path in enumerate(file_paths)}
+    # payload_json carries the message text and ties each attachment to its files[n] part
+    payload = dict(json_payload or {})
+    payload["attachments"] = [{"id": i, "filename": os.path.basename(path)}
+                              for i, path in enumerate(file_paths)]
+    return {"data": {"payload_json": json.dumps(payload)}, "files": files}
+
+def note_rate_limit(limiter, response):
+    """Feed a response to the limiter. Returns True if it was a 429 that should be retried."""
+    body = None
+    if response.status_code == 429:
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+    limiter.update(response.status_code, response.headers, body)
+    return response.status_code == 429
+
+def post_webhook(webhook_url, json_payload=None, file_paths=()):
+    """
+    POST to a webhook through its rate limiter.
+    429 responses are retried after Retry-After instead of being dropped.
+    Returns the final response, or None if stopped or the request raised.
+    """
+    limiter = get_limiter(webhook_url)
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        if not limiter.acquire(STOP_EVENT):
+            return None
+        try:
+            started = time.monotonic()
+            with ExitStack() as stack:
+                response = requests.post(webhook_url, **build_request(json_payload, file_paths, stack))
+            limiter.record_latency(time.monotonic() - started)
+        except Exception as e:
+            print(f"[ERROR] Exception posting to webhook: {e}")
+            return None
+        if not note_rate_limit(limiter, response):
+            return response
+        print(f"[DEBUG] 429 from webhook (attempt {attempt + 1} of {MAX_RATE_LIMIT_RETRIES + 1}).")
+    return response
+
+def send_text_message(webhook_url, message_text):
+    """Send a plain text message to the Discord webhook."""
+    print(f"[DEBUG] Sending message: {message_text}")
+    if isinstance(webhook_url, WebhookShards):
+        webhook_url = webhook_url.webhook_urls[0]
+    response = post_webhook(webhook_url, json_payload={"content": message_text})
+    if response is not None and response.status_code in (200, 204):
+        print("[DEBUG] Message sent successfully!")
+    elif response is not None:
+        print(f"[ERROR] Failed to send message. Status: {response.status_code}")
+
+def file_digest(file_path):
+    """Content digest of a file (cached per run and by (path, size, mtime) on disk), or None if unreadable."""
+    digest = FILE_DIGESTS.get(file_path)
+    if digest is None:
+        try:
+            digest = HASH_INDEX.digest(file_path)
+        except OSError as e:
+            print(f"[ERROR] Could not hash {file_path}: {e}")
+            return None
+        FILE_DIGESTS[file_path] = digest
+    return digest
+
+def skip_uploaded(files):
+    """
+    Drop files whose content already has live URLs in the records.
+    Unchanged files cost one stat and one cache lookup; new or modified ones are hashed in a worker pool.
+    Returns (files_to_upload, skipped_count).
+    """
+    FILE_DIGESTS.update(HASH_INDEX.digest_many(files))
+    remaining = []
+    for f in files:
+        digest = FILE_DIGESTS.get(f)
+        if digest and (RECORDS_STORE.has_live_urls(digest) or
+                       (RECORDS_STORE.adopt_legacy_records(f, digest) and RECORDS_STORE.has_live_urls(digest))):
+            print(f"[DEBUG] Already uploaded, skipping: {f}")
+            if ACTIVE_JOB is not None:
+                ACTIVE_JOB.set_file_state(f, "done")
+            continue
+        remaining.append(f)
+    skipped = len(files) - len(remaining)
+    print(f"[DEBUG] {skipped} of {len(files)} files already uploaded.")
+    return remaining, skipped
+
+def record_upload(file_path, urls, webhook_url):
+    """Add an uploaded file, its Discord URLs and the id of the webhook that served it to RECORDS_STORE.
+    A segment is recorded as one part of its original video, so the video ends up as a single multi-URL record."""
+    webhook = webhook_id(webhook_url)
+    origin = SEGMENT_ORIGINS.pop(file_path, None)
+    if origin is None:
+        folder = os.path.dirname(file_path)
+        RECORDS_STORE.add(folder, file_path, urls, webhook, digest=file_digest(file_path))
+        if ACTIVE_JOB is not None:
+            ACTIVE_JOB.set_file_state(file_path, "done")
+        return
+    folder = os.path.dirname(origin["file"])
+    RECORDS_STORE.add(folder, origin["file"], urls, webhook,
+                      digest=origin["digest"], part=origin["part"], parts=origin["parts"])
+    if ACTIVE_JOB is not None:
+        ACTIVE_JOB.segment_done(origin["file"], origin["part"], urls[0] if urls else None)
+
+def upload_batch(file_paths, webhook_url, content=None, queue_on_failure=True):
+    """
+    Upload up to MAX_ATTACHMENTS files in a single webhook message, optionally with text content.
+    Each returned attachment is recorded in RECORDS_STORE against its own file.
+    Returns True once Discord has acknowledged the upload; rejected files go to RETRY_QUEUE.
+    webhook_url may be a WebhookShards, in which case the least loaded webhook is used.
+    """
+    if STOP_EVENT.is_set():
+        print(f"[DEBUG] Upload cancelled for files: {file_paths}")
+        return False
+    with use_webhook(webhook_url) as webhook_url:
+        return _upload_batch(file_paths, webhook_url, content, queue_on_failure)
+
+def _upload_batch(file_paths, webhook_url, content, queue_on_failure):
+    print(f"[DEBUG] Uploading {len(file_paths)} file(s): {file_paths}")
+    json_payload = {"content": content} if content else None
+    response = post_webhook(with_wait(webhook_url), json_payload=json_payload, file_paths=file_paths)
+    return handle_batch_response(file_paths, webhook_url, response, queue_on_failure)
+
+def handle_batch_response(file_paths, webhook_url, response, queue_on_failure):
+    """Record the attachments of a successful batch, or hand its files to RETRY_QUEUE."""
+    if response is not None and response.status_code in (200, 204, 413):
+        # Every answer tells us something about the webhook's size limit
+        SIZE_LIMITS.record(webhook_url, batch_size(file_paths), response.status_code != 413)
+    if response is not None and response.status_code in (200, 204):
+        try:
+            attachments = response.json().get("attachments", [])
+        except Exception as e:
+            print(f"[ERROR] Could not decode JSON response for {file_paths}: {e}")
+            attachments = []
+        if len(attachments) != len(file_paths):
+            print(f"[ERROR] Expected {len(file_paths)} attachments, Discord returned {len(attachments)}.")
+        # Discord returns attachments in the order of the files[n] parts
+        for i, file_path in enumerate(file_paths):
+            url = attachments[i].get("url") if i < len(attachments) else None
+            urls = [url] if url else []
+            print(f"[DEBUG] Uploaded URLs for {file_path}: {urls}")
+            record_upload(file_path, urls, webhook_url)
+        print(f"[DEBUG] Uploaded {len(file_paths)} file(s) successfully!")
+        return True
+    if response is not None:
+        print(f"[ERROR] Failed to upload {file_paths}. Status: {response.status_code}")
+    if STOP_EVENT.is_set() or not queue_on_failure:
+        return False
+    for file_path in file_paths:
+        # Temporary segments now belong to the retry queue, so cleanup must not delete them
+        origin = SEGMENT_ORIGINS.pop(file_path, None)
+        temporary = file_path in GENERATED_FILES or origin is not None
+        if file_path in GENERATED_FILES:
+            GENERATED_FILES.remove(file_path)
+        RETRY_QUEUE.add(file_path, webhook_url, temporary=temporary, origin=origin)
+        if ACTIVE_JOB is not None:
+            if origin is not None:
+                ACTIVE_JOB.set_segment_state(origin["file"], origin["part"], "queued")
+            else:
+                ACTIVE_JOB.set_file_state(file_path, "queued")
+    return False
+
+def batch_size(file_paths):
+    """Total bytes of the files in a request (files that vanished count as 0)."""
+    total = 0
+    for path in file_paths:
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            pass
+    return total
+
+def size_limit(webhook_url):
+    """Upload limit (bytes) of a webhook URL, or the smallest of a WebhookShards' webhooks (any of them may get a batch)."""
+    urls = webhook_url.webhook_urls if isinstance(webhook_url, WebhookShards) else [webhook_url]
+    return min(SIZE_LIMITS.limit(url, MAX_SIZE) for url in urls)
+
+def probe_with_video(file_path, webhook_url):
+    """
+    Learn a webhook's size tier from a real upload: a video over the webhook's current limit, but
+    within the next tier that hasn't been ruled out, is sent unsplit. handle_batch_response records
+    the answer in SIZE_LIMITS either way. Returns True if it went through; otherwise (a 413, or any
+    other failure) the caller splits it as usual. Probes run one at a time, so several videos in
+    range don't all find out the same 413.
+    """
+    if not PROBE_SIZE_LIMITS:
+        return False
+    with PROBE_LOCK:
+        size = os.path.getsize(file_path)
+        tier = SIZE_LIMITS.next_tier(webhook_url, MAX_SIZE)
+        if tier is None or not SIZE_LIMITS.limit(webhook_url, MAX_SIZE) < size <= tier:
+            return False
+        print(f"[DEBUG] Sending {file_path} unsplit to learn whether webhook {webhook_id(webhook_url)} "
+              f"takes {tier // (1024 * 1024)} MB uploads.")
+        return upload_file(file_path, webhook_url, queue_on_failure=False)
+
+def upload_file(file_path, webhook_url, queue_on_failure=True):
+    """Upload a single file to Discord via webhook. Returns True once Discord has acknowledged it."""
+    return upload_batch([file_path], webhook_url, queue_on_failure=queue_on_failure)
+
+def plan_upload_batches(files, max_size=None):
+    """
+    Split the file list into multi-attachment batches and files that need process_file.
+    Images and videos that fit in max_size (the destination's limit, MAX_SIZE by default) are
+    packed per folder so every batch maps to one records folder; larger videos still
+    go through splitting.
+    """
+    max_size = max_size or MAX_SIZE
+    by_folder = {}
+    singles = []
+    for f in files:
+        ext = os.path.splitext(f)[1].lower()
+        try:
+            size = os.path.getsize(f)
+        except OSError as e:
+            print(f"[ERROR] Could not stat {f}: {e}")
+            continue
+        if ext in IMAGE_EXTS or (ext in VIDEO_EXTS and size <= max_size):
+            by_folder.setdefault(os.path.dirname(f), []).append((f, size))
+        else:
+            singles.append(f)
+    batches = []
+    for items in by_folder.values():
+        batches.extend(plan_batches(items, max_size))
+    print(f"[DEBUG] Packed {sum(len(b) for b in batches)} files into {len(batches)} requests; "
+          f"{len(singles)} files need splitting.")
+    return batches, singles
+
+def drain_retry_queue():
+    """
+    Retry every queued upload once. Entries that fail again stay queued for the next drain
+    until they reach MAX_RETRY_ATTEMPTS. Returns at once if another drain is already running.
+    """
+    if not DRAIN_LOCK.acquire(blocking=False):
+        print("[DEBUG] Retry queue is already being drained; skipping.")
+        return
+    try:
+        _drain_retry_queue()
+    finally:
+        DRAIN_LOCK.release()
+
+def _drain_retry_queue():
+    entries = RETRY_QUEUE.pending()
+    if not entries:
+        return
+    print(f"[DEBUG] Draining retry queue: {len(entries)} pending uploads.")
+    for entry in entries:
+        if STOP_EVENT.is_set():
+            break
+        if not os.path.exists(entry["file"]):
+            print(f"[ERROR] Queued file no longer exists, dropping: {entry['file']}")
+            RETRY_QUEUE.remove(entry["file"], entry["webhook"])
+            continue
+        if entry.get("origin"):
+            SEGMENT_ORIGINS[entry["file"]] = entry["origin"]
+        if upload_file(entry["file"], entry["webhook"], queue_on_failure=False):
+            RETRY_QUEUE.remove(entry["file"], entry["webhook"])
+            if entry.get("temporary"):
+                delete_generated_file(entry["file"])
+        elif STOP_EVENT.is_set():
+            SEGMENT_ORIGINS.pop(entry["file"], None)
+        elif entry.get("attempts", 0) + 1 >= MAX_RETRY_ATTEMPTS:
+            print(f"[ERROR] Giving up on {entry['file']} after {MAX_RETRY_ATTEMPTS} failed uploads.")
+            RETRY_QUEUE.remove(entry["file"], entry["webhook"])
+            SEGMENT_ORIGINS.pop(entry["file"], None)
+            if entry.get("temporary"):
+                delete_generated_file(entry["file"])
+        else:
+            RETRY_QUEUE.add(entry["file"], entry["webhook"], temporary=entry.get("temporary", False),
+                            origin=SEGMENT_ORIGINS.pop(entry["file"], None))
+    print(f"[DEBUG] Retry queue drained; {len(RETRY_QUEUE)} uploads still pending.")
+
+def split_video(input_file, output_pattern, max_size=None):
+    """
+    Splits the video into segments of up to max_size using ffmpeg.
+    Each segment resets timestamps to avoid audio/video glitches.
+    """
+    cuts = plan_split(input_file, max_size or MAX_SIZE)
+    if cuts is None:
+        return []
+    input_args, output_args = split_args(cuts)
+    with THREAD_BUDGET.share(1) as threads:
+        args = [
+            *input_args, "-i", input_file, "-c", "copy", "-map", "0", "-threads", str(threads),
+            *output_args, "-reset_timestamps", "1",
+            "-f", "segment", output_pattern
+        ]
+        run_ffmpeg(args, duration=probe_duration(input_file), label=os.path.basename(input_file), file=input_file)
+    base_dir = os.path.dirname(output_pattern)
+    base_name = os.path.splitext(os.path.basename(input_file))[0]
+    ext = os.path.splitext(input_file)[1]
+    segments = []
+    for filename in os.listdir(base_dir):
+        if filename.startswith(base_name) and filename.endswith(ext):
+            seg_path = os.path.join(base_dir, filename)
+            segments.append(seg_path)
+            GENERATED_FILES.append(seg_path)
+    segments.sort()
+    print(f"[DEBUG] Segments found: {segments}")
+    register_segments(input_file, segments)
+    return segments
+
+def segment_pattern(file_path):
+    """
+    ffmpeg output pattern for the segments of file_path, in a folder of its own under SEGMENTS_DIR.
+    Segments never land next to the source, so a watched folder doesn't see them as new media.
+    """
+    key = hashlib.sha1(os.path.abspath(file_path).encode("utf-8", "surrogateescape")).hexdigest()[:12]
+    work_dir = os.path.join(os.path.abspath(SEGMENTS_DIR), key)
+    os.makedirs(work_dir, exist_ok=True)
+    base_name, ext = os.path.splitext(os.path.basename(file_path))
+    return os.path.join(work_dir, f"{base_name}_%03d{ext}")
+
+def prune_segment_dirs():
+    """Remove the per-video folders under SEGMENTS_DIR that no longer hold segments (some may be queued for retry)."""
+    if not os.path.isdir(SEGMENTS_DIR):
+        return
+    for name in os.listdir(SEGMENTS_DIR):
+        try:
+            os.rmdir(os.path.join(SEGMENTS_DIR, name))
+        except OSError:
+            pass  # Not empty
+
+def register_segments(input_file, segments, parts=None):
+    """Remember which original video (and which part of it) each segment is, for record_upload."""
+    digest = file_digest(input_file)
+    parts = parts or len(segments)
+    for part, seg in enumerate(segments):
+        SEGMENT_ORIGINS[seg] = {"file": input_file, "digest": digest, "part": part, "parts": parts}
+
+def read_segment_list(list_file):
+    """Return the segment names ffmpeg has finished so far (only complete lines of the list file)."""
+    if not os.path.exists(list_file):
+        return []
+    with open(list_file, 'r') as f:
+        data = f.read()
+    # The last line may still be in the middle of being written
+    return [line.strip() for line in data.split("\n")[:-1] if line.strip()]
+
+def split_video_streaming(input_file, output_pattern, start_part=0, cuts=None, max_size=None):
+    """
+    Generator version of split_video: yields each segment path as soon as ffmpeg closes it.
+    ffmpeg appends a line to the -segment_list file after finishing each segment, so tailing
+    that file lets uploads start while the rest of the video is still being split. ffmpeg is
+    paused while the caller holds a segment, so a bounded upload queue limits the segments on disk.
+    A resumed job passes its journaled cuts and the first segment that is still missing.
+    """
+    if cuts is None:
+        cuts = plan_split(input_file, max_size or MAX_SIZE)
+        if cuts is None:
+            return
+    num_segments = len(cuts) + 1
+    if ACTIVE_JOB is not None and not start_part:
+        ACTIVE_JOB.set_plan(input_file, cuts, num_segments)
+    input_args, output_args = split_args(cuts, start_part)
+    base_dir = os.path.dirname(output_pattern)
+    list_file = output_pattern.replace("%03d", "segments") + ".list"
+    if os.path.exists(list_file):
+        os.remove(list_file)
+    GENERATED_FILES.append(list_file)
+    # One thread from the budget for as long as ffmpeg runs (stream copy needs no more)
+    with THREAD_BUDGET.share(1) as threads:
+        args = [
+            *input_args, "-i", input_file, "-c", "copy", "-map", "0", "-threads", str(threads),
+            *output_args, "-reset_timestamps", "1",
+            "-segment_list", list_file, "-segment_list_type", "flat",
+            "-f", "segment", output_pattern
+        ]
+        duration = probe_duration(input_file)
+        offset = cuts[start_part - 1] if start_part else 0.0
+        proc = FfmpegProcess(args, duration=duration - offset if duration else None, label=os.path.basename(input_file),
+                             file=input_file, weight=1 - offset / duration if duration else 1.0).start()
+        seen = 0
+        try:
+            while True:
+                finished = proc.poll() is not None
+                names = read_segment_list(list_file)
+                for part, name in enumerate(names[seen:], start=start_part + seen):
+                    seg_path = os.path.join(base_dir, name)
+                    SEGMENT_ORIGINS[seg_path] = {"file": input_file, "digest": file_digest(input_file),
+                                                 "part": part, "parts": num_segments}
+                    if ACTIVE_JOB is not None:
+                        if ACTIVE_JOB.segments(input_file).get(part, (None, None))[1] in ("done", "queued"):
+                            # Re-split on resume, but this part already reached Discord
+                            delete_generated_file(seg_path)
+                            continue
+                        # Journaled segments survive Stop so a resume can upload them without re-splitting
+                        ACTIVE_JOB.segment_ready(input_file, part, seg_path)
+                    else:
+                        GENERATED_FILES.append(seg_path)
+                    print(f"[DEBUG] Segment ready: {seg_path}")
+                    # ffmpeg waits while the consumer does, so a blocked upload queue holds the split back
+                    proc.pause()
+                    yield seg_path
+                    proc.resume()
+                seen = len(names)
+                if finished:
+                    if seen and start_part + seen != num_segments:
+                        # ffmpeg can produce one segment less than planned if the last cut is past the end
+                        actual = start_part + seen
+                        print(f"[DEBUG] ffmpeg produced {actual} segments (planned {num_segments}) for {input_file}")
+                        for origin in SEGMENT_ORIGINS.values():
+                            if origin["file"] == input_file:
+                                origin["parts"] = actual
+                        RECORDS_STORE.set_parts(input_file, file_digest(input_file), actual)
+                        if ACTIVE_JOB is not None:
+                            ACTIVE_JOB.set_plan(input_file, cuts, actual)
+                    break
+                if STOP_EVENT.is_set():
+                    print(f"[DEBUG] Stop requested; terminating ffmpeg for {input_file}")
+                    break
+                time.sleep(SEGMENT_POLL_INTERVAL)
+        finally:
+            proc.terminate()
+            delete_generated_file(list_file)
+
+def range_args(cuts, part):
+    """ffmpeg input arguments that select segment part of the cut plan: seek just past the keyframe
+    it starts on (stream copy lands on that keyframe) and stop at the next cut."""
+    args = []
+    if part:
+        args += ["-ss", f"{cuts[part - 1] + CUT_EPSILON:.3f}"]
+    if part < len(cuts):
+        args += ["-to", f"{cuts[part]:.3f}"]
+    return args
+
+def range_duration(input_file, cuts, part):
+    """(seconds, share of the video) covered by segment part, for progress reporting; (None, 1.0) if unknown."""
+    duration = probe_duration(input_file)
+    if not duration:
+        return None, 1.0
+    start = cuts[part - 1] if part else 0.0
+    end = cuts[part] if part < len(cuts) else duration
+    return end - start, (end - start) / duration
+
+def split_range(input_file, seg_path, cuts, part):
+    """Write one segment with its own stream-copy ffmpeg. Returns True if it finished cleanly."""
+    with RANGE_SPLIT_SLOTS:
+        if STOP_EVENT.is_set():
+            return False
+        duration, weight = range_duration(input_file, cuts, part)
+        with THREAD_BUDGET.share(1) as threads:
+            args = ["-y", *range_args(cuts, part), "-i", input_file, "-c", "copy", "-map", "0",
+                    "-threads", str(threads), "-avoid_negative_ts", "make_zero", seg_path]
+            return run_ffmpeg(args, duration=duration, file=input_file, weight=weight, stop_event=STOP_EVENT) == 0 \
+                and not STOP_EVENT.is_set()
+
+def split_video_ranges(input_file, output_pattern, start_part=0, cuts=None, split_part=split_range, jobs=None):
+    """
+    Parallel version of split_video_streaming for very large videos. Every segment of the keyframe
+    plan gets its own stream-copy ffmpeg that seeks straight to its range, so up to RANGE_SPLIT_JOBS
+    ranges are read and written at once instead of one process reading the whole file in order.
+    Segments are yielded as their ffmpeg finishes (not necessarily in order). A new range only starts
+    when a finished one has been taken, so a slow upload stage still holds splitting back.
+    Parts a resumed job already has (uploaded, queued or split and on disk) are not split again.
+    split_part(input_file, seg_path, cuts, part) writes one segment (the re-encoder passes its own).
+    """
+    jobs = jobs or RANGE_SPLIT_JOBS
+    num_segments = len(cuts) + 1
+    if ACTIVE_JOB is not None and not start_part:
+        ACTIVE_JOB.set_plan(input_file, cuts, num_segments)
+    journaled = ACTIVE_JOB.segments(input_file) if ACTIVE_JOB is not None else {}
+    def produced(part):
+        path, state, _ = journaled.get(part, (None, None, None))
+        return state in ("done", "queued") or (state == "ready" and os.path.exists(path))
+    todo = deque(part for part in range(start_part, num_segments) if not produced(part))
+    print(f"[DEBUG] Splitting {len(todo)} ranges of {input_file} with up to {jobs} ffmpeg jobs")
+    running = {}
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        try:
+            while todo or running:
+                while todo and len(running) < jobs and not STOP_EVENT.is_set():
+                    part = todo.popleft()
+                    seg_path = output_pattern.replace("%03d", f"{part:03d}")
+                    running[executor.submit(split_part, input_file, seg_path, cuts, part)] = (part, seg_path)
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    part, seg_path = running.pop(future)
+                    if not future.result():
+                        if not STOP_EVENT.is_set():
+                            print(f"[ERROR] ffmpeg failed to write part {part} of {input_file}")
+                        delete_generated_file(seg_path)
+                        continue
+                    SEGMENT_ORIGINS[seg_path] = {"file": input_file, "digest": file_digest(input_file),
+                                                 "part": part, "parts": num_segments}
+                    if ACTIVE_JOB is not None:
+                        ACTIVE_JOB.segment_ready(input_file, part, seg_path)
+                    else:
+                        GENERATED_FILES.append(seg_path)
+                    print(f"[DEBUG] Segment ready: {seg_path}")
+                    yield seg_path
+        finally:
+            # Stopped or abandoned: let running jobs end and drop what they wrote
+            for future, (part, seg_path) in running.items():
+                future.result()
+                delete_generated_file(seg_path)
+
+def encode_threads(cuts, part):
+    """
+    Encoder threads to ask THREAD_BUDGET for: the budget split between the encodes running now, or
+    the ENCODE_WORKERS about to run while this video still has that many segments left. As the last
+    segments come round fewer encodes share it, so they get the threads the finished ones gave back.
+    """
+    with ENCODE_COUNT_LOCK:
+        running = ENCODES_RUNNING
+    return max(1, FFMPEG_THREADS // max(1, running, min(ENCODE_WORKERS, len(cuts) + 1 - part)))
+
+def encode_range(input_file, seg_path, cuts, part, plan):
+    """Re-encode one segment of a fit plan (see fit_encoder), checked to be under the plan's size limit."""
+    global ENCODES_RUNNING
+    with ENCODE_SLOTS:
+        if STOP_EVENT.is_set():
+            return False
+        start = cuts[part - 1] if part else 0.0
+        end = cuts[part] if part < len(cuts) else None
+        duration, weight = range_duration(input_file, cuts, part)
+        with ENCODE_COUNT_LOCK:
+            ENCODES_RUNNING += 1
+        try:
+            return encode_segment(input_file, seg_path, start, end, plan, plan["max_size"], STOP_EVENT,
+                                  threads=encode_threads(cuts, part), duration=duration, weight=weight)
+        finally:
+            with ENCODE_COUNT_LOCK:
+                ENCODES_RUNNING -= 1
+
+def reencode_plan(input_file, max_size=None):
+    """
+    The fit plan for a video if REENCODE_MODE says it should be re-encoded rather than copy-split, else None.
+    A video with a keyframe interval bigger than max_size is re-encoded whatever the mode, since a stream
+    copy of it can't fit; split_segments skips it if it can't be re-encoded either.
+    """
+    max_size = max_size or MAX_SIZE
+    cuts, oversize = plan_segments(input_file, max_size)
+    if REENCODE_MODE == "never" and not oversize:
+        return None
+    copy_parts = len(cuts) + 1 if cuts is not None else math.ceil(os.path.getsize(input_file) / max_size)
+    plan = fit_plan(input_file, max_size, copy_parts)
+    if plan is None or not (oversize or worth_reencoding(plan, REENCODE_MODE)):
+        return None
+    print(f"[DEBUG] Re-encoding {input_file} into {plan['parts']} segments at {plan['video_bitrate'] // 1000} kb/s "
+          f"instead of {copy_parts} stream-copied ones")
+    return plan
+
+def split_segments(input_file, output_pattern, start_part=0, cuts=None, max_size=None):
+    """
+    Segments of a video, each up to max_size (the destination's limit, MAX_SIZE by default):
+    re-encoded to fit when REENCODE_MODE picks that, from the parallel range splitter for videos
+    of PARALLEL_SPLIT_MIN_SIZE and up that have a keyframe plan, otherwise from one streaming
+    ffmpeg. A journaled plan (resume) is only continued by the method that made it.
+    """
+    max_size = max_size or MAX_SIZE
+    plan = reencode_plan(input_file, max_size)
+    if plan is not None and (cuts is None or cuts == plan["cuts"]):
+        # Re-encoded segments are always H.264/H.265 + AAC in MP4, whatever the source container
+        encoded_pattern = os.path.splitext(output_pattern)[0] + ".mp4"
+        return split_video_ranges(input_file, encoded_pattern, start_part, plan["cuts"],
+                                  split_part=functools.partial(encode_range, plan=plan), jobs=ENCODE_WORKERS)
+    planned, oversize = plan_segments(input_file, max_size)
+    if oversize and cuts is None:
+        print(f"[ERROR] Skipping {input_file}: it can't be stream-copied into segments of {max_size} bytes "
+              f"and can't be re-encoded to fit.")
+        return []
+    if PARALLEL_SPLIT and RANGE_SPLIT_JOBS > 1 and os.path.getsize(input_file) >= PARALLEL_SPLIT_MIN_SIZE:
+        if planned and (cuts is None or cuts == planned):
+            return split_video_ranges(input_file, output_pattern, start_part, planned)
+    return split_video_streaming(input_file, output_pattern, start_part, cuts, max_size)
+
+def resume_video_segments(file_path):
+    """
+    For a video in a resumed job: the journaled segments that are on disk but not yet uploaded,
+    the journaled cuts, and the first part that still has to be split.
+    Returns ([], None, 0) when there is nothing to resume and the video should be split from scratch.
+    """
+    plan = ACTIVE_JOB.plan(file_path) if ACTIVE_JOB is not None else None
+    if plan is None:
+        return [], None, 0
+    cuts, parts = plan
+    ready = []
+    produced = set()
+    for part, (path, state, url) in sorted(ACTIVE_JOB.segments(file_path).items()):
+        if state in ("done", "queued"):
+            produced.add(part)
+        elif state == "ready" and os.path.exists(path):
+            produced.add(part)
+            ready.append(path)
+            SEGMENT_ORIGINS[path] = {"file": file_path, "digest": file_digest(file_path), "part": part, "parts": parts}
+    start_part = 0
+    while start_part in produced:
+        start_part += 1
+    print(f"[DEBUG] Resuming {file_path}: {len(ready)} segments ready on disk, splitting from part {start_part} of {parts}")
+    return ready, cuts, start_part
+
+def split_cost(file_path):
+    """
+    Estimated seconds of ffmpeg work for a file that needs process_file, for longest-first
+    scheduling: reading it at COPY_SPLIT_RATE, plus, when videos may be re-encoded, two passes
+    over its pixels with the whole thread budget. Images and unsupported files cost nothing.
+    """
+    if os.path.splitext(file_path)[1].lower() not in VIDEO_EXTS:
+        return 0.0
+    try:
+        cost = os.path.getsize(file_path) / COPY_SPLIT_RATE
+    except OSError:
+        return 0.0
+    if REENCODE_MODE != "never":
+        info = probe(file_path)
+        video = video_stream(info)
+        fps = frame_rate(video) if video else None
+        if info and info.get("duration") and fps and video.get("width") and video.get("height"):
+            pixels = info["duration"] * fps * video["width"] * video["height"]
+            cost += 2 * pixels / (ENCODE_PIXEL_RATE * FFMPEG_THREADS)
+    return cost
+
+def longest_first(files, workers=SPLIT_WORKERS):
+    """
+    Files ordered by split_cost, most expensive first (LPT scheduling): a huge video started last
+    would keep one worker busy long after the rest are done, while small files fill in the gaps
+    at the end. Probing for the estimates runs in parallel and lands in the probe cache.
+    """
+    if len(files) < 2:
+        return list(files)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        costs = dict(zip(files, pool.map(split_cost, files)))
+    ordered = sorted(files, key=costs.get, reverse=True)
+    print(f"[DEBUG] Scheduled {len(ordered)} files longest first; estimated ffmpeg work "
+          f"{sum(costs.values()):.1f}s, largest {costs[ordered[0]]:.1f}s.")
+    return ordered
+
+def delete_generated_file(path):
+    """Delete a temporary file and drop it from GENERATED_FILES."""
+    SEGMENT_ORIGINS.pop(path, None)
+    if os.path.exists(path):
+        try:
+            os.remove(path)
+            print(f"[DEBUG] Deleted generated file: {path}")
+        except Exception as e:
+            print(f"[ERROR] Could not delete generated file {path}: {e}")
+            return
+    if path in GENERATED_FILES:
+        GENERATED_FILES.remove(path)
+
+def upload_segments_worker(upload_queue, webhook_url):
+    """Upload segments from the queue in order, deleting each one once Discord acknowledges it.
+    Segments that fail are handed to RETRY_QUEUE and kept on disk until they are retried."""
+    while True:
+        seg = upload_queue.get()
+        if seg is None:
+            break
+        if STOP_EVENT.is_set():
+            if seg in GENERATED_FILES:
+                delete_generated_file(seg)
+            continue
+        if upload_file(seg, webhook_url):
+            delete_generated_file(seg)
+
+def process_video_file(file_path, webhook_url):
+    """Process a video file: upload directly if small or split and upload segments if too large."""
+    if STOP_EVENT.is_set():
+        print(f"[DEBUG] Skipping video {file_path} due to stop request.")
+        return
+    print(f"[DEBUG] Processing video file: {file_path}")
+    file_size = os.path.getsize(file_path)
+    max_size = size_limit(webhook_url)
+    if file_size <= max_size:
+        upload_file(file_path, webhook_url)
+    elif (ACTIVE_JOB is None or ACTIVE_JOB.plan(file_path) is None) and probe_with_video(file_path, webhook_url):
+        return
+    elif STREAMING_SPLIT:
+        output_pattern = segment_pattern(file_path)
+        # Split and upload run concurrently: this thread tails ffmpeg, the uploader drains the queue.
+        # A full queue blocks the split (ffmpeg is paused meanwhile), so only a few segments are ever on disk.
+        upload_queue = queue.Queue(maxsize=STREAMING_QUEUE_SIZE)
+        uploader = threading.Thread(target=upload_segments_worker, args=(upload_queue, webhook_url))
+        uploader.start()
+        try:
+            ready, cuts, start_part = resume_video_segments(file_path)
+            for seg in ready:
+                upload_queue.put(seg)
+            if cuts is None or start_part < len(cuts) + 1:
+                for seg in split_segments(file_path, output_pattern, start_part, cuts, max_size):
+                    upload_queue.put(seg)
+        finally:
+            upload_queue.put(None)
+            uploader.join()
+    else:
+        output_pattern = segment_pattern(file_path)
+        segments = split_video(file_path, output_pattern, max_size)
+        for seg in segments:
+            if STOP_EVENT.is_set():
+                print("[DEBUG] Stop requested during segment upload; aborting further uploads.")
+                break
+            upload_file(seg, webhook_url)
+        for seg in segments:
+            if seg in GENERATED_FILES:
+                delete_generated_file(seg)
+
+def process_image_file(file_path, webhook_url):
+    """Process an image file by uploading it."""
+    if STOP_EVENT.is_set():
+        print(f"[DEBUG] Skipping image {file_path} due to stop request.")
+        return
+    print(f"[DEBUG] Processing image file: {file_path}")
+    upload_file(file_path, webhook_url)
+
+def process_file(file_path, webhook_url):
+    """Determine file type and process accordingly."""
+    if STOP_EVENT.is_set():
+        print(f"[DEBUG] Skipping file {file_path} due to stop request.")
+        return
+    ext = os.path.splitext(file_path)[1].lower()
+    # With sharding, every segment of a video goes through the same webhook
+    with use_webhook(webhook_url) as webhook_url:
+        if ext in IMAGE_EXTS:
+            process_image_file(file_path, webhook_url)
+        elif ext in VIDEO_EXTS:
+            process_video_file(file_path, webhook_url)
+        else:
+            print(f"[DEBUG] Skipping unsupported file: {file_path}")
+
+def cleanup_generated_files():
+    """Delete all temporary files recorded in GENERATED_FILES."""
+    print("[DEBUG] Cleaning up generated temporary files...")
+    for f in GENERATED_FILES.copy():
+        if os.path.exists(f):
+            try:
+                os.remove(f)
+                print(f"[DEBUG] Deleted generated file: {f}")
+                GENERATED_FILES.remove(f)
+            except Exception as e:
+                print(f"[ERROR] Could not delete generated file {f}: {e}")
+
+# --- asyncio upload engine ---
+class AsyncUploadEngine:
+    """
+    Runs uploads as coroutines on one event loop thread with a shared keep-alive
+    connection pool (httpx), so hundreds of requests can be in flight without a thread each.
+    upload_batch returns a concurrent.futures.Future, so the pipeline can use it exactly like
+    a ThreadPoolExecutor future; run_upload's pipeline is the process_file entry point on top of it,
+    with its split stage as the executor for ffmpeg work. Response bookkeeping (records, journal,
+    retry queue) commits to disk, so it runs on one writer thread instead of stalling the loop.
+    """
+    def __init__(self, max_in_flight=ASYNC_MAX_IN_FLIGHT):
+        self.max_in_flight = max_in_flight
+        self.bookkeeping = ThreadPoolExecutor(max_workers=1)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.submit(self._start()).result()
+
+    async def _start(self):
+        # The client and semaphore must be created on the loop that uses them
+        limits = httpx.Limits(max_connections=self.max_in_flight, max_keepalive_connections=self.max_in_flight)
+        self.client = httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(ASYNC_TIMEOUT))
+        self.in_flight = asyncio.Semaphore(self.max_in_flight)
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def upload_batch(self, file_paths, webhook_url, content=None):
+        """Same semantics as upload_batch, returning a Future."""
+        return self.submit(self.upload_batch_async(file_paths, webhook_url, content))
+
+    def close(self):
+        self.submit(self.client.aclose()).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.bookkeeping.shutdown()
+
+    async def post_webhook(self, webhook_url, json_payload=None, file_paths=()):
+        """Async post_webhook: rate-limited, 429s retried, file bodies streamed from disk."""
+        limiter = get_limiter(webhook_url)
+        response = None
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            if not await limiter.acquire_async(STOP_EVENT):
+                return None
+            try:
+                async with self.in_flight:
+                    started = time.monotonic()
+                    with ExitStack() as stack:
+                        response = await self.client.post(webhook_url, **build_request(json_payload, file_paths, stack))
+                    limiter.record_latency(time.monotonic() - started)
+            except Exception as e:
+                print(f"[ERROR] Exception posting to webhook: {e}")
+                return None
+            if not note_rate_limit(limiter, response):
+                return response
+            print(f"[DEBUG] 429 from webhook (attempt {attempt + 1} of {MAX_RATE_LIMIT_RETRIES + 1}).")
+        return response
+
+    async def upload_batch_async(self, file_paths, webhook_url, content=None, queue_on_failure=True):
+        if STOP_EVENT.is_set():
+            print(f"[DEBUG] Upload cancelled for files: {file_paths}")
+            return False
+        with use_webhook(webhook_url) as webhook_url:
+            print(f"[DEBUG] Uploading {len(file_paths)} file(s): {file_paths}")
+            json_payload = {"content": content} if content else None
+            response = await self.post_webhook(with_wait(webhook_url), json_payload=json_payload, file_paths=file_paths)
+            return await self.loop.run_in_executor(self.bookkeeping, handle_batch_response,
+                                                   file_paths, webhook_url, response, queue_on_failure)
+
+# --- Two-stage upload pipeline ---
+class UploadPipeline:
+    """
+    Splitting and uploading as two stages joined by a bounded queue:
+      split stage  - a pool sized to the cores probes and splits large videos (one ffmpeg each),
+                     the most expensive first (longest_first)
+      upload stage - one dispatcher keeps up to upload_concurrency batches/segments in flight
+    When uploads fall behind, the full queue blocks the split stage (backpressure), so disk
+    usage and memory stay bounded. stats() reports each stage's queue depth and busy workers.
+    submit_upload(file_paths, webhook_url) must return a concurrent.futures.Future of upload_batch.
+    """
+    def __init__(self, webhook_url, submit_upload, split_workers=SPLIT_WORKERS,
+                 upload_concurrency=UPLOAD_WORKERS, queue_size=PIPELINE_QUEUE_SIZE, on_files_done=None):
+        self.webhook_url = webhook_url
+        self.submit_upload = submit_upload
+        self.split_workers = split_workers
+        self.upload_concurrency = upload_concurrency
+        self.upload_slots = threading.Semaphore(upload_concurrency)
+        self.upload_queue = queue.Queue(maxsize=queue_size)
+        self.on_files_done = on_files_done or (lambda count: None)
+        self.lock = threading.Lock()
+        self.split_waiting = 0
+        self.split_busy = 0
+        self.uploads_in_flight = 0
+        self.videos = {}  # video path -> [segments not yet uploaded, split finished]
+
+    def stats(self):
+        """Queue depth and busy workers per stage, to show which one is the bottleneck."""
+        with self.lock:
+            return {"split_waiting": self.split_waiting, "split_busy": self.split_busy,
+                    "split_workers": self.split_workers, "upload_queued": self.upload_queue.qsize(),
+                    "upload_in_flight": self.uploads_in_flight, "upload_slots": self.upload_concurrency}
+
+    def run(self, batches, singles):
+        """Upload the planned batches and process the remaining files; returns when everything is done."""
+        dispatcher = threading.Thread(target=self.dispatch)
+        dispatcher.start()
+        with self.lock:
+            self.split_waiting = len(singles)
+        with ThreadPoolExecutor(max_workers=self.split_workers) as split_pool:
+            # The pool starts work in submission order, so the longest splits start first
+            split_futures = [split_pool.submit(self.split_stage, f) for f in longest_first(singles, self.split_workers)]
+            for batch in batches:
+                if STOP_EVENT.is_set():
+                    break
+                self.upload_queue.put((batch, None, None))
+            wait(split_futures)
+        self.upload_queue.put(None)
+        dispatcher.join()
+
+    def split_stage(self, file_path):
+        with self.lock:
+            self.split_waiting -= 1
+            self.split_busy += 1
+        try:
+            if STOP_EVENT.is_set():
+                return
+            ext = os.path.splitext(file_path)[1].lower()
+            if ext not in IMAGE_EXTS and ext not in VIDEO_EXTS:
+                print(f"[DEBUG] Skipping unsupported file: {file_path}")
+                self.on_files_done(1)
+            elif ext in VIDEO_EXTS and os.path.getsize(file_path) > size_limit(self.webhook_url):
+                self.split_video(file_path)
+            else:
+                self.upload_queue.put(([file_path], None, None))
+        except Exception as e:
+            print(f"[ERROR] Split stage failed for {file_path}: {e}")
+            self.on_files_done(1)
+        finally:
+            with self.lock:
+                self.split_busy -= 1
+
+    def split_video(self, file_path):
+        output_pattern = segment_pattern(file_path)
+        with self.lock:
+            self.videos[file_path] = [0, False]
+        # With sharding, every segment of a video goes through the same webhook
+        with use_webhook(self.webhook_url) as webhook_url:
+            max_size = size_limit(webhook_url)
+            ready, cuts, start_part = resume_video_segments(file_path)
+            if cuts is None and os.path.getsize(file_path) <= max_size:
+                # Too big for some shard, but the one picked takes it whole
+                with self.lock:
+                    del self.videos[file_path]
+                self.upload_queue.put(([file_path], None, webhook_url))
+                return
+            if cuts is None and probe_with_video(file_path, webhook_url):
+                with self.lock:
+                    del self.videos[file_path]
+                self.on_files_done(1)
+                return
+            for seg in ready:
+                self.enqueue_segment(file_path, seg, webhook_url)
+            if cuts is None or start_part < len(cuts) + 1:
+                for seg in split_segments(file_path, output_pattern, start_part, cuts, max_size):
+                    self.enqueue_segment(file_path, seg, webhook_url)
+        with self.lock:
+            self.videos[file_path][1] = True
+            finished = self.videos[file_path][0] == 0
+        if finished:
+            self.on_files_done(1)
+
+    def enqueue_segment(self, video, seg, webhook_url):
+        with self.lock:
+            self.videos[video][0] += 1
+        # Blocks while the upload stage is behind
+        self.upload_queue.put(([seg], video, webhook_url))
+
+    def dispatch(self):
+        """Upload stage: take items off the queue whenever an upload slot is free."""
+        while True:
+            item = self.upload_queue.get()
+            if item is None:
+                break
+            if STOP_EVENT.is_set():
+                self.upload_finished(item, None)
+                continue
+            self.upload_slots.acquire()
+            with self.lock:
+                self.uploads_in_flight += 1
+            file_paths, video, webhook_url = item
+            future = self.submit_upload(file_paths, webhook_url or self.webhook_url)
+            future.add_done_callback(lambda f, item=item: self.upload_done(item, f))
+        # Wait for the last uploads to come back
+        for _ in range(self.upload_concurrency):
+            self.upload_slots.acquire()
+
+    def upload_done(self, item, future):
+        try:
+            ok = future.result()
+        except Exception as e:
+            print(f"[ERROR] Upload failed for {item[0]}: {e}")
+            ok = False
+        with self.lock:
+            self.uploads_in_flight -= 1
+        self.upload_slots.release()
+        self.upload_finished(item, ok)
+
+    def upload_finished(self, item, ok):
+        file_paths, video, _ = item
+        if video is None:
+            self.on_files_done(len(file_paths))
+            return
+        seg = file_paths[0]
+        if ok or seg in GENERATED_FILES:
+            # Uploaded, or cancelled before upload; failed segments belong to the retry queue
+            delete_generated_file(seg)
+        with self.lock:
+            self.videos[video][0] -= 1
+            finished = self.videos[video][1] and self.videos[video][0] == 0
+        if finished:
+            self.on_files_done(1)
+
+# --- Running uploads ---
+def load_webhooks():
+    """Saved webhooks from WEBHOOKS_FILE as { name: url }."""
+    if os.path.exists(WEBHOOKS_FILE):
+        with open(WEBHOOKS_FILE, 'r') as file:
+            try:
+                return json.load(file)
+            except json.JSONDecodeError:
+                return {}
+    return {}
+
+def webhook_target(webhook_urls):
+    """What the upload functions take for a list of webhook URLs: the URL itself, or WebhookShards for several."""
+    if len(webhook_urls) > 1:
+        return WebhookShards(webhook_urls)
+    return webhook_urls[0]
+
+def find_media_files(folder, recursive=False):
+    """Image and video files in folder (and its subfolders when recursive)."""
+    return scan_media(folder, IMAGE_EXTS + VIDEO_EXTS, recursive)
+
+def resumable_files(job):
+    """Files of a journaled job that still need work and are still on disk."""
+    return [f for f in job.files(states=("pending", "splitting")) if os.path.exists(f)]
+
+def discard_job(job):
+    """Give up on an unfinished job: delete the segments it split but never uploaded. Returns how many were deleted."""
+    leftovers = job.leftover_segments()
+    for path in leftovers:
+        delete_generated_file(path)
+    job.set_status("discarded")
+    print(f"[DEBUG] Discarded job {job.id}; deleted {len(leftovers)} leftover segments.")
+    return len(leftovers)
+
+def run_upload(files, webhook_url, announcement=None, job=None, on_files_done=None, split_workers=SPLIT_WORKERS):
+    """
+    Upload files through the two-stage pipeline and retry whatever failed.
+    webhook_url is a URL or WebhookShards; on_files_done(count) is called as files finish
+    (including files skipped as already uploaded). Returns "done", or "stopped" if STOP_EVENT was set.
+    """
+    global ACTIVE_JOB, ACTIVE_PIPELINE
+    on_files_done = on_files_done or (lambda count: None)
+    ACTIVE_JOB = job
+    if SKIP_UPLOADED:
+        files, skipped = skip_uploaded(files)
+        on_files_done(skipped)
+    batches, singles = plan_upload_batches(files, size_limit(webhook_url))
+    if announcement:
+        # The folder announcement rides along with the first batch instead of costing its own request
+        if batches:
+            first = batches.pop(0)
+            upload_batch(first, webhook_url, content=announcement)
+            on_files_done(len(first))
+        else:
+            send_text_message(webhook_url, announcement)
+    if httpx is not None:
+        # One event loop keeps every upload in flight over pooled connections
+        engine = AsyncUploadEngine()
+        submit_upload = engine.upload_batch
+        concurrency = ASYNC_MAX_IN_FLIGHT
+    else:
+        print("[DEBUG] httpx not installed; using a thread pool for uploads (pip install httpx).")
+        upload_executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS)
+        submit_upload = lambda file_paths, url: upload_executor.submit(upload_batch, file_paths, url)
+        concurrency = UPLOAD_WORKERS
+    ACTIVE_PIPELINE = UploadPipeline(webhook_url, submit_upload, split_workers=split_workers,
+                                     upload_concurrency=concurrency, on_files_done=on_files_done)
+    ACTIVE_PIPELINE.run(batches, singles)
+    ACTIVE_PIPELINE = None
+    if httpx is not None:
+        engine.close()
+    else:
+        upload_executor.shutdown()
+    if not STOP_EVENT.is_set():
+        drain_retry_queue()
+    save_uploaded_records()
+    status = "stopped" if STOP_EVENT.is_set() else "done"
+    if job is not None:
+        job.set_status(status)
+    ACTIVE_JOB = None
+    if STOP_EVENT.is_set():
+        cleanup_generated_files()
+    prune_segment_dirs()
+    return status
+
+def watch_folder(folder, webhook_url, recursive=False, on_files_done=None, on_batch=None):
+    """
+    Upload new media as it lands in folder, until STOP_EVENT is set. Files that were there
+    before the watch started are left alone. Each set of files that settled while the previous
+    upload ran becomes one journaled job; on_batch(files) is called before it starts.
+    """
+    ready = queue.Queue()
+    watcher = FolderWatcher(folder, ready.put, IMAGE_EXTS + VIDEO_EXTS, recursive=recursive, stop_event=STOP_EVENT,
+                            exclude=[SEGMENTS_DIR])
+    thread = threading.Thread(target=watcher.run, daemon=True)
+    thread.start()
+    webhook_urls = webhook_url.webhook_urls if isinstance(webhook_url, WebhookShards) else [webhook_url]
+    while not STOP_EVENT.is_set():
+        try:
+            files = ready.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        while not ready.empty():
+            files.extend(ready.get_nowait())
+        if on_batch:
+            on_batch(files)
+        job = JOB_JOURNAL.create(files, webhook_urls)
+        run_upload(files, webhook_url, job=job, on_files_done=on_files_done)
+    thread.join()
+    print(f"[DEBUG] Stopped watching {folder}.")
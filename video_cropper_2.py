@@ -1,6 +1,4 @@
 import os
-import math
-import subprocess
 import threading
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
@@ -9,6 +7,10 @@ import time
 import multiprocessing
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import json  # For saving/loading webhooks
+from media_probe import probe_duration
+from split_planner import plan_split, split_args
+from ffmpeg_runner import RunBoard, FileProgress, add_listener, run_ffmpeg
+from upload_scheduler import WebhookSizeLimits
 
 # Import drag-and-drop support; install tkinterdnd2 via pip if needed
 try:
@@ -22,7 +24,8 @@ STOP_EVENT = threading.Event()  # When set, processing functions will abort
 GENERATED_FILES = []            # List of temporary files (e.g. video segments)
 
 # --- Configuration ---
-MAX_SIZE = 8 * 1024 * 1024  # 8 MB in bytes
+MAX_SIZE = 8 * 1024 * 1024  # 8 MB in bytes, unless the uploader has learned a larger limit for the webhook
+SIZE_LIMITS = WebhookSizeLimits()  # Limits learned by discord_video_uploader.py (webhook_limits.json)
 IMAGE_EXTS = ['.png', '.jpg', '.jpeg', '.gif']
 VIDEO_EXTS = ['.mp4', '.mov', '.avi', '.mkv']
 WEBHOOKS_FILE = "saved_webhooks.json"  # File to store saved webhooks
@@ -59,41 +62,29 @@ def upload_file(file_path, webhook_url):
         print(f"[ERROR] Exception uploading {file_path}: {e}")
 
 def get_video_duration(input_file):
-    """Use ffprobe to obtain video duration in seconds."""
-    cmd = [
-        "ffprobe", "-v", "error", "-select_streams", "v:0",
-        "-show_entries", "format=duration",
-        "-of", "default=noprint_wrappers=1:nokey=1", input_file
-    ]
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    try:
-        duration = float(result.stdout.strip())
+    """Video duration in seconds from the shared ffprobe cache (probed once per file version)."""
+    duration = probe_duration(input_file)
+    if duration is None:
+        print(f"[ERROR] Could not get duration for {input_file}")
+    else:
         print(f"[DEBUG] Duration of {input_file}: {duration} seconds")
-        return duration
-    except Exception as e:
-        print(f"[ERROR] Could not get duration for {input_file}: {e}")
-        return None
+    return duration
 
-def split_video(input_file, output_pattern):
+def split_video(input_file, output_pattern, max_size=MAX_SIZE):
     """
     Splits the video into segments using ffmpeg.
-    The number of segments is estimated from the file size so that each is under 8MB.
+    Cut points are planned from packet sizes so that each segment is under max_size.
     """
-    duration = get_video_duration(input_file)
-    if duration is None:
+    cuts = plan_split(input_file, max_size)
+    if cuts is None:
         return []
-    file_size = os.path.getsize(input_file)
-    num_segments = math.ceil(file_size / MAX_SIZE)
-    seg_duration = duration / num_segments
-    seg_duration_str = f"{seg_duration:.2f}"
-    print(f"[DEBUG] Splitting {input_file} into {num_segments} segments (approx {seg_duration_str} sec each)")
-    cmd = [
-        "ffmpeg", "-i", input_file, "-c", "copy", "-map", "0",
-        "-segment_time", seg_duration_str, "-reset_timestamps", "1",
+    input_args, output_args = split_args(cuts)
+    args = [
+        *input_args, "-i", input_file, "-c", "copy", "-map", "0",
+        *output_args, "-reset_timestamps", "1",
         "-f", "segment", output_pattern
     ]
-    print(f"[DEBUG] Running ffmpeg: {' '.join(cmd)}")
-    subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    run_ffmpeg(args, duration=get_video_duration(input_file), label=os.path.basename(input_file), file=input_file)
     # Collect produced segments; assumes ffmpeg names them with an index appended
     base_dir = os.path.dirname(input_file)
     base_name = os.path.splitext(os.path.basename(input_file))[0]
@@ -116,13 +107,14 @@ def process_video_file(file_path, webhook_url):
         return
     print(f"[DEBUG] Processing video file: {file_path}")
     file_size = os.path.getsize(file_path)
-    if file_size <= MAX_SIZE:
+    max_size = SIZE_LIMITS.limit(webhook_url, MAX_SIZE)
+    if file_size <= max_size:
         upload_file(file_path, webhook_url)
     else:
         dir_name = os.path.dirname(file_path)
         base_name, ext = os.path.splitext(os.path.basename(file_path))
         output_pattern = os.path.join(dir_name, f"{base_name}_%03d{ext}")
-        segments = split_video(file_path, output_pattern)
+        segments = split_video(file_path, output_pattern, max_size)
         for seg in segments:
             if STOP_EVENT.is_set():
                 print("[DEBUG] Stop requested during segment upload; aborting further uploads.")
@@ -186,7 +178,10 @@ class App(TkinterDnD.Tk):
         self.file_list = []  # List of full file paths
         self.total_files = 0
         self.processed_files = 0
+        self.ffmpeg_runs = RunBoard()  # Splits in progress, shown under the progress bar
+        self.file_progress = FileProgress()  # Share of each file's split done, for the progress bar
         self.create_widgets()
+        add_listener(self.ffmpeg_progress)
 
     def load_webhooks(self):
         """Load saved webhooks from the JSON file."""
@@ -247,6 +242,21 @@ class App(TkinterDnD.Tk):
         # Progress bar
         self.progress = ttk.Progressbar(self, orient="horizontal", length=550, mode="determinate")
         self.progress.pack(pady=10)
+        self.ffmpeg_status = tk.Label(self, text="")
+        self.ffmpeg_status.pack()
+
+    def ffmpeg_progress(self, event):
+        """ffmpeg runner listener (called on ffmpeg's reader thread): hand the event to the Tk thread."""
+        self.after(0, self.show_ffmpeg_progress, event)
+
+    def show_ffmpeg_progress(self, event):
+        """Show how far the running splits are and move the bar through the files being split."""
+        self.ffmpeg_status.config(text=self.ffmpeg_runs.update(event))
+        self.file_progress.update(event)
+        self.update_progress()
+
+    def update_progress(self):
+        self.progress["value"] = min(self.total_files, self.processed_files + self.file_progress.partial())
 
     def update_webhook_dropdown(self):
         """Update the webhook dropdown with the current list of webhooks."""
@@ -341,6 +351,8 @@ class App(TkinterDnD.Tk):
         self.total_files = len(self.file_list)
         self.processed_files = 0
         self.progress["maximum"] = self.total_files
+        self.progress["value"] = 0
+        self.file_progress.clear()
         num_workers = max(1, multiprocessing.cpu_count() // 2)
         print(f"[DEBUG] Using {num_workers} worker threads for processing.")
         threading.Thread(target=self.process_files_thread, args=(self.file_list.copy(), webhook_url, num_workers)).start()
@@ -353,7 +365,8 @@ class App(TkinterDnD.Tk):
                     print("[DEBUG] Stop event detected; aborting remaining tasks.")
                     break
                 self.processed_files += 1
-                self.progress["value"] = self.processed_files
+                self.file_progress.forget(futures[future])
+                self.after(0, self.update_progress)
                 print(f"[DEBUG] Completed {self.processed_files} of {self.total_files} files.")
         print("[DEBUG] File processing thread ending.")
         if STOP_EVENT.is_set():